@@ -0,0 +1,99 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import ffmpeg
+import whisper
+from whisper.audio import SAMPLE_RATE
+
+from whisper_api.audio_decoding import PCM_SAMPLE_WIDTH
+from whisper_api.audio_decoding import load_audio
+from whisper_api.audio_decoding import probe_duration_s
+from whisper_api.audio_decoding import read_wav_layout
+from whisper_api.audio_decoding import soundfile
+from whisper_api.audio_decoding import soxr
+
+"""
+Compare the in-process audio decoding with the ffmpeg subprocesses whisper uses, for each format
+
+A source file is converted to every format with ffmpeg first, then each file is loaded and probed
+repeatedly both ways. Short clips show the cost of spawning the processes, long ones the decode speed.
+
+    python benchmarks/audio_decoding.py --source test/files/En-Open_Source_Software_CD-article.ogg --duration 5
+"""
+
+# name -> file suffix and the ffmpeg options to encode it
+formats: dict[str, list[str]] = {
+    "wav (16kHz mono)": [".wav", "-ar", "16000", "-ac", "1", "-acodec", "pcm_s16le"],
+    "wav (44.1kHz stereo)": [".wav", "-ar", "44100", "-ac", "2", "-acodec", "pcm_s16le"],
+    "flac": [".flac", "-ar", "44100"],
+    "ogg (vorbis)": [".ogg", "-acodec", "libvorbis"],
+    "ogg (opus)": [".opus", "-acodec", "libopus"],
+    "mp3": [".mp3", "-acodec", "libmp3lame"],
+}
+
+
+def convert(source: str, target_dir: str, name: str, duration_s: float) -> str:
+    suffix, *options = formats[name]
+    target = os.path.join(target_dir, name.replace(" ", "_").replace("(", "").replace(")", "") + suffix)
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", source, "-t", str(duration_s), *options, target]
+    subprocess.run(cmd, capture_output=True, check=True)
+    return target
+
+
+def in_process_path(path: str) -> str:
+    """Which decoder load_audio() takes for the file"""
+    layout = read_wav_layout(path)
+    if layout is not None and layout.sample_rate == SAMPLE_RATE and layout.sample_width == PCM_SAMPLE_WIDTH:
+        return "memmap"
+    if soundfile is not None:
+        try:
+            if soundfile.info(path).samplerate == SAMPLE_RATE or soxr is not None:
+                return "libsndfile"
+        except RuntimeError:
+            pass
+    return "ffmpeg (fallback)"
+
+
+def mean_ms(function, repetitions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the in-process audio decoding with ffmpeg subprocesses")
+    parser.add_argument("--source", required=True, help="audio file the test files are converted from")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of the source to use")
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+
+    print("| format | in-process path | load ms (in-process / ffmpeg) | probe ms (in-process / ffprobe) |")
+    print("|--------|-----------------|-------------------------------|---------------------------------|")
+    with tempfile.TemporaryDirectory() as target_dir:
+        for name in formats:
+            try:
+                path = convert(args.source, target_dir, name, args.duration)
+            except subprocess.CalledProcessError:
+                print(f"| {name} | ffmpeg can't encode it | | |")
+                continue
+
+            load_in_process_ms = mean_ms(lambda: load_audio(path), args.repetitions)
+            load_ffmpeg_ms = mean_ms(lambda: whisper.load_audio(path), args.repetitions)
+            # like the server does it, ffprobe is the fallback for formats that can't be probed in-process
+            probe_in_process_ms = mean_ms(
+                lambda: probe_duration_s(path) is not None or ffmpeg.probe(path), args.repetitions
+            )
+            probe_ffprobe_ms = mean_ms(lambda: ffmpeg.probe(path), args.repetitions)
+            print(
+                f"| {name} | {in_process_path(path)} "
+                f"| {load_in_process_ms:.1f} / {load_ffmpeg_ms:.1f} "
+                f"| {probe_in_process_ms:.2f} / {probe_ffprobe_ms:.1f} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
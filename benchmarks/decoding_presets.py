@@ -0,0 +1,96 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import whisper
+from whisper.audio import SAMPLE_RATE
+from whisper.normalizers import BasicTextNormalizer
+
+from whisper_api.decoding.presets import decoding_presets
+
+"""
+Measure the speed and the accuracy of the decoding presets on a reference set
+
+The reference set is a directory of audio files, each with its reference transcript next to it
+(same name, suffix .txt). Every file is decoded with each model and preset, the real-time factor
+(decode seconds per second of audio) and the word error rate against the reference are printed as a markdown table.
+The audio is decoded once up front, so the factors are the ones of the model alone.
+
+    python benchmarks/decoding_presets.py path/to/reference_set --models large turbo --language en
+"""
+
+
+def word_error_rate(reference: str, hypothesis: str, normalizer=BasicTextNormalizer()) -> tuple[int, int]:
+    """
+    Returns:
+        the number of word edits (substitutions, insertions, deletions) and the number of reference words
+    """
+    reference_words = normalizer(reference).split()
+    hypothesis_words = normalizer(hypothesis).split()
+
+    # levenshtein distance on words, one row of the table at a time
+    previous = np.arange(len(hypothesis_words) + 1)
+    for i, reference_word in enumerate(reference_words, start=1):
+        current = np.empty_like(previous)
+        current[0] = i
+        for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+            substitution = previous[j - 1] + (reference_word != hypothesis_word)
+            current[j] = min(substitution, previous[j] + 1, current[j - 1] + 1)
+        previous = current
+
+    return int(previous[-1]), len(reference_words)
+
+
+def load_reference_set(directory: str) -> list[tuple[str, np.ndarray, str]]:
+    """The name, the audio and the reference transcript of every file with a transcript"""
+    reference_set = []
+    for transcript_path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        stem = transcript_path[: -len(".txt")]
+        audio_paths = [path for path in glob.glob(f"{glob.escape(stem)}.*") if path != transcript_path]
+        if not audio_paths:
+            continue
+
+        with open(transcript_path, encoding="utf-8") as file:
+            reference = file.read()
+        reference_set.append((os.path.basename(stem), whisper.load_audio(audio_paths[0]), reference))
+
+    return reference_set
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the decoding presets on a reference set")
+    parser.add_argument("reference_dir", help="directory with audio files and their reference transcripts (.txt)")
+    parser.add_argument("--models", nargs="+", default=["large"], help="models to measure")
+    parser.add_argument("--presets", nargs="+", default=list(decoding_presets), choices=list(decoding_presets))
+    parser.add_argument("--language", default=None, help="language of the audio, detected if not given")
+    args = parser.parse_args()
+
+    reference_set = load_reference_set(args.reference_dir)
+    if not reference_set:
+        parser.error(f"no audio files with a reference transcript in '{args.reference_dir}'")
+    audio_s = sum(len(audio) for _, audio, _ in reference_set) / SAMPLE_RATE
+    print(f"{len(reference_set)} files with {audio_s:.0f}s of audio\n")
+
+    print("| model | preset | real-time factor | word error rate |")
+    print("|-------|--------|------------------|-----------------|")
+    for model_size in args.models:
+        model = whisper.load_model(model_size)
+        for preset in args.presets:
+            decode_s, edits, words = 0.0, 0, 0
+            for _, audio, reference in reference_set:
+                start = time.perf_counter()
+                result = model.transcribe(audio, language=args.language, **decoding_presets[preset])
+                decode_s += time.perf_counter() - start
+
+                file_edits, file_words = word_error_rate(reference, result["text"])
+                edits, words = edits + file_edits, words + file_words
+
+            print(f"| {model_size} | {preset} | {decode_s / audio_s:.3f} | {edits / max(words, 1):.1%} |")
+
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import json
+import logging
+import math
+import random
+import time
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+"""
+Access logging that doesn't drown the log in status polls
+
+- each logged request is one JSON line, so it can be parsed instead of grepped
+- requests to routes with a sample rate below 1 are only logged with that probability
+- errors (status >= 400) and slow requests are always logged
+- every route gets a summary (count, errors, p50/p99 duration) per interval, no matter how many requests were sampled
+
+All methods must be called from the event loop, there is no locking.
+"""
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class RouteStats:
+    """Durations of the requests to one route in the current interval"""
+
+    def __init__(self, max_samples: int):
+        """
+        Args:
+            max_samples: max durations kept for the percentiles, beyond that a uniform sample is kept
+        """
+        self.max_samples = max_samples
+        self.count = 0
+        self.errors = 0
+        self.logged = 0
+        self.max_ms = 0.0
+        self.durations_ms: list[float] = []
+
+    def add(self, duration_ms: float, is_error: bool, is_logged: bool):
+        self.count += 1
+        self.errors += is_error
+        self.logged += is_logged
+        self.max_ms = max(self.max_ms, duration_ms)
+
+        # reservoir sampling, the memory stays bounded no matter how many requests arrive
+        if len(self.durations_ms) < self.max_samples:
+            self.durations_ms.append(duration_ms)
+        elif (index := random.randrange(self.count)) < self.max_samples:
+            self.durations_ms[index] = duration_ms
+
+    def summary(self) -> dict[str, Any]:
+        durations_ms = sorted(self.durations_ms)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "logged": self.logged,
+            "p50_ms": round(percentile(durations_ms, 50), 2),
+            "p99_ms": round(percentile(durations_ms, 99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class AccessLog:
+
+    def __init__(
+        self,
+        _logger: logging.Logger,
+        sample_rates: dict[str, float] = None,
+        slow_request_ms: float = 1000,
+        summary_interval_s: float = 60,
+        max_samples: int = 4096,
+    ):
+        """
+        Args:
+            _logger: where the JSON lines are logged to (with level INFO, WARNING for errors and slow requests)
+            sample_rates: route -> share of the requests that are logged, routes not in here are always logged
+            slow_request_ms: requests that take longer than this are always logged
+            summary_interval_s: interval the summaries are logged in, 0 disables them
+            max_samples: max durations per route and interval used for the percentiles
+        """
+        self.logger = _logger
+        self.sample_rates = sample_rates or {}
+        self.slow_request_ms = slow_request_ms
+        self.summary_interval_s = summary_interval_s
+        self.max_samples = max_samples
+
+        self.__stats: dict[str, RouteStats] = {}
+        self.__interval_start = time.monotonic()
+
+    def record(
+        self,
+        route: str,
+        status_code: int,
+        duration_ms: float,
+        details: Callable[[], dict[str, Any]],
+        expected_wait_ms: float = 0,
+    ) -> bool:
+        """
+        Count the request and log it if it's sampled, an error or slow
+        Args:
+            route: the route template (not the path), to keep the number of summaries low
+            status_code: status of the response
+            duration_ms: time it took to respond
+            details: builds the fields of the log line, only called if the request is logged
+            expected_wait_ms: time the request was meant to wait (long polling), doesn't count as slow
+        Returns:
+            if the request was logged
+        """
+        is_error = status_code >= 400
+        is_slow = duration_ms - expected_wait_ms > self.slow_request_ms
+        is_logged = is_error or is_slow or random.random() < self.sample_rates.get(route, 1.0)
+
+        if is_logged:
+            entry = {"type": "request", "route": route, "status": status_code, "duration_ms": round(duration_ms, 2)}
+            if is_slow:
+                entry["slow"] = True
+            entry.update(details())
+            self.logger.log(logging.WARNING if is_error or is_slow else logging.INFO, json.dumps(entry))
+
+        if self.summary_interval_s:
+            if route not in self.__stats:
+                self.__stats[route] = RouteStats(self.max_samples)
+            self.__stats[route].add(duration_ms, is_error, is_logged)
+            self.log_summaries()
+
+        return is_logged
+
+    def log_summaries(self, force: bool = False):
+        """
+        Log the summaries if the interval is over, there's no timer - this runs on the next request
+        Args:
+            force: log them even if the interval isn't over yet, e.g. on shutdown
+        """
+        now = time.monotonic()
+        interval_s = now - self.__interval_start
+        if not force and interval_s < self.summary_interval_s:
+            return
+
+        for route, stats in self.__stats.items():
+            entry = {"type": "summary", "route": route, "interval_s": round(interval_s, 1), **stats.summary()}
+            self.logger.info(json.dumps(entry))
+
+        self.__stats = {}
+        self.__interval_start = now
+
+    @staticmethod
+    def route_of(scope: dict[str, Any]) -> Optional[str]:
+        """The template of the route that handled the request, None if no route matched"""
+        route = scope.get("route")
+        return getattr(route, "path", None)
@@ -0,0 +1,200 @@
+import math
+from collections import Counter
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi import status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.data_models.task import Task
+
+"""
+Admission control: refuse new work while the decoder is saturated, before it costs us anything
+
+The API tracks the tasks it handed to the decoder and their audio duration, so it knows the queue depth
+and how many seconds of audio wait for decoding without asking the decoder.
+A request that would exceed a limit gets 429 with a Retry-After that is estimated from how fast
+the decoder worked through the last tasks.
+
+- AdmissionMiddleware refuses uploads before their body is read, when the queue is full already
+- EndPoints checks again once the duration of the audio is known
+
+All methods must be called from the event loop, there is no locking.
+"""
+
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        max_queued_tasks: int,
+        max_queued_audio_s: float = 0,
+        initial_task_processing_s: float = 60,
+        initial_processing_s_per_audio_s: float = 1.0,
+        max_retry_after_s: int = 3600,
+    ):
+        """
+        Args:
+            max_queued_tasks: max tasks waiting in the decoder queue (not counting the one in processing)
+            max_queued_audio_s: max seconds of audio waiting for decoding (including the one in processing), 0 = no limit
+            initial_task_processing_s: estimated time per task until the first task finished
+            initial_processing_s_per_audio_s: estimated time per second of audio until the first task finished
+            max_retry_after_s: upper limit for Retry-After
+        """
+        self.max_queued_tasks = max_queued_tasks
+        self.max_queued_audio_s = max_queued_audio_s
+        self.max_retry_after_s = max_retry_after_s
+        # moving averages of the last finished tasks
+        self.task_processing_s = initial_task_processing_s
+        self.processing_s_per_audio_s = initial_processing_s_per_audio_s
+
+        # task -> its audio duration
+        self.__pending: dict[uuid_hex_t, float] = {}
+        self.__processing: dict[uuid_hex_t, float] = {}
+        self.queued_audio_s = 0.0
+        # number of tracked tasks that ended with each final status
+        self.outcomes: Counter[str] = Counter()
+        # "preset/model" -> moving average of the decode time per second of audio, only measured values
+        self.real_time_factors: dict[str, float] = {}
+
+    @property
+    def queued_tasks(self) -> int:
+        return len(self.__pending)
+
+    def update(self, task: Task):
+        """Track the task with its current status, call it whenever a task is created or changed"""
+        audio_s = self.__pending.pop(task.uuid, None)
+        if audio_s is None:
+            audio_s = self.__processing.pop(task.uuid, None)
+        if was_tracked := audio_s is not None:
+            self.queued_audio_s -= audio_s
+
+        if task.status in ["pending", "processing"]:
+            audio_s = task.audio_duration_s or 0.0
+            (self.__pending if task.status == "pending" else self.__processing)[task.uuid] = audio_s
+            self.queued_audio_s += audio_s
+            return
+
+        # a task can only end once, late updates of the decoder about a cancelled task are not counted
+        if was_tracked:
+            self.outcomes[task.status] += 1
+            if task.status == "finished" and task.whisper_result is not None:
+                self.__learn(task)
+
+        # nothing left, get rid of float rounding errors
+        if not self.__pending and not self.__processing:
+            self.queued_audio_s = 0.0
+
+    def hand_over(self, task: Task, successor: Task):
+        """
+        Track the decode of a cancelled task for a task that waits for the same decode
+        The cancelled task is counted as such, the successor ends with the status of the decode.
+        """
+        for tracked in (self.__pending, self.__processing):
+            if (audio_s := tracked.pop(task.uuid, None)) is not None:
+                tracked[successor.uuid] = audio_s
+                self.outcomes[task.status] += 1
+
+    @property
+    def metrics(self) -> dict[str, int | float | dict[str, float]]:
+        """The current load, the number of tasks that ended with each final status and the measured speeds"""
+        return {
+            "queued_tasks": self.queued_tasks,
+            "processing_tasks": len(self.__processing),
+            "queued_audio_s": round(self.queued_audio_s, 1),
+            "finished": self.outcomes["finished"],
+            "failed": self.outcomes["failed"],
+            "cancelled": self.outcomes["cancelled"],
+            "task_processing_s": round(self.task_processing_s, 1),
+            "processing_s_per_audio_s": round(self.processing_s_per_audio_s, 3),
+            "real_time_factors": {key: round(factor, 3) for key, factor in sorted(self.real_time_factors.items())},
+        }
+
+    def __learn(self, task: Task, weight: float = 0.2):
+        """Update the estimates of the processing speed with a finished task"""
+        result = task.whisper_result
+        processing_s = (result.end_time - result.start_time).total_seconds()
+        self.task_processing_s += weight * (processing_s - self.task_processing_s)
+        if task.audio_duration_s:
+            speed = processing_s / task.audio_duration_s
+            self.processing_s_per_audio_s += weight * (speed - self.processing_s_per_audio_s)
+            key = f"{result.used_preset}/{result.used_model_size}"
+            factor = self.real_time_factors.setdefault(key, speed)
+            self.real_time_factors[key] = factor + weight * (speed - factor)
+
+    def retry_after_s(self, new_tasks: int = 1, new_audio_s: float = 0.0) -> Optional[int]:
+        """
+        Check if new tasks can be admitted
+        Args:
+            new_tasks: number of tasks to add
+            new_audio_s: their audio duration, 0 if it's not known yet
+        Returns:
+            None if they're admitted, otherwise the seconds after which a retry is promising
+        """
+        wait_s = 0.0
+        if (excess_tasks := self.queued_tasks + new_tasks - self.max_queued_tasks) > 0:
+            wait_s = excess_tasks * self.task_processing_s
+
+        # a single long file is admitted to an empty queue, MAX_AUDIO_DURATION_S is the limit for that
+        if self.max_queued_audio_s and self.queued_audio_s > 0:
+            if (excess_audio_s := self.queued_audio_s + new_audio_s - self.max_queued_audio_s) >= 0:
+                wait_s = max(wait_s, excess_audio_s * self.processing_s_per_audio_s, 1)
+
+        if not wait_s:
+            return None
+
+        return min(max(math.ceil(wait_s), 1), self.max_retry_after_s)
+
+    def check(self, new_tasks: int = 1, new_audio_s: float = 0.0):
+        """
+        Raises:
+            HTTPException: 429 with Retry-After if the tasks are not admitted
+        """
+        if (retry_after_s := self.retry_after_s(new_tasks, new_audio_s)) is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=self.rejection_message,
+                headers={"Retry-After": str(retry_after_s)},
+            )
+
+    @property
+    def rejection_message(self) -> str:
+        return (
+            f"Server is busy ({self.queued_tasks} tasks with {self.queued_audio_s:.0f}s of audio waiting), "
+            f"please try again later"
+        )
+
+
+class AdmissionMiddleware:
+    """Refuse requests to the given routes while the queue is full, before their body is read"""
+
+    def __init__(self, app: ASGIApp, admission: AdmissionController, paths: set[str]):
+        """
+        Args:
+            admission: the controller that decides
+            paths: the routes that submit new work with POST
+        """
+        self.app = app
+        self.admission = admission
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        if (retry_after_s := self.admission.retry_after_s()) is None:
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse(
+            {"detail": self.admission.rejection_message},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after_s)},
+        )
+        await response(scope, receive, send)
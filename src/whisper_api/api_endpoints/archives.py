@@ -0,0 +1,118 @@
+import io
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
+from typing import Union
+
+"""
+Reading the members of uploaded zip/tar archives and writing result archives as a stream
+
+Neither direction holds a whole archive in memory:
+- members are handed out one by one as file objects that read from the archive
+- the zip that is written is yielded chunk by chunk while it's built, the response doesn't need to know its size
+"""
+
+
+def _is_tarfile(file: BinaryIO) -> bool:
+    """Stricter than tarfile.is_tarfile(), which also accepts files that start with a block of zeros"""
+    try:
+        with tarfile.open(fileobj=file, mode="r:*") as tar_file:
+            return tar_file.next() is not None
+    except (tarfile.TarError, EOFError):
+        return False
+
+
+def is_archive(file: BinaryIO) -> bool:
+    """True if the file is a zip or (compressed) tar archive, the file position is reset afterward"""
+    try:
+        if zipfile.is_zipfile(file):
+            return True
+        file.seek(0)
+        return _is_tarfile(file)
+    finally:
+        file.seek(0)
+
+
+def _is_wanted_member(path: str) -> bool:
+    """Skip the metadata that macOS and friends put next to the actual files"""
+    name = os.path.basename(path)
+    return bool(name) and not name.startswith(".") and "__MACOSX" not in path.split("/")
+
+
+def iter_archive_members(file: BinaryIO) -> Iterator[tuple[str, int, BinaryIO]]:
+    """
+    Iterate over the regular files of a zip or tar archive, directories are flattened
+    Each member must be read before the next one is requested.
+    Yields:
+        file name (without directories), uncompressed size from the archive's header and a file object to read
+        the member from
+    """
+    if zipfile.is_zipfile(file):
+        file.seek(0)
+        with zipfile.ZipFile(file) as zip_file:
+            for info in zip_file.infolist():
+                if not info.is_dir() and _is_wanted_member(info.filename):
+                    with zip_file.open(info) as member:
+                        yield os.path.basename(info.filename), info.file_size, member
+        return
+
+    file.seek(0)
+    # "r|*" reads the archive front to back, no seeking to an index like for zip files
+    with tarfile.open(fileobj=file, mode="r|*") as tar_file:
+        for info in tar_file:
+            if info.isfile() and _is_wanted_member(info.name):
+                yield os.path.basename(info.name), info.size, tar_file.extractfile(info)
+
+
+class _ChunkCollector(io.RawIOBase):
+    """Write-only file that collects what's written until it's taken out"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files: Iterable[tuple[str, Union[str, bytes]]]) -> Iterator[bytes]:
+    """
+    Build a zip archive from (name, content) pairs, each file is yielded as soon as it's compressed
+    The content is only requested when it's the file's turn, so it can be rendered lazily.
+    """
+    collector = _ChunkCollector()
+    # the collector can't seek, so zipfile writes the sizes after each file (data descriptor) instead of before
+    with zipfile.ZipFile(collector, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in files:
+            zip_file.writestr(name, content)
+            yield collector.take()
+
+    # the central directory at the end
+    yield collector.take()
+
+
+def unique_file_names(names: Iterable[str]) -> Iterator[str]:
+    """Make the names unique by numbering duplicates 'name (1).ext', 'name (2).ext'"""
+    used: set[str] = set()
+    for name in names:
+        unique_name = name
+        stem, ext = os.path.splitext(name)
+        counter = 1
+        while unique_name in used:
+            unique_name = f"{stem} ({counter}){ext}"
+            counter += 1
+
+        used.add(unique_name)
+        yield unique_name
@@ -1,66 +1,198 @@
+import asyncio
+import datetime as dt
 import glob
+import hashlib
+import os
+import tarfile
 import zipfile
-from multiprocessing.connection import Connection
 from tempfile import NamedTemporaryFile
 from typing import Optional
 
 import ffmpeg
 from fastapi import FastAPI
 from fastapi import HTTPException
+from fastapi import Query
 from fastapi import Request
 from fastapi import UploadFile
 from fastapi import status
 from fastapi.responses import FileResponse
 from fastapi.responses import RedirectResponse
+from fastapi.responses import Response
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from whisper.audio import SAMPLE_RATE
 
 from whisper_api import __version__
+from whisper_api.admission import AdmissionController
+from whisper_api.api_endpoints.archives import is_archive
+from whisper_api.api_endpoints.archives import iter_archive_members
+from whisper_api.api_endpoints.archives import stream_zip
+from whisper_api.api_endpoints.archives import unique_file_names
+from whisper_api.audio_decoding import PCM_SAMPLE_WIDTH
+from whisper_api.audio_decoding import PcmWavWriter
+from whisper_api.audio_decoding import probe_duration_s
+from whisper_api.change_notifier import ChangeNotifier
+from whisper_api.coalescing import SubmissionCoalescer
+from whisper_api.coalescing import copy_and_hash
+from whisper_api.coalescing import file_sha256
+from whisper_api.compression import PrecompressedBody
+from whisper_api.data_models.data_types import decoding_preset_str_t
+from whisper_api.data_models.data_types import job_type_str_t
 from whisper_api.data_models.data_types import named_temp_file_name_t
 from whisper_api.data_models.data_types import task_type_str_t
 from whisper_api.data_models.data_types import uuid_hex_t
 from whisper_api.data_models.decoder_state import DecoderState
+from whisper_api.data_models.job_group import JobGroup
+from whisper_api.data_models.job_group import JobGroupResponse
+from whisper_api.data_models.resumable_upload import ResumableUpload
+from whisper_api.data_models.resumable_upload import UploadResponse
+from whisper_api.data_models.task import BulkStatusRequest
+from whisper_api.data_models.task import BulkStatusResponse
 from whisper_api.data_models.task import Task
 from whisper_api.data_models.task import TaskResponse
+from whisper_api.data_models.task_store import StoreBackedTempDict
 from whisper_api.data_models.temp_dict import TempDict
 from whisper_api.environment import AUTHORIZED_MAILS
+from whisper_api.environment import DEFAULT_DEADLINE_S
+from whisper_api.environment import DELETE_RESULTS_AFTER_M
+from whisper_api.environment import INGEST_DIRS
 from whisper_api.environment import LOG_DIR
+from whisper_api.environment import MAX_AUDIO_DURATION_S
+from whisper_api.environment import MAX_BATCH_FILES
+from whisper_api.environment import MAX_BATCH_MB
+from whisper_api.environment import MAX_OPEN_UPLOADS
+from whisper_api.environment import MAX_QUEUED_AUDIO_S
+from whisper_api.environment import MAX_TASK_QUEUE_SIZE
+from whisper_api.environment import MAX_UPLOAD_MB
+from whisper_api.environment import REFRESH_EXPIRATION_TIME_ON_USAGE
+from whisper_api.environment import RUN_RESULT_EXPIRY_CHECK_M
+from whisper_api.environment import STATUS_MAX_WAIT_S
+from whisper_api.environment import TASK_CACHE_MAX_MB
 from whisper_api.log_setup import logger
 from whisper_api.log_setup import uuid_log_format
+from whisper_api.pipe_protocol import BatchingSender
+from whisper_api.transcript_formats import render_transcript
+from whisper_api.transcript_formats import transcript_format_t
 
 V1_PREFIX = "/api/v1"
 
 
 class EndPoints:
+    # routes that receive new work with POST, the AdmissionMiddleware refuses them before their body is read
+    submission_paths = {
+        f"{V1_PREFIX}/{route}"
+        for route in [
+            "transcribe",
+            "translate",
+            "transcribe_batch",
+            "translate_batch",
+            "upload",
+            "pcm",
+            "transcribe_path",
+            "translate_path",
+        ]
+    }
+
     def __init__(
         self,
         app: FastAPI,
         tasks_dict: TempDict[uuid_hex_t, Task],
         decoder_state: DecoderState,
         open_audio_files_dict: dict[named_temp_file_name_t, NamedTemporaryFile],
-        conn_to_child: Connection,
+        conn_to_child: BatchingSender,
+        audio_spool_dir: Optional[str] = None,
+        task_notifier: Optional[ChangeNotifier[uuid_hex_t]] = None,
+        job_groups_dict: Optional[TempDict[uuid_hex_t, JobGroup]] = None,
+        admission: Optional[AdmissionController] = None,
+        coalescer: Optional[SubmissionCoalescer] = None,
     ):
+        """
+        Args:
+            audio_spool_dir: directory for uploaded files that shall survive a restart (None for auto-deleted files)
+            task_notifier: notified with the task id whenever a task changes, used for long polling
+            job_groups_dict: holds the groups of tasks that were submitted in one batch
+            admission: tracks the queued tasks and decides if new ones are accepted
+            coalescer: attaches identical submissions to the task in flight instead of decoding them again
+        """
         self.tasks = tasks_dict
         self.decoder_state = decoder_state
         self.open_audio_files_dict = open_audio_files_dict
         self.app = app
         self.conn_to_child = conn_to_child
+        self.audio_spool_dir = audio_spool_dir
+        self.task_notifier = task_notifier or ChangeNotifier()
+        self.job_groups = job_groups_dict if job_groups_dict is not None else TempDict()
+        self.admission = admission or AdmissionController(MAX_TASK_QUEUE_SIZE, MAX_QUEUED_AUDIO_S)
+        self.coalescer = coalescer or SubmissionCoalescer()
+        # the results of finished tasks rendered into the requested formats, they live as long as the tasks
+        self.rendered_transcripts: TempDict[uuid_hex_t, dict[transcript_format_t, PrecompressedBody]] = TempDict(
+            expiration_time_m=DELETE_RESULTS_AFTER_M,
+            refresh_expiration_time_on_usage=REFRESH_EXPIRATION_TIME_ON_USAGE,
+            auto_gc_interval_s=RUN_RESULT_EXPIRY_CHECK_M * 60,
+            max_size_bytes=TASK_CACHE_MAX_MB * 1024**2 or None,
+            size_estimator=lambda renders: sum(rendered.size_bytes for rendered in renders.values()),
+        )
+        # uploads that are not touched for the expiration time are given up and their file is deleted
+        self.uploads: TempDict[uuid_hex_t, ResumableUpload] = TempDict(
+            expiration_time_m=DELETE_RESULTS_AFTER_M,
+            refresh_expiration_time_on_usage=True,
+            auto_gc_interval_s=RUN_RESULT_EXPIRY_CHECK_M * 60,
+            on_expire=lambda upload_id, upload: self.__discard_named_temp_file(upload.file),
+        )
 
         self.add_endpoints()
 
     def add_endpoints(self):
         self.app.add_api_route(f"{V1_PREFIX}/status", self.status)
+        self.app.add_api_route(f"{V1_PREFIX}/bulk_status", self.bulk_status, methods=["POST"])
         self.app.add_api_route(f"{V1_PREFIX}/decoder_status", self.decoder_status)
         self.app.add_api_route(f"{V1_PREFIX}/decoder_status_refresh", self.decoder_status_refresh)
+        self.app.add_api_route(f"{V1_PREFIX}/task_cache_status", self.task_cache_status)
+        self.app.add_api_route(f"{V1_PREFIX}/task_metrics", self.task_metrics)
+        self.app.add_api_route(f"{V1_PREFIX}/cancel", self.cancel, methods=["POST"])
         self.app.add_api_route(f"{V1_PREFIX}/translate", self.translate, methods=["POST"])
         self.app.add_api_route(f"{V1_PREFIX}/transcribe", self.transcribe, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/detect_language", self.detect_language, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/translate_batch", self.translate_batch, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/transcribe_batch", self.transcribe_batch, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/batch_status", self.batch_status)
+        self.app.add_api_route(f"{V1_PREFIX}/upload", self.create_upload, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/upload", self.upload_status, methods=["GET"])
+        self.app.add_api_route(f"{V1_PREFIX}/upload", self.append_to_upload, methods=["PATCH"])
+        self.app.add_api_route(f"{V1_PREFIX}/upload", self.cancel_upload, methods=["DELETE"])
+        self.app.add_api_route(f"{V1_PREFIX}/upload_finalize", self.finalize_upload, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/pcm", self.submit_pcm, methods=["POST"])
+        self.app.add_api_route(f"{V1_PREFIX}/batch_srt", self.batch_srt)
         self.app.add_api_route(f"{V1_PREFIX}/userinfo", self.userinfo)
         self.app.add_api_route(f"{V1_PREFIX}/login", self.login)
         self.app.add_api_route(f"{V1_PREFIX}/srt", self.srt)
+        self.app.add_api_route(f"{V1_PREFIX}/transcript", self.transcript)
         self.app.add_api_route(f"{V1_PREFIX}/version", self.get_version_info)
         if AUTHORIZED_MAILS:
             self.app.add_api_route(f"{V1_PREFIX}/logs", self.get_logs)
+        if INGEST_DIRS:
+            self.app.add_api_route(f"{V1_PREFIX}/translate_path", self.translate_path, methods=["POST"])
+            self.app.add_api_route(f"{V1_PREFIX}/transcribe_path", self.transcribe_path, methods=["POST"])
+
+    def task_response(self, task: Task) -> TaskResponse:
+        """Get the response of a task with its position derived from the last decoder state"""
+        if task.status in ["pending", "processing"]:
+            if (position := self.decoder_state.position_in_queue(task.queue_ticket)) is not None:
+                task.position_in_queue = position
+
+        response = task.to_transmit_full
+        # every change of the task gets a new change_seq, only the position follows from the decoder state
+        response.version = f"{task.change_seq or 0}-{task.position_in_queue}"
+        return response
 
     def add_task(self, task: Task):
+        self.__store_task(task)
+        self.admission.update(task)
+
+    def __store_task(self, task: Task):
+        """Store a changed task without tracking it for admission, e.g. for tasks that are not decoded themselves"""
+        task.change_seq = self.task_notifier.notify(task.uuid)
         self.tasks[task.uuid] = task
 
     def delete_task(self, task_id: uuid_hex_t):
@@ -74,20 +206,136 @@ class EndPoints:
 
     async def decoder_status_refresh(self):
         """trigger a refresh of the decoder - the response will NEITHER await nor include the new state"""
-        self.conn_to_child.send(
-            {
-                "type": "status",
-            }
-        )
+        self.conn_to_child.send("status")
         return "Request to refresh state is sent to decoder"
 
-    async def status(self, task_id: uuid_hex_t) -> TaskResponse:
+    async def task_cache_status(self):
+        """Get the number and estimated size of tasks held in memory and how many were evicted or spilled to disk"""
+        return self.tasks.stats
+
+    async def task_metrics(self):
+        """
+        Get the load of the decoder and how many tasks finished, failed or were cancelled since the start
+        coalesced is the number of tasks that shared the decode of an identical task
+        real_time_factors are the measured decode seconds per second of audio for each preset and model
+        """
+        return {**self.admission.metrics, "coalesced": self.coalescer.coalesced}
+
+    async def status(self, task_id: uuid_hex_t, wait: float = 0, version: Optional[str] = None) -> TaskResponse:
         """
         Get the status of a task.
+        Long polling: if the task still matches the given version, the request is held until
+        the task changes (status, position, result) or until the wait time is over.
+        Without a version the request waits for the next change of the task.
         :param task_id: ID of the task.
+        :param wait: max seconds to wait for a change, capped by the server.
+        :param version: the version of the last response the client got for this task (default is the current one).
         :return: Status of the task.
         """
-        task = self.tasks.get(task_id, None)
+        response = self.task_response(await self.__get_task_or_400(task_id))
+        if wait <= 0:
+            return response
+        if version is None:
+            version = response.version
+        elif response.version != version:
+            return response
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, min(wait, STATUS_MAX_WAIT_S))
+        while response.version == version and (remaining_s := deadline - loop.time()) > 0:
+            # when the queue moves on only the position of waiting tasks changes
+            if not await self.task_notifier.wait(task_id, remaining_s, response.status == "pending"):
+                break
+            response = self.task_response(await self.__get_task_or_400(task_id))
+
+        return response
+
+    async def bulk_status(self, request: BulkStatusRequest) -> BulkStatusResponse:
+        """
+        Get the status of many tasks in one request.
+        With changed_since only tasks that changed after that point are returned,
+        the change_seq of the response is the value for changed_since of the next request.
+        """
+        found = await self.__get_tasks(request.task_ids)
+        unknown_task_ids = [task_id for task_id in request.task_ids if task_id not in found]
+
+        if (changed_since := request.changed_since) is not None:
+            # the position of every queued task changes when the queue moves on
+            queue_moved = self.task_notifier.notify_all_version > changed_since
+            found = {
+                task_id: task
+                for task_id, task in found.items()
+                if (task.change_seq or 0) > changed_since or (queue_moved and task.status in ["pending", "processing"])
+            }
+
+        return BulkStatusResponse(
+            tasks=[self.task_response(task) for task in found.values()],
+            unknown_task_ids=unknown_task_ids,
+            # all changes are applied on the event loop, so nothing changed since the tasks were read
+            change_seq=self.task_notifier.version,
+        )
+
+    async def cancel(self, task_id: uuid_hex_t) -> TaskResponse:
+        """
+        Cancel a task that is not done yet.
+        A queued task is removed from the queue, a task in processing stops after the window in progress.
+        :param task_id: ID of the task.
+        :return: Status of the task.
+        """
+        task = await self.__get_task_or_400(task_id)
+        if task.status not in ["pending", "processing"]:
+            logger.info(f"task_id '{uuid_log_format(task_id)}' can't be cancelled, status: '{task.status}'")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Task can't be cancelled, status: '{task.status}'",
+            )
+
+        # the decode goes on as long as identical tasks wait for it
+        leader_id = task.follows or task.uuid
+        carries_decode = self.coalescer.carrier_of(leader_id) == task.uuid
+        decode_needed = self.coalescer.leave(task)
+
+        # the audio is deleted with the decoder's update about the cancel, our status might trail its queue:
+        # a task that looks pending here might have been taken from the queue already
+        task.status = "cancelled"
+        task.position_in_queue = None
+        task.whisper_result = None
+        if not carries_decode:
+            self.__store_task(task)
+        elif decode_needed:
+            # the next task that waits for the decode takes it over, it's accounted to that task from now on
+            self.__store_task(task)
+            self.admission.hand_over(task, self.tasks[self.coalescer.carrier_of(leader_id)])
+        else:
+            self.add_task(task)
+
+        if not decode_needed:
+            self.conn_to_child.send("cancel", leader_id)
+        logger.info(f"Cancelled task '{uuid_log_format(task_id)}'")
+
+        return self.task_response(task)
+
+    async def __get_task(self, task_id: uuid_hex_t) -> Optional[Task]:
+        """Get a task, a lookup that misses the cache in front of a disk tier is done in the threadpool"""
+        if not isinstance(self.tasks, StoreBackedTempDict):
+            return self.tasks.get(task_id, None)
+
+        if (task := self.tasks.get_cached(task_id)) is not None:
+            return task
+        return await run_in_threadpool(self.tasks.get, task_id, None)
+
+    async def __get_tasks(self, task_ids: list[uuid_hex_t]) -> dict[uuid_hex_t, Task]:
+        """Get all given tasks that are known, in the given order, lookups that miss the cache like __get_task"""
+        if not isinstance(self.tasks, StoreBackedTempDict):
+            return self.tasks.get_many(task_ids)
+
+        found = self.tasks.get_many_cached(task_ids)
+        if missing := [task_id for task_id in task_ids if task_id not in found]:
+            found.update(await run_in_threadpool(self.tasks.get_many, missing))
+        return {task_id: found[task_id] for task_id in task_ids if task_id in found}
+
+    async def __get_task_or_400(self, task_id: uuid_hex_t) -> Task:
+        task = await self.__get_task(task_id)
         if task is None:
             logger.info(f"task_id '{uuid_log_format(task_id)}' not found")
             raise HTTPException(
@@ -95,48 +343,447 @@ class EndPoints:
                 detail="task_id not valid",
             )
 
-        return task.to_transmit_full
+        return task
 
-    async def __upload_file_to_named_temp_file(self, file: UploadFile) -> NamedTemporaryFile:
-        named_temp_file = NamedTemporaryFile()
-        named_temp_file.write(await file.read())
-        return named_temp_file
+    def __new_named_temp_file(self) -> NamedTemporaryFile:
+        # files in the spool dir are deleted once their task is done, not when they're closed
+        if self.audio_spool_dir:
+            return NamedTemporaryFile(dir=self.audio_spool_dir, delete=False)
+        return NamedTemporaryFile()
 
-    async def __start_task(self, file: UploadFile, source_language: str, task_type: task_type_str_t) -> Task:
+    @staticmethod
+    def __discard_named_temp_file(named_file: NamedTemporaryFile):
+        named_file.close()
+        if os.path.exists(named_file.name):
+            os.remove(named_file.name)
 
-        named_file = await self.__upload_file_to_named_temp_file(file)
+    async def __upload_file_to_named_temp_file(self, file: UploadFile) -> tuple[NamedTemporaryFile, str]:
+        """
+        Returns:
+            the file and the sha256 of its content
+        """
+        named_temp_file = self.__new_named_temp_file()
+        content = await file.read()
+        named_temp_file.write(content)
+        # the file is probed by its name, nothing may be left in the buffer
+        named_temp_file.flush()
+        return named_temp_file, hashlib.sha256(content).hexdigest()
 
-        # test that file has audio track
-        if not self.is_file_audio(named_file.name):
-            logger.info(f"File '{named_file.name}' has no audio track.")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File has no audio track.")
+    @staticmethod
+    def __new_task(
+        audiofile_name: str,
+        original_file_name: Optional[str],
+        source_language: str,
+        task_type: job_type_str_t,
+        content_sha256: Optional[str],
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> Task:
+        # without a deadline of its own the task gets the default one, if there is any
+        deadline_s = deadline_s if deadline_s is not None else DEFAULT_DEADLINE_S or None
+        deadline = dt.datetime.now() + dt.timedelta(seconds=deadline_s) if deadline_s is not None else None
 
-        self.open_audio_files_dict[named_file.name] = named_file
-        if file.filename is not None:
-            task = Task(
-                audiofile_name=named_file.name,
+        if original_file_name is not None:
+            return Task(
+                audiofile_name=audiofile_name,
                 source_language=source_language,
                 task_type=task_type,
-                original_file_name=file.filename,
+                original_file_name=original_file_name,
+                content_sha256=content_sha256,
+                tiered=draft,
+                deadline=deadline,
+                decoding_preset=preset,
             )
-        else:
-            task = Task(audiofile_name=named_file.name, source_language=source_language, task_type=task_type)
+
+        return Task(
+            audiofile_name=audiofile_name,
+            source_language=source_language,
+            task_type=task_type,
+            content_sha256=content_sha256,
+            tiered=draft,
+            deadline=deadline,
+            decoding_preset=preset,
+        )
+
+    def __register_task(self, task: Task, named_file: NamedTemporaryFile, audio_duration_s: float):
+        """Register a task for a file that passed the checks, it still needs to be sent to the decoder"""
+        self.open_audio_files_dict[named_file.name] = named_file
+        task.audio_duration_s = audio_duration_s
+        self.add_task(task)
+        self.coalescer.lead(task)
+
+    def __follow_identical(self, task: Task) -> bool:
+        """
+        Attach a new task to an identical task in flight instead of decoding it again
+        The task shares the audio file of the task that is decoded and needs no slot in the queue.
+        Returns:
+            True if the task follows another task, it must not be sent to the decoder then
+        """
+        if (leader_id := self.coalescer.leader_for(task)) is None:
+            return False
+
+        # the carrier has the state of the decode, even if the leader itself was cancelled
+        if (decoded := self.tasks.get(self.coalescer.carrier_of(leader_id), None)) is None:
+            return False
+
+        self.coalescer.follow(leader_id, task)
+        task.audiofile_name = decoded.audiofile_name
+        task.owns_audiofile = False
+        task.audio_duration_s = decoded.audio_duration_s
+        self.coalescer.mirror(decoded, task)
+        self.__store_task(task)
+        logger.info(f"Task '{uuid_log_format(task.uuid)}' follows identical task '{uuid_log_format(leader_id)}'")
+
+        return True
+
+    async def __start_task(
+        self,
+        file: UploadFile,
+        source_language: str,
+        task_type: task_type_str_t,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> Task:
+
+        named_file, content_sha256 = await self.__upload_file_to_named_temp_file(file)
+
+        task = self.__new_task(
+            named_file.name, file.filename, source_language, task_type, content_sha256, draft, deadline_s, preset
+        )
+        if self.__follow_identical(task):
+            self.__discard_named_temp_file(named_file)
+            return task
+
+        # test that file has audio track and that it's still accepted now that its duration is known
+        try:
+            audio_duration_s = self.__admit_audio(
+                await run_in_threadpool(self.get_audio_duration_s, named_file.name), named_file.name
+            )
+        except HTTPException:
+            self.__discard_named_temp_file(named_file)
+            raise
+
+        self.__register_task(task, named_file, audio_duration_s)
+
+        # send task into queue
+        self.conn_to_child.send("decode", task)
+
+        return task
+
+    def __admit_audio(self, audio_duration_s: Optional[float], file_name: str) -> float:
+        """
+        Check the probed audio of a new task against the limits, must be called from the event loop
+        Returns:
+            the duration of the audio
+        """
+        if audio_duration_s is None:
+            logger.info(f"File '{file_name}' has no audio track.")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File has no audio track.")
+
+        if MAX_AUDIO_DURATION_S and audio_duration_s > MAX_AUDIO_DURATION_S:
+            logger.info(f"File '{file_name}' is too long ({audio_duration_s:.0f}s).")
+            raise HTTPException(413, detail=f"Audio is longer than {MAX_AUDIO_DURATION_S:.0f}s.")
+
+        self.admission.check(1, audio_duration_s)
+
+        return audio_duration_s
+
+    @staticmethod
+    def resolve_ingest_path(path: str) -> str:
+        """
+        Resolve a path that shall be decoded in place, it must be a file within one of the INGEST_DIRS
+        Symlinks are resolved first, so they can't point outside the directories.
+        Returns:
+            the resolved path
+        """
+        real_path = os.path.realpath(path)
+        if not any(os.path.commonpath([real_path, ingest_dir]) == ingest_dir for ingest_dir in INGEST_DIRS):
+            logger.info(f"Path '{path}' is not within the ingest directories")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Path is not in an allowed directory.")
+
+        if not os.path.isfile(real_path):
+            logger.info(f"Path '{path}' is no file")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Path is no file.")
+
+        return real_path
+
+    async def __start_task_from_path(
+        self,
+        path: str,
+        source_language: Optional[str],
+        task_type: task_type_str_t,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> Task:
+        """Create a task for a file that is decoded where it is, without an upload or a copy"""
+        real_path = self.resolve_ingest_path(path)
+
+        # the file might be on a network share, so don't block the loop while it's read
+        task = self.__new_task(
+            real_path,
+            os.path.basename(real_path),
+            source_language,
+            task_type,
+            await run_in_threadpool(file_sha256, real_path),
+            draft,
+            deadline_s,
+            preset,
+        )
+        task.owns_audiofile = False
+        if self.__follow_identical(task):
+            return task
+
+        task.audio_duration_s = self.__admit_audio(
+            await run_in_threadpool(self.get_audio_duration_s, real_path), real_path
+        )
         self.add_task(task)
+        self.coalescer.lead(task)
 
         # send task into queue
-        # TODO: find out of json serialization is really needed
-        task_dict = {"type": "decode", "data": task.to_json}
-        self.conn_to_child.send(task_dict)
+        self.conn_to_child.send("decode", task)
 
         return task
 
-    async def srt(self, task_id: uuid_hex_t):
+    def __ingest_batch_files(
+        self, files: list[UploadFile]
+    ) -> tuple[list[tuple[NamedTemporaryFile, str, float, str]], list[str]]:
         """
-        Get the SRT file of a task.
+        Copy all files (or the members of archives) to named temp files and check them for an audio track
+        This is blocking, so it's meant to be run in the threadpool.
+        Returns:
+            the accepted files with their original names, audio durations and sha256 and the names of the rejected ones
+        """
+        accepted: list[tuple[NamedTemporaryFile, str, float, str]] = []
+        rejected: list[str] = []
+        # every file counts against the limits before it is copied, the rejected ones too
+        max_bytes = MAX_BATCH_MB * 1024**2 or None
+        copied_bytes = 0
+
+        def ingest(file_name: str, size: Optional[int], source):
+            nonlocal copied_bytes
+            if len(accepted) + len(rejected) >= MAX_BATCH_FILES:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Batch contains more than {MAX_BATCH_FILES} files.",
+                )
+
+            # the size from the header is only a hint, the copy itself is capped to what's left of the budget
+            remaining_bytes = None if max_bytes is None else max_bytes - copied_bytes
+            if remaining_bytes is not None and size is not None and size > remaining_bytes:
+                raise HTTPException(413, detail=f"Batch exceeds {MAX_BATCH_MB} MB.")
+
+            named_file = self.__new_named_temp_file()
+            try:
+                # copy in chunks, an archive member is never read into memory as a whole
+                content_sha256 = copy_and_hash(source, named_file, remaining_bytes)
+            except ValueError:
+                self.__discard_named_temp_file(named_file)
+                raise HTTPException(413, detail=f"Batch exceeds {MAX_BATCH_MB} MB.")
+            named_file.flush()
+            copied_bytes += named_file.tell()
+
+            audio_duration_s = self.get_audio_duration_s(named_file.name)
+            if audio_duration_s is None:
+                logger.info(f"Batch file '{file_name}' has no audio track.")
+            elif MAX_AUDIO_DURATION_S and audio_duration_s > MAX_AUDIO_DURATION_S:
+                logger.info(f"Batch file '{file_name}' is too long ({audio_duration_s:.0f}s).")
+            else:
+                accepted.append((named_file, file_name, audio_duration_s, content_sha256))
+                return
+
+            rejected.append(file_name)
+            self.__discard_named_temp_file(named_file)
+
+        try:
+            for file in files:
+                if not is_archive(file.file):
+                    ingest(file.filename or "unknown", file.size, file.file)
+                    continue
+
+                for member_name, member_size, member in iter_archive_members(file.file):
+                    ingest(member_name, member_size, member)
+
+        # nothing of a failed batch is kept
+        except BaseException as e:
+            for named_file, *_ in accepted:
+                self.__discard_named_temp_file(named_file)
+
+            if isinstance(e, (zipfile.BadZipFile, tarfile.TarError)):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Archive can't be read: {e}")
+            raise
+
+        return accepted, rejected
+
+    async def __start_batch(
+        self,
+        files: list[UploadFile],
+        source_language: Optional[str],
+        task_type: task_type_str_t,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> JobGroup:
+        """Create a task for each audio file of the batch and send them all to the decoder in one message"""
+        accepted, rejected = await run_in_threadpool(self.__ingest_batch_files, files)
+        if not accepted:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch contains no audio files.")
+
+        tasks = [
+            self.__new_task(
+                named_file.name, file_name, source_language, task_type, content_sha256, draft, deadline_s, preset
+            )
+            for named_file, file_name, _, content_sha256 in accepted
+        ]
+
+        # only files that are not in flight already need decoding, duplicates within the batch count once
+        new_decodes: dict[tuple | str, float] = {}
+        for task, (_, _, audio_duration_s, _) in zip(tasks, accepted):
+            if self.coalescer.leader_for(task) is None:
+                # tasks that are never grouped (e.g. with a deadline) count on their own
+                new_decodes.setdefault(self.coalescer.fingerprint(task) or task.uuid, audio_duration_s)
+
+        # the batch is accepted as a whole or not at all
+        try:
+            if new_decodes:
+                self.admission.check(len(new_decodes), sum(new_decodes.values()))
+        except HTTPException:
+            for named_file, *_ in accepted:
+                self.__discard_named_temp_file(named_file)
+            raise
+
+        decoded_tasks: list[Task] = []
+        for task, (named_file, _, audio_duration_s, _) in zip(tasks, accepted):
+            if self.__follow_identical(task):
+                self.__discard_named_temp_file(named_file)
+                continue
+
+            self.__register_task(task, named_file, audio_duration_s)
+            decoded_tasks.append(task)
+        group = JobGroup(task_type=task_type, task_ids=[task.uuid for task in tasks], rejected_files=rejected)
+        self.job_groups[group.group_id] = group
+        logger.info(
+            f"Created job group '{uuid_log_format(group.group_id)}' with {len(tasks)} tasks, {len(rejected)} rejected"
+        )
+
+        if decoded_tasks:
+            self.conn_to_child.send("decode_batch", decoded_tasks)
+
+        return group
+
+    def __get_job_group_or_400(self, group_id: uuid_hex_t) -> JobGroup:
+        group = self.job_groups.get(group_id, None)
+        if group is None:
+            logger.info(f"group_id '{uuid_log_format(group_id)}' not found")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="group_id not valid",
+            )
+
+        return group
+
+    async def transcribe_batch(
+        self,
+        files: list[UploadFile],
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> JobGroupResponse:
+        """
+        Transcribe many files at once, the files can also be zip or tar archives containing the audio files.
+        Files without an audio track are skipped and listed in the response.
+        With draft each file gets a quick draft first, see transcribe(), deadline_s and preset apply to every file.
+        """
+        group = await self.__start_batch(files, language, "transcribe", draft, deadline_s, preset)
+
+        return group.to_response(await self.__get_tasks(group.task_ids))
+
+    async def translate_batch(
+        self,
+        files: list[UploadFile],
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> JobGroupResponse:
+        """
+        Translate many files at once, the files can also be zip or tar archives containing the audio files.
+        Files without an audio track are skipped and listed in the response.
+        With draft each file gets a quick draft first, see transcribe(), deadline_s and preset apply to every file.
+        """
+        group = await self.__start_batch(files, language, "translate", draft, deadline_s, preset)
+
+        return group.to_response(await self.__get_tasks(group.task_ids))
+
+    async def batch_status(self, group_id: uuid_hex_t) -> JobGroupResponse:
+        """
+        Get the aggregated status of a batch.
+        Use /bulk_status with the task_ids for the status of the single tasks.
+        """
+        group = self.__get_job_group_or_400(group_id)
+
+        return group.to_response(await self.__get_tasks(group.task_ids))
+
+    async def batch_srt(self, group_id: uuid_hex_t):
+        """
+        Get the SRT files of all finished tasks of a batch as one zip archive.
+        The archive is streamed while it's built.
+        """
+        group = self.__get_job_group_or_400(group_id)
+        tasks = await self.__get_tasks(group.task_ids)
+        finished_tasks = [
+            task for task_id in group.task_ids if (task := tasks.get(task_id)) is not None and task.status == "finished"
+        ]
+        if not finished_tasks:
+            logger.info(f"group_id '{uuid_log_format(group_id)}' has no finished tasks")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=group.to_response(tasks).model_dump(mode="json"),
+            )
+
+        file_names = unique_file_names(
+            f"{task.original_file_name}_{task.whisper_result.output_language}.srt" for task in finished_tasks
+        )
+        # the SRTs are only rendered (if not cached already) when it's their turn to be written to the archive
+        srt_files = ((name, self.__render_cached(task, "srt").body) for name, task in zip(file_names, finished_tasks))
+
+        headers = {"Content-Disposition": f"attachment; filename=whisper_batch_{group.group_id}.zip"}
+        return StreamingResponse(stream_zip(srt_files), media_type="application/zip", headers=headers)
+
+    def __render_cached(self, task: Task, transcript_format: transcript_format_t) -> PrecompressedBody:
+        """Get the rendered result of a task, it's rendered on the first request only (threadsafe)"""
+        render_key = self.__render_key(task)
+        renders = self.rendered_transcripts.get(render_key, None) or {}
+        if (rendered := renders.get(transcript_format)) is None:
+            rendered = render_transcript(task.whisper_result, transcript_format)
+            # set a new dict, so the size of the entry is estimated again
+            self.rendered_transcripts[render_key] = {**renders, transcript_format: rendered}
+
+        return rendered
+
+    @staticmethod
+    def __render_key(task: Task) -> str:
+        """Drafts are cached separately, so the final result of a task is not shadowed by the renders of its draft"""
+        return f"{task.uuid}-draft" if task.result_tier == "draft" else task.uuid
+
+    async def transcript(
+        self,
+        request: Request,
+        task_id: uuid_hex_t,
+        transcript_format: transcript_format_t = Query("srt", alias="format"),
+    ) -> Response:
+        """
+        Get the result of a task as file in one of the formats srt, vtt, tsv, json or txt.
+        Responses carry an ETag, a request with a matching If-None-Match header gets an empty 304.
+        The file is compressed if the client accepts it.
         :param task_id: ID of the task.
-        :return: SRT file of the task.
+        :param transcript_format: the format of the file.
+        :return: the file.
         """
-        task = self.tasks.get(task_id, None)
+        task = await self.__get_task(task_id)
         # TODO maybe hold a set of tasks that were present but aren't any more for better message?
         if task is None:
             logger.info(f"task_id '{uuid_log_format(task_id)}' not found")
@@ -146,32 +793,334 @@ class EndPoints:
             )
 
         # TODO better way for central declaration of those states
-        if task.status in ["pending", "processing", "failed"]:
+        # a draft can be read while the final result is pending
+        if task.whisper_result is None or task.status in ["failed", "cancelled"]:
             logger.info(f"task_id '{uuid_log_format(task_id)}' not ready or failed, status: '{task.status}'")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=task.to_transmit_full,
+                detail=self.task_response(task),
             )
 
+        # the fast path is a lookup, rendering a long result is done in the threadpool
+        renders = self.rendered_transcripts.get(self.__render_key(task), None)
+        rendered = renders.get(transcript_format) if renders else None
+        if rendered is None:
+            rendered = await run_in_threadpool(self.__render_cached, task, transcript_format)
+
+        # results are private, caches may keep them but must ask if they're still valid
         headers = {
+            "Cache-Control": "private, no-cache",
             "Content-Disposition": f"attachment; "
-            f"filename={task.original_file_name}_{task.whisper_result.output_language}.srt",
-            "Content-Type": "text/plain",
+            f"filename={task.original_file_name}_{task.whisper_result.output_language}.{transcript_format}",
         }
+        return rendered.response(request, headers)
 
-        srt_buffer = task.whisper_result.get_srt_buffer()
-        return StreamingResponse(iter(srt_buffer.readline, ""), headers=headers)
+    async def srt(self, request: Request, task_id: uuid_hex_t) -> Response:
+        """
+        Get the SRT file of a task.
+        :param task_id: ID of the task.
+        :return: SRT file of the task.
+        """
+        return await self.transcript(request, task_id, "srt")
+
+    async def transcribe(
+        self,
+        file: UploadFile,
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ):
+        """
+        Transcribe a file.
+        :param draft: publish a quick draft of the small DRAFT_MODEL first, it's replaced by the final transcript
+                      of the large model later on - result_tier of the status tells which one is shown.
+        :param deadline_s: seconds until the transcript is needed (default DEFAULT_DEADLINE_S), a smaller model
+                           is used if the large one wouldn't make it - model_choice_reason of the result tells why.
+        :param preset: the decoding options - "fast" skips the fallbacks of whisper, "accurate" uses beam search.
+        """
+        task = await self.__start_task(file, language, "transcribe", draft, deadline_s, preset)
+
+        return self.task_response(task)
+
+    async def translate(
+        self,
+        file: UploadFile,
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ):
+        """
+        Translate a file to english.
+        :param draft: publish a quick draft first, see transcribe().
+        :param deadline_s: seconds until the translation is needed, see transcribe().
+        :param preset: the decoding options, see transcribe().
+        """
+        task = await self.__start_task(file, language, "translate", draft, deadline_s, preset)
 
-    async def transcribe(self, file: UploadFile, language: Optional[str] = None):
-        task = await self.__start_task(file, language, "transcribe")
+        return self.task_response(task)
 
-        return task.to_transmit_full
+    async def detect_language(self, file: UploadFile, wait: float = STATUS_MAX_WAIT_S) -> TaskResponse:
+        """
+        Detect the spoken language of a file on its first 30 seconds.
+        The detection doesn't wait in the decode queue, the request is held until it's done or the wait time is over.
+        :param file: the audio file.
+        :param wait: max seconds to wait for the result, capped by the server - poll the status afterwards.
+        :return: Status of the task, with the most probable languages when it's finished.
+        """
+        named_file, _ = await self.__upload_file_to_named_temp_file(file)
+        task = self.__new_task(named_file.name, file.filename, None, "detect_language", None)
+        self.open_audio_files_dict[named_file.name] = named_file
+        # it needs no slot in the queue, so it's not tracked for admission
+        self.__store_task(task)
+        self.conn_to_child.send("detect_language", task)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, min(wait, STATUS_MAX_WAIT_S))
+        while task.status == "pending" and (remaining_s := deadline - loop.time()) > 0:
+            if not await self.task_notifier.wait(task.uuid, remaining_s):
+                break
+            task = await self.__get_task_or_400(task.uuid)
+
+        return self.task_response(task)
+
+    def __get_upload_or_400(self, upload_id: uuid_hex_t) -> ResumableUpload:
+        upload = self.uploads.get(upload_id, None)
+        if upload is None:
+            logger.info(f"upload_id '{uuid_log_format(upload_id)}' not found")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="upload_id not valid",
+            )
+
+        return upload
+
+    async def create_upload(self, size: int, file_name: Optional[str] = None) -> UploadResponse:
+        """
+        Start a resumable upload of a file with the given size in bytes.
+        Send the data with PATCH /upload, check how much arrived with GET /upload
+        and turn the complete upload into a task with /upload_finalize.
+        """
+        if size <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="size must be greater than 0")
+        if size > MAX_UPLOAD_MB * 1024**2:
+            raise HTTPException(413, detail=f"Uploads may not exceed {MAX_UPLOAD_MB}MB")
+        # every open upload holds a file on disk until it's finalized or expired
+        if len(self.uploads) >= MAX_OPEN_UPLOADS:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many uploads in progress, please try again later",
+            )
 
-    async def translate(self, file: UploadFile, language: Optional[str] = None):
+        upload = ResumableUpload(self.__new_named_temp_file(), size, file_name)
+        self.uploads[upload.upload_id] = upload
+        logger.info(f"Created upload '{uuid_log_format(upload.upload_id)}' of {size} bytes")
 
-        task = await self.__start_task(file, language, "translate")
+        return upload.to_response()
 
-        return task.to_transmit_full
+    async def upload_status(self, upload_id: uuid_hex_t) -> UploadResponse:
+        """Get the state of an upload, the offset is where the upload continues"""
+        return self.__get_upload_or_400(upload_id).to_response()
+
+    async def append_to_upload(self, request: Request, upload_id: uuid_hex_t, offset: int) -> UploadResponse:
+        """
+        Append the raw request body to the upload.
+        The offset must be the current offset of the upload (see GET /upload), otherwise 409 is returned.
+        If the connection breaks, everything that arrived is kept and the upload can be continued from there.
+        """
+        upload = self.__get_upload_or_400(upload_id)
+        if upload.lock.locked():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is in progress in another request")
+
+        async with upload.lock:
+            if offset != upload.offset:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=upload.to_response().model_dump())
+
+            # reject a body that is too large before any of it is written, if the client told us its size
+            if content_length := request.headers.get("Content-Length"):
+                try:
+                    body_size = int(content_length)
+                except ValueError:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+                if offset + body_size > upload.size:
+                    raise HTTPException(413, detail=f"Body exceeds the upload size of {upload.size} bytes")
+
+            try:
+                # the chunks go straight to the file, the body is never held as a whole
+                async for chunk in request.stream():
+                    upload.append(chunk)
+                    # a long transfer counts as usage, it must not expire while it's running
+                    self.uploads.extend_lifespan(upload_id)
+
+            except ValueError as e:
+                raise HTTPException(413, detail=str(e))
+
+            except ClientDisconnect:
+                logger.info(f"Client disconnected during upload '{uuid_log_format(upload_id)}' at {upload.offset=}")
+
+            except KeyError:
+                raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload expired")
+
+            finally:
+                upload.file.flush()
+
+        return upload.to_response()
+
+    async def cancel_upload(self, upload_id: uuid_hex_t) -> UploadResponse:
+        """Give up an upload and delete what was uploaded so far"""
+        upload = self.__get_upload_or_400(upload_id)
+        del self.uploads[upload_id]
+        self.__discard_named_temp_file(upload.file)
+
+        return upload.to_response()
+
+    async def finalize_upload(
+        self,
+        upload_id: uuid_hex_t,
+        task_type: task_type_str_t = "transcribe",
+        language: Optional[str] = None,
+        sha256: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> TaskResponse:
+        """
+        Turn a complete upload into a task.
+        :param sha256: optional checksum of the file, the upload is discarded if it doesn't match.
+        :param draft: publish a quick draft first, see transcribe().
+        :param deadline_s: seconds until the result is needed, see transcribe().
+        :param preset: the decoding options, see transcribe().
+        """
+        upload = self.__get_upload_or_400(upload_id)
+        if upload.lock.locked() or not upload.is_complete:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=upload.to_response().model_dump())
+
+        del self.uploads[upload_id]
+
+        if sha256 is not None and sha256.lower() != upload.sha256:
+            logger.info(f"Upload '{uuid_log_format(upload_id)}' doesn't match the given checksum")
+            self.__discard_named_temp_file(upload.file)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Checksum does not match.")
+
+        task = self.__new_task(
+            upload.file.name, upload.file_name, language, task_type, upload.sha256, draft, deadline_s, preset
+        )
+        if self.__follow_identical(task):
+            self.__discard_named_temp_file(upload.file)
+            return self.task_response(task)
+
+        try:
+            audio_duration_s = self.__admit_audio(
+                await run_in_threadpool(self.get_audio_duration_s, upload.file.name), upload.file.name
+            )
+        except HTTPException:
+            self.__discard_named_temp_file(upload.file)
+            raise
+
+        self.__register_task(task, upload.file, audio_duration_s)
+
+        # send task into queue
+        self.conn_to_child.send("decode", task)
+
+        return self.task_response(task)
+
+    async def submit_pcm(
+        self,
+        request: Request,
+        task_type: task_type_str_t = "transcribe",
+        language: Optional[str] = None,
+        sample_rate: int = SAMPLE_RATE,
+        channels: int = 1,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ) -> TaskResponse:
+        """
+        Submit raw PCM as the request body: 16 bit little endian samples, interleaved if there are several channels.
+        At 16kHz mono (the default) nothing has to be decoded at all, it's the cheapest way to submit short clips.
+        :param draft: publish a quick draft first, see transcribe().
+        :param deadline_s: seconds until the result is needed, see transcribe().
+        :param preset: the decoding options, see transcribe().
+        """
+        if sample_rate <= 0 or not 1 <= channels <= 8:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sample_rate or channels.")
+
+        bytes_per_s = sample_rate * channels * PCM_SAMPLE_WIDTH
+        # the same samples in another format are other audio
+        content_hash = hashlib.sha256(f"pcm/{sample_rate}/{channels}/".encode())
+        received_bytes = 0
+        # the samples are stored as WAV, which the decoder reads without ffmpeg
+        named_file = self.__new_named_temp_file()
+        writer = PcmWavWriter(named_file, sample_rate, channels)
+        try:
+            async for chunk in request.stream():
+                received_bytes += len(chunk)
+                if MAX_AUDIO_DURATION_S and received_bytes > MAX_AUDIO_DURATION_S * bytes_per_s:
+                    raise HTTPException(413, detail=f"Audio is longer than {MAX_AUDIO_DURATION_S:.0f}s.")
+                writer.write(chunk)
+                content_hash.update(chunk)
+
+            writer.close()
+            named_file.flush()
+
+        except ClientDisconnect:
+            self.__discard_named_temp_file(named_file)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is incomplete.")
+
+        except HTTPException:
+            self.__discard_named_temp_file(named_file)
+            raise
+
+        if received_bytes < channels * PCM_SAMPLE_WIDTH:
+            self.__discard_named_temp_file(named_file)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body contains no samples.")
+
+        task = self.__new_task(
+            named_file.name, None, language, task_type, content_hash.hexdigest(), draft, deadline_s, preset
+        )
+        if self.__follow_identical(task):
+            self.__discard_named_temp_file(named_file)
+            return self.task_response(task)
+
+        try:
+            audio_duration_s = self.__admit_audio(received_bytes / bytes_per_s, named_file.name)
+        except HTTPException:
+            self.__discard_named_temp_file(named_file)
+            raise
+
+        self.__register_task(task, named_file, audio_duration_s)
+
+        # send task into queue
+        self.conn_to_child.send("decode", task)
+
+        return self.task_response(task)
+
+    async def transcribe_path(
+        self,
+        path: str,
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ):
+        """Transcribe a file within one of the INGEST_DIRS of the server, the file is read in place"""
+        task = await self.__start_task_from_path(path, language, "transcribe", draft, deadline_s, preset)
+
+        return self.task_response(task)
+
+    async def translate_path(
+        self,
+        path: str,
+        language: Optional[str] = None,
+        draft: bool = False,
+        deadline_s: Optional[float] = None,
+        preset: decoding_preset_str_t = "balanced",
+    ):
+        """Translate a file within one of the INGEST_DIRS of the server, the file is read in place"""
+        task = await self.__start_task_from_path(path, language, "translate", draft, deadline_s, preset)
+
+        return self.task_response(task)
 
     async def userinfo(self, request: Request = None):
 
@@ -238,15 +1187,35 @@ class EndPoints:
         :param file_path: path to file
         :return: True if file contains audio, False otherwise.
         """
+        return EndPoints.get_audio_duration_s(file_path) is not None
+
+    @staticmethod
+    def get_audio_duration_s(file_path: str) -> Optional[float]:
+        """
+        Get the duration of the audio stream of the file.
+        :param file_path: path to file
+        :return: the duration in seconds (0 if the file doesn't tell), None if the file contains no audio.
+        """
+        # common formats are read in-process, ffprobe is only spawned for the rest
+        if (duration_s := probe_duration_s(file_path)) is not None:
+            return duration_s
 
         try:
             probe = ffmpeg.probe(file_path)
             audio_stream = next((stream for stream in probe["streams"] if stream["codec_type"] == "audio"), None)
-            return audio_stream is not None
+            if audio_stream is None:
+                return None
+
+            # streams in some containers only have a duration in the format section
+            duration = audio_stream.get("duration") or probe.get("format", {}).get("duration")
+            try:
+                return float(duration)
+            except (TypeError, ValueError):
+                return 0.0
 
         except ffmpeg.Error as e:
             logger.warning(e.stderr)
-            return False
+            return None
 
     @staticmethod
     def get_version_info(request: Request):
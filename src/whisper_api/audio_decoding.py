@@ -0,0 +1,229 @@
+import struct
+import subprocess
+import wave
+from dataclasses import dataclass
+from typing import BinaryIO
+from typing import Optional
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+"""
+Decoding of audio to the input of whisper (mono float32 at 16kHz) without spawning ffmpeg for every file
+
+- 16 bit PCM WAV at 16kHz is memory-mapped and converted straight away, it needs no decoder at all
+- other WAVs, FLAC, Ogg (Vorbis, Opus) and MP3 are decoded with libsndfile and resampled with soxr
+  (both optional: pip install soundfile soxr)
+- everything else (video containers, AAC, ...) and files the libraries can't read are decoded with ffmpeg,
+  exactly like whisper.load_audio() does
+- raw PCM is stored as WAV, so it takes the first path
+
+The durations of submitted files are read the same way, ffprobe is the fallback.
+"""
+
+# the only format whisper's input is converted from without any decoding
+PCM_SAMPLE_WIDTH = 2
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavLayout:
+    """Where the samples of a PCM WAV are and how they are stored"""
+
+    channels: int
+    sample_rate: int
+    sample_width: int
+    data_offset: int
+    data_bytes: int
+
+    @property
+    def frames(self) -> int:
+        return self.data_bytes // (self.channels * self.sample_width)
+
+    @property
+    def duration_s(self) -> float:
+        return self.frames / self.sample_rate
+
+
+def read_wav_layout(path: str) -> Optional[WavLayout]:
+    """The layout of an integer PCM WAV from its header, None for anything else"""
+    with open(path, "rb") as file:
+        riff = file.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+
+        channels = sample_rate = sample_width = None
+        while len(chunk_header := file.read(8)) == 8:
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt = file.read(chunk_size)
+                # a truncated header is no WAV we can read
+                if len(fmt) < 16:
+                    return None
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                    if len(fmt) < 26:
+                        return None
+                    # the sub format starts with the format tag, the rest is the same GUID for all formats
+                    format_tag = struct.unpack("<H", fmt[24:26])[0]
+                if format_tag != WAVE_FORMAT_PCM or not bits or bits % 8 or not channels or not sample_rate:
+                    return None
+                sample_width = bits // 8
+                # chunks are padded to an even size
+                file.seek(chunk_size % 2, 1)
+
+            elif chunk_id == b"data":
+                if channels is None:
+                    return None
+                data_offset = file.tell()
+                # streamed WAVs may not know their size, the data runs until the end of the file then
+                data_bytes = min(chunk_size, file.seek(0, 2) - data_offset)
+                return WavLayout(channels, sample_rate, sample_width, data_offset, data_bytes)
+
+            else:
+                file.seek(chunk_size + chunk_size % 2, 1)
+
+    return None
+
+
+def probe_duration_s(path: str) -> Optional[float]:
+    """
+    The duration of the audio without ffprobe
+    Returns:
+        the duration in seconds, None if it can't be told in-process (it doesn't mean that there is no audio)
+    """
+    if (layout := read_wav_layout(path)) is not None:
+        return layout.duration_s
+
+    if soundfile is not None:
+        try:
+            return soundfile.info(path).duration
+        except RuntimeError:
+            pass
+
+    return None
+
+
+def load_audio(path: str, max_duration_s: Optional[float] = None) -> np.ndarray:
+    """
+    Decode a file to mono float32 at 16kHz, the drop-in for whisper.load_audio()
+    Args:
+        path: the audio file
+        max_duration_s: only decode the beginning of the file (default is the whole file)
+
+    Raises:
+        RuntimeError: if ffmpeg can't decode the file either
+    """
+    layout = read_wav_layout(path)
+    if layout is not None and layout.sample_rate == SAMPLE_RATE and layout.sample_width == PCM_SAMPLE_WIDTH:
+        return _load_pcm_wav(path, layout, max_duration_s)
+
+    if (audio := _load_with_soundfile(path, max_duration_s)) is not None:
+        return audio
+
+    return _load_with_ffmpeg(path, max_duration_s)
+
+
+def pcm_to_float(samples: np.ndarray, channels: int = 1) -> np.ndarray:
+    """Convert interleaved 16 bit samples to mono float32, like whisper does it with the output of ffmpeg"""
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32) / 32768.0
+
+
+def _load_pcm_wav(path: str, layout: WavLayout, max_duration_s: Optional[float]) -> np.ndarray:
+    """The samples are mapped, only what is converted is read from the disk"""
+    frames = layout.frames
+    if max_duration_s is not None:
+        frames = min(frames, int(max_duration_s * SAMPLE_RATE))
+    if frames == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    samples = np.memmap(path, dtype="<i2", mode="r", offset=layout.data_offset, shape=(frames * layout.channels,))
+    return pcm_to_float(samples, layout.channels)
+
+
+def _load_with_soundfile(path: str, max_duration_s: Optional[float]) -> Optional[np.ndarray]:
+    """Decode with libsndfile, None if it's not installed, can't read the file or the result can't be resampled"""
+    if soundfile is None:
+        return None
+
+    try:
+        with soundfile.SoundFile(path) as file:
+            if file.samplerate != SAMPLE_RATE and soxr is None:
+                return None
+
+            frames = -1 if max_duration_s is None else int(max_duration_s * file.samplerate)
+            audio = file.read(frames, dtype="float32", always_2d=True)
+            sample_rate = file.samplerate
+
+    except RuntimeError:
+        return None
+
+    audio = audio.mean(axis=1, dtype=np.float32)
+    if sample_rate != SAMPLE_RATE:
+        audio = soxr.resample(audio, sample_rate, SAMPLE_RATE).astype(np.float32, copy=False)
+
+    return audio
+
+
+def _load_with_ffmpeg(path: str, max_duration_s: Optional[float] = None) -> np.ndarray:
+    """
+    Decode with an ffmpeg process, like whisper.load_audio() does
+    Raises:
+        RuntimeError: if ffmpeg can't decode the file
+    """
+    # fmt: off
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads", "0",
+        "-i", path,
+        *(["-t", str(max_duration_s)] if max_duration_s is not None else []),
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-",
+    ]
+    # fmt: on
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+    return pcm_to_float(np.frombuffer(out, np.int16))
+
+
+class PcmWavWriter:
+    """Store raw 16 bit little endian PCM as a WAV file, the header is completed when it's closed"""
+
+    def __init__(self, target: BinaryIO, sample_rate: int = SAMPLE_RATE, channels: int = 1):
+        self.__wav = wave.open(target, "wb")
+        self.__wav.setnchannels(channels)
+        self.__wav.setsampwidth(PCM_SAMPLE_WIDTH)
+        self.__wav.setframerate(sample_rate)
+        self.frame_bytes = channels * PCM_SAMPLE_WIDTH
+        # a chunk may end within a frame, the rest is prepended to the next one
+        self.__partial = b""
+
+    def write(self, chunk: bytes):
+        data = self.__partial + chunk
+        cut = len(data) - len(data) % self.frame_bytes
+        self.__wav.writeframesraw(data[:cut])
+        self.__partial = data[cut:]
+
+    def close(self):
+        """Complete the header, the target file stays open - an incomplete last frame is dropped"""
+        self.__wav.close()
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Generic
+from typing import Hashable
+from typing import TypeVar
+
+"""
+Wake up requests that wait for something to change, e.g. the status of a task
+
+All methods must be called from the event loop, there is no locking.
+Notifications are not stored, a waiter only sees changes that happen after it started waiting.
+Every notification increases the version, so a change can be stamped with the version it got.
+notify_all only wakes the waiters that asked for it, most changes that concern all keys don't concern all waiters.
+"""
+
+key_t = TypeVar("key_t", bound=Hashable)
+
+
+class ChangeNotifier(Generic[key_t]):
+
+    def __init__(self, first_version: int = 0):
+        """
+        Args:
+            first_version: version to count up from
+        """
+        self.version = first_version
+        # version of the last notification that concerned all keys
+        self.notify_all_version = first_version
+        # only keys somebody is waiting for are present
+        self.__waiters: dict[key_t, set[asyncio.Future]] = {}
+        # the waiters that are woken by notify_all as well
+        self.__waiters_for_all: set[asyncio.Future] = set()
+
+    @property
+    def waiting(self) -> int:
+        """Number of currently waiting requests"""
+        return sum(len(waiters) for waiters in self.__waiters.values())
+
+    async def wait(self, key: key_t, timeout_s: float, wake_on_notify_all=False) -> bool:
+        """
+        Wait until key is notified
+        Args:
+            key: the key to wait for
+            timeout_s: max time to wait
+            wake_on_notify_all: if notify_all wakes this waiter too
+        Returns:
+            True if it was notified, False if the timeout expired first
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.__waiters.setdefault(key, set()).add(future)
+        if wake_on_notify_all:
+            self.__waiters_for_all.add(future)
+        try:
+            await asyncio.wait_for(future, timeout_s)
+            return True
+
+        # not the builtin: before Python 3.11 wait_for raises a TimeoutError of its own
+        except asyncio.TimeoutError:
+            return False
+
+        finally:
+            self.__waiters_for_all.discard(future)
+            # notify() already removed the set if the future was resolved by it
+            if (waiters := self.__waiters.get(key)) is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self.__waiters[key]
+
+    def notify(self, key: key_t) -> int:
+        """Wake up everybody waiting for key, returns the version of this change"""
+        self.version += 1
+        for future in self.__waiters.pop(key, ()):
+            if not future.done():
+                future.set_result(None)
+
+        return self.version
+
+    def notify_all(self) -> int:
+        """Wake up everybody who waits with wake_on_notify_all, returns the version of this change"""
+        self.version += 1
+        self.notify_all_version = self.version
+        waiters = self.__waiters_for_all
+        self.__waiters_for_all = set()
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+        return self.version
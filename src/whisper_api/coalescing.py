@@ -0,0 +1,158 @@
+import hashlib
+from typing import BinaryIO
+from typing import Optional
+
+from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.data_models.task import Task
+
+"""
+Coalescing of identical submissions: the same audio for the same job is decoded only once
+
+A task is identified by the hash of its audio, its task type, language, model, preset and if it gets a draft.
+Tasks with a deadline are never grouped, the deadline decides about the model that decodes them.
+The first task of its kind is decoded (the leader), all identical tasks that are submitted while
+it's pending or processing follow it: they never reach the decoder and get the state of the leader mirrored.
+A cancelled task leaves its group, the decode is only stopped when nobody is interested in it anymore.
+If the leader is cancelled, the first follower carries the decode from then on (admission, outcome).
+
+All methods must be called from the event loop, there is no locking.
+"""
+
+fingerprint_t = tuple[str, str, Optional[str], Optional[str], bool, str]
+
+# chunk size to hash files with
+HASH_CHUNK_SIZE = 1024**2
+
+
+def copy_and_hash(source: BinaryIO, target: BinaryIO, max_bytes: Optional[int] = None) -> str:
+    """
+    Copy a file object in chunks, returns the sha256 of the copied data
+    Raises:
+        ValueError: if the source has more than max_bytes, the part copied so far stays in the target
+    """
+    file_hash = hashlib.sha256()
+    copied = 0
+    while chunk := source.read(HASH_CHUNK_SIZE):
+        copied += len(chunk)
+        if max_bytes is not None and copied > max_bytes:
+            raise ValueError(f"File exceeds {max_bytes} bytes")
+        target.write(chunk)
+        file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """The sha256 of a file, it's read in chunks"""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+class SubmissionCoalescer:
+
+    def __init__(self):
+        # fingerprint -> task that is decoded for it
+        self.__leaders: dict[fingerprint_t, uuid_hex_t] = {}
+        # leader -> its fingerprint
+        self.__fingerprints: dict[uuid_hex_t, fingerprint_t] = {}
+        # leader -> all tasks that wait for its decode, including the leader until it's cancelled
+        self.__members: dict[uuid_hex_t, list[uuid_hex_t]] = {}
+        # number of tasks that followed another task instead of being decoded
+        self.coalesced = 0
+
+    @staticmethod
+    def fingerprint(task: Task) -> Optional[fingerprint_t]:
+        """
+        Everything that decides about the result of a task
+        None if the audio is not hashed or the task has a deadline: the model is chosen to meet the deadline,
+        so tasks with different deadlines (or none) don't get the same result.
+        """
+        if task.content_sha256 is None or task.deadline is not None:
+            return None
+
+        return (
+            task.content_sha256,
+            task.task_type,
+            task.source_language,
+            task.target_model_size,
+            task.tiered,
+            task.decoding_preset,
+        )
+
+    def leader_for(self, task: Task) -> Optional[uuid_hex_t]:
+        """The id of the task that is decoded for identical tasks, None if there is none in flight"""
+        if (fingerprint := self.fingerprint(task)) is None:
+            return None
+
+        return self.__leaders.get(fingerprint, None)
+
+    def lead(self, task: Task):
+        """Register a task that is sent to the decoder, identical tasks follow it from now on"""
+        if (fingerprint := self.fingerprint(task)) is None or fingerprint in self.__leaders:
+            return
+
+        self.__leaders[fingerprint] = task.uuid
+        self.__fingerprints[task.uuid] = fingerprint
+        self.__members[task.uuid] = [task.uuid]
+
+    def follow(self, leader_id: uuid_hex_t, task: Task):
+        """Attach a task to the decode of the leader"""
+        task.follows = leader_id
+        self.__members[leader_id].append(task.uuid)
+        self.coalesced += 1
+
+    def members_of(self, leader_id: uuid_hex_t) -> list[uuid_hex_t]:
+        """All tasks that wait for the decode of the leader, in the order they were submitted"""
+        return list(self.__members.get(leader_id, ()))
+
+    def carrier_of(self, leader_id: uuid_hex_t) -> uuid_hex_t:
+        """
+        The task the decode of the leader is done for: the leader, or the first follower once the leader was cancelled
+        The leader itself if nobody waits for the decode (anymore).
+        """
+        members = self.__members.get(leader_id)
+        return members[0] if members else leader_id
+
+    def followers_of(self, leader_id: uuid_hex_t) -> list[uuid_hex_t]:
+        """The tasks that get the state of the leader mirrored"""
+        return [task_id for task_id in self.__members.get(leader_id, ()) if task_id != leader_id]
+
+    def leave(self, task: Task) -> bool:
+        """
+        Remove a cancelled task from its group
+        Returns:
+            True if the decode of the group is still needed by other tasks
+        """
+        leader_id = task.follows or task.uuid
+        if (members := self.__members.get(leader_id)) is None:
+            return False
+
+        if task.uuid in members:
+            members.remove(task.uuid)
+
+        if members:
+            return True
+
+        self.done(leader_id)
+        return False
+
+    def done(self, leader_id: uuid_hex_t):
+        """Forget the group of a leader that is done, identical tasks submitted later are decoded again"""
+        if (fingerprint := self.__fingerprints.pop(leader_id, None)) is not None:
+            del self.__leaders[fingerprint]
+        self.__members.pop(leader_id, None)
+
+    @staticmethod
+    def mirror(leader: Task, follower: Task):
+        """Copy the decoding state of the leader to a follower"""
+        follower.status = leader.status
+        follower.position_in_queue = leader.position_in_queue
+        follower.queue_ticket = leader.queue_ticket
+        follower.whisper_result = leader.whisper_result
+        follower.result_tier = leader.result_tier
+        follower.target_model_size = leader.target_model_size
+        follower.used_device = leader.used_device
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Content negotiation and compression of responses
+
+- bodies that never change (static files, rendered transcripts) are compressed once with the best level
+  and served from memory with an ETag per representation, see PrecompressedBody
+- all other responses above a size threshold are compressed on the fly with a fast level, see CompressionMiddleware
+
+brotli is optional (pip install brotli), without it only gzip is offered.
+"""
+
+# in order of preference
+available_encodings: list[str] = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+# types that are worth compressing, everything else (audio, zip archives) is compressed already
+compressible_media_types = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the preferred encoding the client accepts from the Accept-Encoding header
+    Returns:
+        None if no compression shall be used
+    """
+    if not accept_encoding:
+        return None
+
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        qualities[name.strip()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    accepted = [(qualities.get(encoding, wildcard), encoding) for encoding in available_encodings]
+    # max() keeps the first of equal qualities, which is our preference
+    quality, encoding = max(accepted, key=lambda accepted_encoding: accepted_encoding[0])
+    return encoding if quality > 0 else None
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Args:
+        data: the body to compress
+        encoding: "gzip" or "br"
+        best: best compression for data that is compressed once and sent many times, otherwise a fast level
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 4)
+    # mtime=0 makes the output deterministic
+    return gzip.compress(data, compresslevel=9 if best else 5, mtime=0)
+
+
+class PrecompressedBody:
+    """A body that doesn't change, compressed into each available encoding once"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        # strong ETag, the body is identical byte by byte as long as the ETag is
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{digest}"'
+
+        # encoding -> (body, etag), only encodings that make the body smaller are kept
+        self.variants: dict[str, tuple[bytes, str]] = {}
+        if media_type.startswith(compressible_media_types):
+            for encoding in available_encodings:
+                if len(compressed := compress(body, encoding, best=True)) < len(body):
+                    # each representation needs its own strong ETag
+                    self.variants[encoding] = (compressed, f'"{digest}-{encoding}"')
+
+    @property
+    def size_bytes(self) -> int:
+        """size of the body and all its compressed variants"""
+        return len(self.body) + sum(len(body) for body, _ in self.variants.values())
+
+    def response(self, request: Request, headers: dict[str, str] = None) -> Response:
+        """Response with the best representation for the request, an empty 304 if the client has it already"""
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+        body, etag = self.body, self.etag
+        if (encoding := negotiate_encoding(request.headers.get("Accept-Encoding"))) in self.variants:
+            body, etag = self.variants[encoding]
+            headers["Content-Encoding"] = encoding
+        headers["ETag"] = etag
+
+        if (if_none_match := request.headers.get("If-None-Match")) is not None:
+            client_etags = {client_etag.strip().removeprefix("W/") for client_etag in if_none_match.split(",")}
+            if etag in client_etags or "*" in client_etags:
+                headers.pop("Content-Encoding", None)
+                return Response(status_code=304, headers=headers)
+
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the encoding the client prefers
+    Only responses that are sent in one piece are compressed, streamed ones (archives) are passed through.
+    Responses that are compressed already (PrecompressedBody) are left as they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024):
+        """
+        Args:
+            minimum_size: smaller bodies are sent uncompressed, the overhead isn't worth it
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # the start of the response is held back until it's known if the body is compressed
+        start_message: Optional[Message] = None
+
+        async def send_compressed(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            # the start was sent already, all further parts are passed through
+            if start_message is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "Content-Encoding" in headers
+                or not headers.get("Content-Type", "").startswith(compressible_media_types)
+            ):
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            # the compressed body isn't byte by byte identical anymore
+            if (etag := headers.get("ETag")) is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -2,7 +2,14 @@ from typing import Literal
 
 uuid_hex_t = str
 private_uuid_hex_t = str
+# what can be submitted for decoding
 task_type_str_t = Literal["transcribe", "translate"]
-status_str_t = Literal["pending", "processing", "finished", "failed"]
+# what a task does, language detection has its own endpoint and never goes through the decode queue
+job_type_str_t = Literal["transcribe", "translate", "detect_language"]
+# which result a task shows, tasks submitted with draft show a quick "draft" until the "final" result is done
+result_tier_str_t = Literal["draft", "final"]
+status_str_t = Literal["pending", "processing", "finished", "failed", "cancelled"]
 model_sizes_str_t = Literal["base", "small", "medium", "turbo", "large"]
+# named sets of decoding options, see decoding/presets.py
+decoding_preset_str_t = Literal["fast", "balanced", "accurate"]
 named_temp_file_name_t = str
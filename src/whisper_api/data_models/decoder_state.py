@@ -15,3 +15,17 @@ class DecoderState(BaseModel):
     tasks_in_queue: int = None
     currently_busy: bool = False
     received_at: dt.datetime = None
+    # increasing with every update, used to discard outdated updates
+    version: int = None
+    # number of tasks the decoder took out of its queue so far
+    dequeued_tasks: int = None
+
+    def position_in_queue(self, queue_ticket: int | None) -> int | None:
+        """
+        Derive the position of a task from the ticket it got when it was queued
+        0 is the task in processing, 1 the next one waiting and so on
+        """
+        if queue_ticket is None or self.dequeued_tasks is None:
+            return None
+
+        return max(queue_ticket - self.dequeued_tasks, 0)
@@ -0,0 +1,301 @@
+import math
+import random
+from typing import Callable
+from typing import Dict
+from typing import Generic
+from typing import Hashable
+from typing import Iterator
+from typing import Optional
+from typing import TypeVar
+
+T = TypeVar("T")
+HashableT = TypeVar("HashableT", bound=Hashable)
+
+"""
+A priority queue that knows the position of each element
+
+The elements are kept in an indexable skip list ordered by (priority, arrival), each link knows how many
+elements it skips. So finding the position of an element is a walk down the levels that sums up those widths,
+just like inserting or removing one - all of it in O(log n) on average, no matter how long the queue is.
+"""
+
+# enough levels for way more elements than will ever be queued, the levels in use grow with the queue
+MAX_LEVELS = 32
+
+
+class _Node:
+    __slots__ = ("order", "elm", "next", "width")
+
+    def __init__(self, order: tuple, elm, levels: int):
+        # (priority, sequence number), the sequence number keeps elements of the same priority in arrival order
+        self.order = order
+        self.elm = elm
+        self.next: list[_Node] = [None] * levels
+        # number of elements between this node and the next node of the level, including the next node
+        self.width: list[int] = [1] * levels
+
+
+class IndexedQueue(Generic[T]):
+    """
+    A queue that does put(), next(), index(), remove() and reprioritize() in O(log n)
+    - elements with a lower priority value come first, elements of the same priority in the order they were put
+    - the queue grows as needed, optionally up to a max size
+    - the elements must be hashable or provide a hashable identifier as key, each key can be queued once
+    """
+
+    def __init__(self, max_size: Optional[int] = None, key: Callable[[T], HashableT] = lambda elm: elm):
+        """
+        Args:
+            max_size: the max number of elements that can be queued (None for no limit)
+            key: function to extract the hashable identifier (default is the element T itself)
+        """
+        self.__max_size = max_size
+        self._key_fn = key
+
+        # the tail sits behind everything, so a walk along a level never has to check for the end
+        self.__tail = _Node((math.inf,), None, 0)
+        self.__head = _Node((-math.inf,), None, MAX_LEVELS)
+        self.__head.next = [self.__tail] * MAX_LEVELS
+        # number of levels that are in use, the levels above are skipped
+        self.__levels = 1
+        self.__nodes: Dict[HashableT, _Node] = {}
+        self.__sequence = 0
+
+        self.current: T = None  # the current element that was returned by next()
+
+        # running counters, as long as no element is removed or reprioritized the position of an element is
+        # (put_count when it was put) - next_count, this allows positions to be derived outside the queue
+        self.put_count = 0
+        self.next_count = 0
+
+    def put(self, elm: T, priority: int = 0) -> int:
+        """
+        Args:
+            elm: the element of type T to put into the queue
+            priority: elements with a lower value come first
+
+        Returns:
+            the position of the element in the queue
+        """
+        if self.__max_size is not None and len(self) >= self.__max_size:
+            raise OverflowError(f"The Queue is full: max size={self.__max_size}")
+
+        identifier = self._key_fn(elm)
+        if identifier in self.__nodes:
+            raise ValueError(f"An element with key {identifier!r} is queued already")
+
+        self.__sequence += 1
+        node = _Node((priority, self.__sequence), elm, self.__random_levels())
+        position = self.__insert(node)
+        self.__nodes[identifier] = node
+        self.put_count += 1
+
+        return position
+
+    def index(self, elm: T = None, by_key: HashableT = None) -> Optional[int]:
+        """
+        Returns:
+            the position of the element, 0 for the current element, 1 for the next one - None if it's not queued
+        """
+        identifier = self.__identifier(elm, by_key)
+
+        # this element is not in the queue but the current one
+        if self.current is not None and identifier == self._key_fn(self.current):
+            return 0
+
+        if (node := self.__nodes.get(identifier)) is None:
+            return None
+
+        position = 0
+        x = self.__head
+        for level in reversed(range(self.__levels)):
+            while x.next[level].order <= node.order:
+                position += x.width[level]
+                x = x.next[level]
+
+        return position
+
+    def remove(self, elm: T = None, by_key: HashableT = None) -> T:
+        """
+        Remove a queued element, the current element can't be removed
+        Raises:
+            KeyError: if the element is not queued
+        """
+        identifier = self.__identifier(elm, by_key)
+        node = self.__nodes.pop(identifier)
+        self.__unlink(node)
+
+        return node.elm
+
+    def reprioritize(self, priority: int, elm: T = None, by_key: HashableT = None) -> int:
+        """
+        Move a queued element to the place for its new priority
+        Among the elements of that priority it keeps the place its arrival entitles it to.
+        Raises:
+            KeyError: if the element is not queued
+        Returns:
+            the new position of the element
+        """
+        node = self.__nodes[self.__identifier(elm, by_key)]
+        self.__unlink(node)
+        node.order = (priority, node.order[1])
+
+        return self.__insert(node)
+
+    def __next__(self) -> T:
+        if len(self) == 0:
+            raise StopIteration(f"No elements in queue")
+
+        node = self.__head.next[0]
+        self.__unlink(node)
+        del self.__nodes[self._key_fn(node.elm)]
+
+        self.current = node.elm
+        self.next_count += 1
+
+        return node.elm
+
+    def iter_priorities(self, start: int = 0) -> Iterator[tuple[int, T]]:
+        """
+        Read out the queue without emptying it, one element after the other
+        The positions are consistent with .index(), the queue must not be changed while iterating.
+        Args:
+            start: the first position to read, the elements in front of it are skipped in O(log n)
+
+        Yields:
+            position and element, first in queue is position 1, 0 is the current element if exists
+        """
+        if self.current is not None and start <= 0:
+            yield 0, self.current
+
+        position = max(start, 1)
+        node = self.__node_at(position)
+        while node is not self.__tail:
+            yield position, node.elm
+            node = node.next[0]
+            position += 1
+
+    def __node_at(self, position: int) -> _Node:
+        """The node at the position (1 is the first in queue), the tail if the queue is shorter"""
+        if position > len(self):
+            return self.__tail
+
+        traversed = 0
+        x = self.__head
+        for level in reversed(range(self.__levels)):
+            while traversed + x.width[level] <= position:
+                traversed += x.width[level]
+                x = x.next[level]
+
+        return x
+
+    def __identifier(self, elm: Optional[T], by_key: Optional[HashableT]) -> HashableT:
+        if elm is not None and by_key is not None:
+            raise ValueError(f"Use only 'elm' OR 'by_key', got: {elm=}, {by_key=}")
+
+        return self._key_fn(elm) if elm is not None else by_key
+
+    def __random_levels(self) -> int:
+        """Each level holds half of the nodes of the level below"""
+        bits = random.getrandbits(MAX_LEVELS - 1) | (1 << (MAX_LEVELS - 1))
+        # number of trailing zeros + 1
+        return (bits & -bits).bit_length()
+
+    def __find_predecessors(self, order: tuple) -> tuple[list[_Node], list[int]]:
+        """
+        Returns:
+            the last node before the order on each level and the number of elements skipped on each level
+        """
+        predecessors = [self.__head] * self.__levels
+        steps = [0] * self.__levels
+        x = self.__head
+        for level in reversed(range(self.__levels)):
+            while x.next[level].order < order:
+                steps[level] += x.width[level]
+                x = x.next[level]
+            predecessors[level] = x
+
+        return predecessors, steps
+
+    def __insert(self, node: _Node) -> int:
+        """Link the node according to its order, returns its position"""
+        levels = len(node.next)
+        # the head spans the whole queue on levels that weren't used so far
+        for level in range(self.__levels, levels):
+            self.__head.width[level] = len(self.__nodes) + 1
+        self.__levels = max(self.__levels, levels)
+
+        predecessors, steps = self.__find_predecessors(node.order)
+
+        skipped = 0
+        for level in range(levels):
+            predecessor = predecessors[level]
+            node.next[level] = predecessor.next[level]
+            predecessor.next[level] = node
+            node.width[level] = predecessor.width[level] - skipped
+            predecessor.width[level] = skipped + 1
+            skipped += steps[level]
+
+        # the links above the node span one element more now
+        for level in range(levels, self.__levels):
+            predecessors[level].width[level] += 1
+
+        # the elements skipped on all levels are the ones in front of the node
+        return sum(steps) + 1
+
+    def __unlink(self, node: _Node):
+        predecessors, _ = self.__find_predecessors(node.order)
+
+        levels = len(node.next)
+        for level in range(levels):
+            predecessor = predecessors[level]
+            predecessor.width[level] += node.width[level] - 1
+            predecessor.next[level] = node.next[level]
+
+        # the links above the node span one element less now
+        for level in range(levels, self.__levels):
+            predecessors[level].width[level] -= 1
+
+    def __len__(self) -> int:
+        return len(self.__nodes)
+
+    def __contains__(self, identifier: HashableT) -> bool:
+        """If an element with the given key is queued"""
+        return identifier in self.__nodes
+
+    def __repr__(self):
+        return f"<IndexedQueue(queue={[elm for _, elm in self.iter_priorities()]}, max_size={self.__max_size})>"
+
+    @property
+    def max_size(self):
+        return self.__max_size
+
+
+if __name__ == "__main__":
+    # micro benchmark: all operations at 100k queued elements, compared to a plain list that has to search
+    import time
+
+    n_elements = 100_000
+    n_operations = 2_000
+
+    def bench(name: str, fn, n: int = n_operations):
+        start = time.perf_counter()
+        fn()
+        print(f"{name:<36} {(time.perf_counter() - start) / n * 1e6:10.2f}µs per operation")
+
+    queue: IndexedQueue[int] = IndexedQueue()
+    reference: list[int] = []
+    sample = random.sample(range(n_elements), n_operations)
+
+    bench(f"put {n_elements} (IndexedQueue)", lambda: [queue.put(i) for i in range(n_elements)], n_elements)
+    bench(f"put {n_elements} (list)", lambda: [reference.append(i) for i in range(n_elements)], n_elements)
+    bench("index (IndexedQueue)", lambda: [queue.index(i) for i in sample])
+    bench("index (list)", lambda: [reference.index(i) for i in sample])
+    bench("reprioritize (IndexedQueue)", lambda: [queue.reprioritize(-1, i) for i in sample])
+    bench("move to front (list)", lambda: [reference.insert(0, reference.pop(reference.index(i))) for i in sample])
+    bench("remove (IndexedQueue)", lambda: [queue.remove(i) for i in sample])
+    bench("remove (list)", lambda: [reference.remove(i) for i in sample])
+    bench("next (IndexedQueue)", lambda: [next(queue) for _ in range(n_operations)])
+    bench("next (list)", lambda: [reference.pop(0) for _ in range(n_operations)])
+
+    assert [elm for _, elm in queue.iter_priorities()][1:] == reference
@@ -0,0 +1,71 @@
+import datetime as dt
+from typing import Any
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from whisper_api.data_models.data_types import task_type_str_t
+from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.data_models.task import Task
+
+"""
+A group of tasks that were submitted together in one batch
+"""
+
+
+class JobGroupResponse(BaseModel):
+    """The aggregated status of a job group that is returned via the API"""
+
+    group_id: str
+    task_type: task_type_str_t
+    time_created: dt.datetime
+    task_ids: list[str]
+    # files of the batch that were not accepted, e.g. because they have no audio track
+    rejected_files: list[str]
+    total: int
+    pending: int = 0
+    processing: int = 0
+    finished: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    # tasks that are not known anymore
+    expired: int = 0
+    # share of tasks that are done (finished, failed, cancelled or expired) from 0 to 1
+    progress: float = 0.0
+
+
+class JobGroup(BaseModel):
+    task_type: task_type_str_t
+    # in the order of submission
+    task_ids: list[uuid_hex_t]
+    rejected_files: list[str] = []
+    group_id: uuid_hex_t | None = None
+    time_created: dt.datetime | None = None
+
+    def model_post_init(self, context: Any):
+        self.group_id = self.group_id or uuid4().hex
+        self.time_created = self.time_created or dt.datetime.now()
+
+    def to_response(self, tasks: dict[uuid_hex_t, Task]) -> JobGroupResponse:
+        """
+        Aggregate the status of the tasks of the group
+        Args:
+            tasks: the tasks of the group that are still known
+        """
+        response = JobGroupResponse(
+            group_id=self.group_id,
+            task_type=self.task_type,
+            time_created=self.time_created,
+            task_ids=self.task_ids,
+            rejected_files=self.rejected_files,
+            total=len(self.task_ids),
+            expired=len(self.task_ids) - len(tasks),
+        )
+        for task in tasks.values():
+            setattr(response, task.status, getattr(response, task.status) + 1)
+
+        if response.total:
+            done = response.finished + response.failed + response.cancelled + response.expired
+            response.progress = done / response.total
+
+        return response
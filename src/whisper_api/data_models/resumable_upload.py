@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+from tempfile import NamedTemporaryFile
+from typing import Optional
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from whisper_api.data_models.data_types import uuid_hex_t
+
+"""
+An upload that is transferred in several requests, so a broken connection doesn't start it over
+
+The chunks are appended to the file the task will use later on and hashed on the way,
+nothing is ever buffered beyond the chunk that is currently received.
+"""
+
+
+class UploadResponse(BaseModel):
+    """The state of an upload that is returned via the API"""
+
+    upload_id: str
+    file_name: str
+    size: int
+    # the next byte the server expects, the upload is complete when offset == size
+    offset: int
+    # only known when the upload is complete
+    sha256: str | None = None
+
+
+class ResumableUpload:
+
+    def __init__(self, file: NamedTemporaryFile, size: int, file_name: Optional[str] = None):
+        """
+        Args:
+            file: the file the data is written to
+            size: the total size of the upload in bytes
+            file_name: the original name of the file
+        """
+        self.upload_id: uuid_hex_t = uuid4().hex
+        self.file = file
+        self.size = size
+        self.file_name = file_name or "unknown"
+        self.offset = 0
+        self.__hash = hashlib.sha256()
+        # only one request may append at a time
+        self.lock = asyncio.Lock()
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.size
+
+    @property
+    def sha256(self) -> Optional[str]:
+        return self.__hash.hexdigest() if self.is_complete else None
+
+    def append(self, chunk: bytes):
+        """Append a chunk at the current offset, raises ValueError if it would exceed the announced size"""
+        if self.offset + len(chunk) > self.size:
+            raise ValueError(f"Chunk exceeds the upload size of {self.size} bytes")
+
+        self.file.write(chunk)
+        self.__hash.update(chunk)
+        self.offset += len(chunk)
+
+    def to_response(self) -> UploadResponse:
+        return UploadResponse(
+            upload_id=self.upload_id,
+            file_name=self.file_name,
+            size=self.size,
+            offset=self.offset,
+            sha256=self.sha256,
+        )
@@ -6,13 +6,17 @@ from typing import Any
 from uuid import uuid4
 
 from pydantic import BaseModel
+from pydantic import Field
 from whisper.utils import WriteSRT
 
+from whisper_api.data_models.data_types import decoding_preset_str_t
+from whisper_api.data_models.data_types import job_type_str_t
 from whisper_api.data_models.data_types import model_sizes_str_t
 from whisper_api.data_models.data_types import named_temp_file_name_t
+from whisper_api.data_models.data_types import result_tier_str_t
 from whisper_api.data_models.data_types import status_str_t
-from whisper_api.data_models.data_types import task_type_str_t
 from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.environment import MAX_BULK_STATUS_TASKS
 from whisper_api.log_setup import uuid_log_format
 
 
@@ -50,7 +54,8 @@ class TaskResponse(PrivacyAwareTaskBaseModel):
     """The class that is returned via the API"""
 
     task_id: str
-    task_type: task_type_str_t
+    task_type: job_type_str_t
+    decoding_preset: decoding_preset_str_t = "balanced"
     status: str
     time_uploaded: dt.datetime
     transcript: str | None = None
@@ -61,6 +66,34 @@ class TaskResponse(PrivacyAwareTaskBaseModel):
     target_model_size: str | None = None
     used_model_size: str | None = None
     used_device: str | None = None
+    # "draft" while the quick result of a task submitted with draft is shown, "final" once it's replaced
+    result_tier: result_tier_str_t | None = None
+    # the most probable languages of the audio, only for language detection tasks
+    language_probabilities: dict[str, float] | None = None
+    deadline: dt.datetime | None = None
+    # why the used model was chosen when a deadline had to be considered
+    model_choice_reason: str | None = None
+    # seconds of silence that were not decoded, see VAD_MIN_SILENCE_S
+    skipped_audio_s: float | None = None
+    # changes whenever anything else in the response changes, see EndPoints.status()
+    version: str | None = None
+
+
+class BulkStatusRequest(BaseModel):
+    """Request the status of many tasks at once"""
+
+    task_ids: list[uuid_hex_t] = Field(max_length=MAX_BULK_STATUS_TASKS)
+    # change_seq of the last BulkStatusResponse, only tasks that changed after it are returned
+    changed_since: int | None = None
+
+
+class BulkStatusResponse(BaseModel):
+    """The status of many tasks, tasks that are not known (anymore) are listed separately"""
+
+    tasks: list[TaskResponse]
+    unknown_task_ids: list[str]
+    # pass this as changed_since in the next request
+    change_seq: int
 
 
 class WhisperResult(BaseModel):
@@ -71,9 +104,17 @@ class WhisperResult(BaseModel):
     output_language: str  # language code of the output language (hopefully)  # TODO validate that always true
     segments: list[dict[str, float | str | int | list[int]]]
     used_model_size: model_sizes_str_t
+    # drafts are always decoded with the "fast" preset
+    used_preset: decoding_preset_str_t = "balanced"
     start_time: dt.datetime
     end_time: dt.datetime
     used_device: str
+    # the most probable languages with their probability, only for language detection tasks
+    language_probabilities: dict[str, float] | None = None
+    # why the model was chosen, e.g. a downgrade to meet the deadline - None if no deadline had to be considered
+    model_choice_reason: str | None = None
+    # seconds of silence the voice activity detection cut out before decoding, None if it's disabled
+    skipped_audio_s: float | None = None
 
     @property
     def processing_duration_s(self) -> int:
@@ -98,40 +139,79 @@ class WhisperResult(BaseModel):
 
 class Task(PrivacyAwareTaskBaseModel):
     audiofile_name: named_temp_file_name_t
-    task_type: task_type_str_t
+    task_type: job_type_str_t
 
     status: status_str_t = "pending"
     source_language: str | None = None
     position_in_queue: int | None = None
+    # sequence number the decoder assigned when queueing the task, see DecoderState.position_in_queue()
+    queue_ticket: int | None = None
     whisper_result: WhisperResult | None = None
     time_uploaded: dt.datetime | None = None
     uuid: uuid_hex_t | None = None
     target_model_size: model_sizes_str_t | None = None
     original_file_name: str = "unknown"
     used_device: str = "unknown"
+    # version of the task ChangeNotifier when the task changed last, see EndPoints.bulk_status()
+    change_seq: int | None = None
+    # False for files that are decoded in place from one of the INGEST_DIRS, they must never be deleted
+    owns_audiofile: bool = True
+    # duration of the audio track as probed on submission, None if unknown
+    audio_duration_s: float | None = None
+    # sha256 of the audio, identical tasks in flight are decoded only once, see SubmissionCoalescer
+    content_sha256: str | None = None
+    # the task whose decode this task shares, None if it's decoded itself
+    follows: uuid_hex_t | None = None
+    # decode a quick draft with the DRAFT_MODEL first, the final result follows in a second run
+    tiered: bool = False
+    # which result whisper_result holds, None as long as there is none
+    result_tier: result_tier_str_t | None = None
+    # the result is needed by then, the decoder downgrades the model if the queue is too long for it
+    deadline: dt.datetime | None = None
+    # the decoding options to use, see decoding/presets.py
+    decoding_preset: decoding_preset_str_t = "balanced"
 
     def model_post_init(self, context: Any):
         self.uuid = self.uuid or uuid4().hex
         self.time_uploaded = self.time_uploaded or dt.datetime.now()
 
+    @property
+    def estimated_size_bytes(self) -> int:
+        """Rough estimate of the memory the task occupies, it's dominated by the segments of the result"""
+        # the task object itself with its short fields
+        size = 1024
+        if self.whisper_result is None:
+            return size
+
+        size += len(self.whisper_result.text)
+        for segment in self.whisper_result.segments:
+            # dict with ~10 numbers plus its text and the token list (pointer + int object per token)
+            size += 600 + len(segment.get("text", "")) + 36 * len(segment.get("tokens", ()))
+
+        return size
+
     @property
     def to_transmit_full(self) -> TaskResponse:
         # TODO extract that list to a better place
-        if self.status in ["pending", "processing", "failed"]:
+        # a pending task might show its draft already
+        if self.whisper_result is None or self.status in ["failed", "cancelled"]:
             return TaskResponse(
                 task_id=self.uuid,
                 time_uploaded=self.time_uploaded,
                 status=self.status,
                 position_in_queue=self.position_in_queue,
                 task_type=self.task_type,
+                decoding_preset=self.decoding_preset,
+                deadline=self.deadline,
             )
 
-        # task status = "finished"
+        # task status = "finished" or the draft of a pending task
         return TaskResponse(
             task_id=self.uuid,
             transcript=self.whisper_result.text,
             source_language=self.whisper_result.language,
             task_type=self.task_type,
+            decoding_preset=self.decoding_preset,
             status=self.status,
             position_in_queue=self.position_in_queue,
             time_uploaded=self.time_uploaded,
@@ -140,6 +220,11 @@ class Task(PrivacyAwareTaskBaseModel):
             target_model_size=self.target_model_size,
             used_model_size=self.whisper_result.used_model_size,
             used_device=self.whisper_result.used_device,
+            language_probabilities=self.whisper_result.language_probabilities,
+            result_tier=self.result_tier,
+            deadline=self.deadline,
+            model_choice_reason=self.whisper_result.model_choice_reason,
+            skipped_audio_s=self.whisper_result.skipped_audio_s,
         )
 
     @property
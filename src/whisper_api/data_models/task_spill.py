@@ -0,0 +1,186 @@
+import gzip
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.data_models.task import Task
+from whisper_api.log_setup import logger
+
+"""
+Compressed on-disk tier for tasks that were evicted from memory
+
+Each task is stored as gzipped json in its own file, named after the task's uuid.
+Files expire based on their modification time, just like the items of the TempDict in front of it.
+
+Compressing and writing is done by a writer thread, so spilling doesn't block the event loop.
+Until a task is written, reads are answered from the buffered writes.
+"""
+
+# task ids come from requests, so they must not be able to escape the spill directory
+valid_task_id_pattern = re.compile(r"[0-9a-f]+")
+
+
+class TaskSpill:
+
+    def __init__(self, spill_dir: str, expiration_time_m: int = 60, compress_level: int = 6):
+        """
+        Args:
+            spill_dir: directory to store the compressed tasks in, created if not exists
+            expiration_time_m: time in minutes after the last spill after which a task is deleted
+            compress_level: gzip compression level (1 fastest - 9 smallest)
+        """
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = spill_dir
+        self.expiration_time_s = expiration_time_m * 60
+        self.compress_level = compress_level
+
+        self.__lock = threading.Lock()
+        self.__last_expiry_check = time.monotonic()
+        self.spilled_items = 0
+        self.spilled_bytes = 0
+
+        # writes that are not done yet, None marks a deletion
+        self.__pending_writes: dict[uuid_hex_t, Optional[Task]] = {}
+        # the writes that are currently done, they must stay visible to readers until they're on disk
+        self.__in_flight_writes: dict[uuid_hex_t, Optional[Task]] = {}
+        self.__write_condition = threading.Condition()
+        self.__flush_lock = threading.Lock()
+        self.__is_closed = False
+
+        self.__writer_thread = threading.Thread(target=self.__writer_loop, name="TaskSpill-Writer-Thread", daemon=True)
+        self.__writer_thread.start()
+
+    def __path(self, task_id: uuid_hex_t) -> Optional[str]:
+        if not valid_task_id_pattern.fullmatch(task_id):
+            return None
+        return os.path.join(self.spill_dir, f"{task_id}.json.gz")
+
+    def put(self, task: Task):
+        """Schedule the task for writing, an existing file of the task is replaced"""
+        with self.__write_condition:
+            self.__pending_writes[task.uuid] = task
+            self.__write_condition.notify()
+
+    def get(self, task_id: uuid_hex_t) -> Optional[Task]:
+        """Read a task from disk, None if it's not known or expired"""
+        with self.__write_condition:
+            for writes in (self.__pending_writes, self.__in_flight_writes):
+                if task_id in writes:
+                    return writes[task_id]
+
+        path = self.__path(task_id)
+        if path is None:
+            return None
+
+        try:
+            if os.path.getmtime(path) + self.expiration_time_s < time.time():
+                self.__remove(task_id)
+                return None
+
+            with open(path, "rb") as f:
+                return Task.model_validate_json(gzip.decompress(f.read()))
+
+        except FileNotFoundError:
+            return None
+
+    def delete(self, task_id: uuid_hex_t):
+        """Schedule the task for deletion"""
+        with self.__write_condition:
+            self.__pending_writes[task_id] = None
+            self.__write_condition.notify()
+
+    def flush(self):
+        """Write all buffered changes to disk"""
+        with self.__flush_lock:
+            with self.__write_condition:
+                self.__in_flight_writes = self.__pending_writes
+                self.__pending_writes = {}
+
+            try:
+                for task_id, task in self.__in_flight_writes.items():
+                    if task is None:
+                        self.__remove(task_id)
+                    else:
+                        self.__write(task)
+            finally:
+                with self.__write_condition:
+                    self.__in_flight_writes = {}
+
+    def delete_expired(self) -> int:
+        """Delete all files that are older than the expiration time, returns the number deleted"""
+        self.__last_expiry_check = time.monotonic()
+        deadline = time.time() - self.expiration_time_s
+
+        deleted = 0
+        with os.scandir(self.spill_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                        deleted += 1
+                except FileNotFoundError:
+                    continue
+
+        return deleted
+
+    def close(self):
+        """Write all remaining changes and stop the writer thread"""
+        with self.__write_condition:
+            if self.__is_closed:
+                return
+            self.__is_closed = True
+            self.__write_condition.notify()
+
+        self.__writer_thread.join()
+        self.flush()
+
+    """ Internal helpers """
+
+    def __write(self, task: Task):
+        """Write the task to disk, an existing file of the task is replaced"""
+        path = self.__path(task.uuid)
+        data = gzip.compress(task.model_dump_json().encode(), compresslevel=self.compress_level)
+
+        # write to a temporary file first, so that readers never see a half written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.__lock:
+            self.spilled_items += 1
+            self.spilled_bytes += len(data)
+
+        # no need to scan the directory on every spill
+        if time.monotonic() - self.__last_expiry_check > 60:
+            self.delete_expired()
+
+    def __remove(self, task_id: uuid_hex_t):
+        """Delete the file of the task if it exists"""
+        path = self.__path(task_id)
+        if path is None:
+            return
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __writer_loop(self):
+        """Write buffered changes as soon as there are any"""
+        while True:
+            with self.__write_condition:
+                while not self.__is_closed and not self.__pending_writes:
+                    self.__write_condition.wait()
+
+                if self.__is_closed:
+                    return
+
+            try:
+                self.flush()
+            except OSError as e:
+                # a full disk must not stop the thread, the tasks of this batch are lost either way
+                logger.error(f"Failed to spill tasks to '{self.spill_dir}': {e}")
@@ -0,0 +1,294 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+from typing import Optional
+from typing import Union
+
+from whisper_api.data_models.data_types import uuid_hex_t
+from whisper_api.data_models.task import Task
+from whisper_api.data_models.task_spill import TaskSpill
+from whisper_api.data_models.temp_dict import TempDict
+
+"""
+Durable storage for tasks, so that queued and finished tasks survive a restart of the API
+
+The store is a SQLite database in WAL mode.
+Writes are collected in memory and flushed in batches by a writer thread,
+a task that is updated several times between two flushes is only written once.
+Reads check the not yet flushed writes first, so the store is always consistent from the outside.
+"""
+
+unfinished_states = ("pending", "processing")
+unfinished_placeholders = ", ".join("?" * len(unfinished_states))
+
+
+class TaskStore:
+
+    def __init__(
+        self,
+        db_path: str,
+        expiration_time_m: int = 60,
+        flush_interval_s: float = 1.0,
+        max_batch_size: int = 64,
+    ):
+        """
+        Args:
+            db_path: path of the SQLite database file, the directory is created if needed
+            expiration_time_m: time in minutes after the last update after which a task is deleted
+            flush_interval_s: max time a write is buffered before it's written to disk
+            max_batch_size: number of buffered writes that trigger a flush before the interval is over
+        """
+        if db_dir := os.path.dirname(db_path):
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.db_path = db_path
+        self.expiration_time_s = expiration_time_m * 60
+        self.flush_interval_s = flush_interval_s
+        self.max_batch_size = max_batch_size
+
+        # one connection that is shared by all threads, access is synchronized using the lock
+        self.__db_lock = threading.Lock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        # with WAL, NORMAL only risks the last transactions on power loss, not the consistency of the db
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "uuid TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "data TEXT NOT NULL)"
+        )
+        self.__db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)")
+        self.__db.execute("CREATE INDEX IF NOT EXISTS tasks_updated_at ON tasks (updated_at)")
+
+        # writes that are not flushed yet, None marks a deletion
+        self.__pending_writes: dict[uuid_hex_t, Optional[tuple[str, float, str]]] = {}
+        # the batch that is currently written, it must stay visible to readers until it's committed
+        self.__in_flight_writes: dict[uuid_hex_t, Optional[tuple[str, float, str]]] = {}
+        self.__write_condition = threading.Condition()
+        self.__flush_lock = threading.Lock()
+        self.__is_closed = False
+
+        self.__writer_thread = threading.Thread(target=self.__writer_loop, name="TaskStore-Writer-Thread", daemon=True)
+        self.__writer_thread.start()
+
+    """ Public interface """
+
+    def put(self, task: Task):
+        """Schedule the task for writing, the write is done in the next batch"""
+        entry = (task.status, time.time(), task.model_dump_json())
+        with self.__write_condition:
+            self.__pending_writes[task.uuid] = entry
+            if len(self.__pending_writes) >= self.max_batch_size:
+                self.__write_condition.notify()
+
+    def delete(self, task_id: uuid_hex_t):
+        """Schedule the task for deletion"""
+        with self.__write_condition:
+            self.__pending_writes[task_id] = None
+
+    def get(self, task_id: uuid_hex_t) -> Optional[Task]:
+        """Get a task that is unfinished or not expired yet, None if it's not known"""
+        with self.__write_condition:
+            for writes in (self.__pending_writes, self.__in_flight_writes):
+                if task_id in writes:
+                    entry = writes[task_id]
+                    return Task.model_validate_json(entry[2]) if entry is not None else None
+
+        with self.__db_lock:
+            row = self.__db.execute(
+                f"SELECT data FROM tasks WHERE uuid = ? AND (updated_at > ? OR status IN ({unfinished_placeholders}))",
+                (task_id, time.time() - self.expiration_time_s, *unfinished_states),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return Task.model_validate_json(row[0])
+
+    def load_unfinished(self) -> list[Task]:
+        """All tasks that were not done yet, ordered by upload time"""
+        self.flush()
+        with self.__db_lock:
+            rows = self.__db.execute(
+                f"SELECT data FROM tasks WHERE status IN ({unfinished_placeholders})",
+                unfinished_states,
+            ).fetchall()
+
+        tasks = [Task.model_validate_json(data) for (data,) in rows]
+        return sorted(tasks, key=lambda task: task.time_uploaded)
+
+    def flush(self):
+        """Write all buffered changes to disk"""
+        with self.__flush_lock:
+            with self.__write_condition:
+                self.__in_flight_writes = self.__pending_writes
+                self.__pending_writes = {}
+
+            self.__write_batch(self.__in_flight_writes)
+
+            with self.__write_condition:
+                self.__in_flight_writes = {}
+
+    def delete_expired(self) -> int:
+        """
+        Delete all done tasks whose last update is older than the expiration time, returns the number deleted
+        Unfinished tasks never expire, they might just wait in a long queue
+        """
+        with self.__db_lock:
+            cursor = self.__db.execute(
+                f"DELETE FROM tasks WHERE updated_at <= ? AND status NOT IN ({unfinished_placeholders})",
+                (time.time() - self.expiration_time_s, *unfinished_states),
+            )
+            return cursor.rowcount
+
+    def close(self):
+        """Flush all remaining writes and close the database"""
+        with self.__write_condition:
+            if self.__is_closed:
+                return
+            self.__is_closed = True
+            self.__write_condition.notify()
+
+        self.__writer_thread.join()
+        self.flush()
+        with self.__db_lock:
+            self.__db.close()
+
+    """ Internal helpers """
+
+    def __write_batch(self, batch: dict[uuid_hex_t, Optional[tuple[str, float, str]]]):
+        """Write a batch of changes in a single transaction"""
+        if not batch:
+            return
+
+        upserts = [(task_id, *entry) for task_id, entry in batch.items() if entry is not None]
+        deletions = [(task_id,) for task_id, entry in batch.items() if entry is None]
+
+        with self.__db_lock:
+            self.__db.execute("BEGIN")
+            try:
+                self.__db.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)", upserts)
+                self.__db.executemany("DELETE FROM tasks WHERE uuid = ?", deletions)
+            except Exception:
+                self.__db.execute("ROLLBACK")
+                raise
+            self.__db.execute("COMMIT")
+
+    def __writer_loop(self):
+        """Flush buffered writes in the given interval or when a batch is full, clean up expired tasks now and then"""
+        last_expiry_check = time.monotonic()
+        while True:
+            with self.__write_condition:
+                if not self.__is_closed and len(self.__pending_writes) < self.max_batch_size:
+                    self.__write_condition.wait(self.flush_interval_s)
+
+                if self.__is_closed:
+                    return
+
+            self.flush()
+
+            # no need to do this on every flush
+            if time.monotonic() - last_expiry_check > 60:
+                self.delete_expired()
+                last_expiry_check = time.monotonic()
+
+
+class StoreBackedTempDict(TempDict[uuid_hex_t, Task]):
+    """
+    TempDict that acts as a hot cache in front of a disk tier, either a TaskStore or a TaskSpill
+
+    write_through=True (TaskStore)
+    - every set or delete is forwarded to the store, evicted tasks are on disk already
+    write_through=False (TaskSpill)
+    - tasks only go to disk when they're evicted from the cache due to its memory budget
+
+    A lookup that misses the cache is answered by the disk tier and put into the cache again,
+    the get_cached variants never touch the disk, so they're fine to use on the event loop.
+    Length and iteration only cover the tasks that are currently in the cache.
+    """
+
+    def __init__(self, task_store: Union[TaskStore, TaskSpill], write_through=True, **temp_dict_kwargs):
+        self.task_store = task_store
+        self.write_through = write_through
+        self.spilled_items = 0
+        super().__init__(**temp_dict_kwargs, on_evict=self.__spill)
+
+    @property
+    def stats(self) -> dict[str, Optional[int]]:
+        with self.lock:
+            return {**super().stats, "spilled_items": self.spilled_items}
+
+    def __spill(self, key: uuid_hex_t, task: Task):
+        """Called for each task that is evicted from the cache"""
+        if not self.write_through:
+            self.task_store.put(task)
+        self.spilled_items += 1
+
+    def __getitem__(self, key: uuid_hex_t) -> Task:
+        task = self.get(key, None)
+        if task is None:
+            raise KeyError(f"Key {key} not found")
+        return task
+
+    def get(self, key: uuid_hex_t, default=...) -> Optional[Task]:
+        task = super().get(key, None)
+        if task is not None:
+            return task
+
+        # cache miss - ask the disk, the result is cached again
+        task = self.task_store.get(key)
+        if task is not None:
+            # a newer version that was set while we were reading wins
+            super().add_item(key, task, extend_lifespan_if_exists=False)
+            task = super().get(key, task)
+            # the spilled copy is outdated as soon as the cached task changes
+            if not self.write_through:
+                self.task_store.delete(key)
+            return task
+
+        if default is ...:
+            raise KeyError(f"Key {key} not found")
+        return default
+
+    def get_cached(self, key: uuid_hex_t) -> Optional[Task]:
+        """Get the task if it's in the cache, None otherwise"""
+        return super().get(key, None)
+
+    def get_many_cached(self, keys: Iterable[uuid_hex_t]) -> dict[uuid_hex_t, Task]:
+        """Get all given tasks that are in the cache, the others are left out"""
+        return super().get_many(keys)
+
+    def get_many(self, keys: Iterable[uuid_hex_t]) -> dict[uuid_hex_t, Task]:
+        keys = list(keys)
+        found = super().get_many(keys)
+        # cache misses are rare, they take the slow path one by one
+        for key in keys:
+            if key not in found and (task := self.get(key, None)) is not None:
+                found[key] = task
+
+        return found
+
+    def __setitem__(self, identifier: uuid_hex_t, value: Task) -> None:
+        super().__setitem__(identifier, value)
+        if self.write_through:
+            self.task_store.put(value)
+
+    def add_item(self, identifier: uuid_hex_t, value: Task, extend_lifespan_if_exists=True):
+        super().add_item(identifier, value, extend_lifespan_if_exists=extend_lifespan_if_exists)
+        if self.write_through:
+            self.task_store.put(value)
+
+    def add_items(self, items: Iterable[tuple[uuid_hex_t, Task]], extend_lifespan_if_exists=True):
+        items = list(items)
+        super().add_items(items, extend_lifespan_if_exists=extend_lifespan_if_exists)
+        if self.write_through:
+            for _, task in items:
+                self.task_store.put(task)
+
+    def __delitem__(self, key: uuid_hex_t):
+        super().__delitem__(key)
+        self.task_store.delete(key)
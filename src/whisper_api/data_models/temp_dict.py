@@ -1,6 +1,7 @@
+import sys
 import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
 from typing import Callable
 from typing import Iterable
 from typing import Iterator
@@ -14,26 +15,74 @@ Threadsafe DataStructure that holds data for a given time and then discards it
 
 I really tried to make this thing generic.
 I hope it's the correct way to do it...
+
+Expiry works like this:
+- every entry stores its own deadline, so a lookup only has to check that one entry -> O(1)
+- entries using the default lifespan are additionally kept in an OrderedDict sorted by deadline
+  a refresh moves the entry to the end, so the front is always the next entry to expire
+  the gc only pops expired entries from the front and stops at the first living one -> amortized O(1)
+- entries with an individual lifespan (see extend_lifespan()) would break that order,
+  they're tracked separately and checked one by one (they're rare)
+
+Optionally the dict can hold a memory budget:
+- the size of each value is estimated once when it's set
+- when the budget is exceeded, the least recently used items are evicted and handed to on_evict
+  once the lock is released, so a slow callback (e.g. writing to disk) doesn't block other threads
+- items that is_evictable rejects are kept, even if that exceeds the budget
 """
 
 
 Identifier_t = TypeVar("Identifier_t")
 Value_t = TypeVar("Value_t")
 
-creation_time_t = float
+deadline_t = float
 
 
 class TempDict(MutableMapping[Identifier_t, Value_t]):
 
-    def __init__(self, expiration_time_m=30, refresh_expiration_time_on_usage=True, auto_gc_interval_s=60):
+    def __init__(
+        self,
+        expiration_time_m=30,
+        refresh_expiration_time_on_usage=True,
+        auto_gc_interval_s=60,
+        max_size_bytes: Optional[int] = None,
+        size_estimator: Optional[Callable[[Value_t], int]] = None,
+        on_evict: Optional[Callable[[Identifier_t, Value_t], None]] = None,
+        on_expire: Optional[Callable[[Identifier_t, Value_t], None]] = None,
+        is_evictable: Optional[Callable[[Value_t], bool]] = None,
+    ):
         """
         Args:
             expiration_time_m: time in minutes after which an item is considered expired
             refresh_expiration_time_on_usage: reset countdown if item is accessed
             auto_gc_interval_s: time between automatic garbage collection runs if None gc runs before each operation
+            max_size_bytes: memory budget, least recently used items are evicted when exceeded (None for no limit)
+            size_estimator: function that estimates the size of a value in bytes (default is sys.getsizeof)
+            on_evict: called with key and value of each item that is evicted due to the budget (not on expiry),
+                      it's called after the lock is released
+            on_expire: called with key and value of each item that expired, it's called while the lock is held
+            is_evictable: items it returns False for are never evicted due to the budget (default is all are)
         """
         self.lock = threading.RLock()
-        self.__data: dict[Identifier_t, list[creation_time_t, Value_t]] = defaultdict(None)
+        self.__data: dict[Identifier_t, list[deadline_t, Value_t]] = dict()
+        # keys with the default lifespan, ordered by deadline (oldest first)
+        self.__expiry_order: OrderedDict[Identifier_t, None] = OrderedDict()
+        # keys with an individual lifespan, they are not part of the order above
+        self.__individual_expiry: set[Identifier_t] = set()
+
+        # memory budget, the usage order is only tracked if there is a budget
+        self.max_size_bytes = max_size_bytes
+        self.size_estimator = size_estimator or sys.getsizeof
+        self.on_evict = on_evict
+        self.on_expire = on_expire
+        self.is_evictable = is_evictable
+        self.__item_sizes: dict[Identifier_t, int] = dict()
+        self.__total_size_bytes = 0
+        self.__usage_order: OrderedDict[Identifier_t, None] = OrderedDict()
+        self.evicted_items = 0
+        # evicted items that still have to be handed to on_evict
+        self.__evicted: list[tuple[Identifier_t, Value_t]] = []
+
         self.expiration_time_s: int = expiration_time_m * 60
         if expiration_time_m <= 0:
             raise ValueError("Expiration time must be greater than 0")
@@ -41,6 +90,8 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
 
         self.auto_gc_interval_s = auto_gc_interval_s
         self.lazy_expiry_checker = self.ExpirationChecker(self)
+        self.__stop_auto_gc = threading.Event()
+        self.__auto_gc_thread: Optional[threading.Thread] = None
         if auto_gc_interval_s:
             self.start_auto_gc()
 
@@ -49,10 +100,23 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
 
         def cleaner():
             """Cleaner with adapting interval if value is changed"""
-            self._clean_expired_items()
-            time.sleep(self.auto_gc_interval_s)
+            # wait() returns True when the stop event is set, so we leave the loop
+            while not self.__stop_auto_gc.wait(self.auto_gc_interval_s or 1):
+                self._clean_expired_items()
+
+        if self.__auto_gc_thread is not None and self.__auto_gc_thread.is_alive():
+            return
+
+        self.__stop_auto_gc.clear()
+        self.__auto_gc_thread = threading.Thread(target=cleaner, name="TempDict-GC-Thread", daemon=True)
+        self.__auto_gc_thread.start()
 
-        threading.Thread(target=cleaner, daemon=True).start()
+    def stop_auto_gc(self, timeout_s: float = None):
+        """Stop the cleaner thread, blocks until the thread is done or timeout is reached"""
+        self.__stop_auto_gc.set()
+        if self.__auto_gc_thread is not None:
+            self.__auto_gc_thread.join(timeout_s)
+            self.__auto_gc_thread = None
 
     class ExpirationChecker:
         """Context manager that triggers a gc when no auto_gc_interval is set"""
@@ -73,6 +137,7 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
 
     If they work on data they'll always trigger an expiration check
     to ensure that only non-timed-out data is used
+    the check is cheap since it stops at the first entry that is still alive
     """
 
     @property
@@ -105,11 +170,30 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
             self._clean_expired_items()
             return self.__data.__len__() // self.expiration_time_s
 
+    @property
+    def size_bytes(self) -> int:
+        """estimated size of all items in bytes"""
+        with self.lock:
+            self._clean_expired_items()
+            return self.__total_size_bytes
+
+    @property
+    def stats(self) -> dict[str, Optional[int]]:
+        """item count, memory usage and number of evictions"""
+        with self.lock:
+            self._clean_expired_items()
+            return {
+                "items": len(self.__data),
+                "size_bytes": self.__total_size_bytes,
+                "max_size_bytes": self.max_size_bytes,
+                "evicted_items": self.evicted_items,
+            }
+
     @property
     def current_data(self):
         with self.lock:
             self._clean_expired_items()
-            return {key: value for key, (time_out, value) in self.__data.items()}
+            return {key: value for key, (deadline, value) in self.__data.items()}
 
     def __len__(self) -> int:
         with self.lock:
@@ -119,24 +203,35 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
     def __iter__(self) -> Iterator[Identifier_t]:
         with self.lock:
             self._clean_expired_items()
-            return self.__data.__iter__()
+            # iterate over a snapshot, the gc-thread might change the dict while the caller iterates
+            return iter(list(self.__data))
+
+    def __contains__(self, key: object) -> bool:
+        """O(1) membership test that doesn't refresh the lifespan"""
+        with self.lock:
+            return self.__get_alive_entry(key) is not None
 
     def __item_getter(self, key: Identifier_t, not_found_behavior: Callable) -> Optional[Value_t]:
         """Returns None if key is not found"""
         with self.lock:
-            self._clean_expired_items()
-
-            # test if key is entered
-            val = self.__data.get(key, None)
+            # test if key is entered and still alive
+            val = self.__get_and_touch(key)
             # if key is not found trigger given not_found_behavior
             if val is None:
                 return not_found_behavior()
 
-            if self.refresh_expiration_time_on_usage:
-                self.__extend_lifespan(key)
-
             return val[1]
 
+    def get_many(self, keys: Iterable[Identifier_t]) -> dict[Identifier_t, Value_t]:
+        """Get all given keys that are present with a single lock acquisition, unknown keys are left out"""
+        with self.lock:
+            found = {}
+            for key in keys:
+                if (val := self.__get_and_touch(key)) is not None:
+                    found[key] = val[1]
+
+            return found
+
     def __getitem__(self, key: Identifier_t) -> Optional[Value_t]:
         """Raises KeyError if key is not found"""
 
@@ -163,18 +258,20 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
     """
 
     def __setitem__(self, identifier: Identifier_t, value: Value_t) -> None:
-        """Just add an item without any expiration checks, not expanding liespan if item already exists"""
+        """Just add an item without any expiration checks, an existing item is replaced and its countdown restarts"""
         with self.lock, self.lazy_expiry_checker:
             self.__add_item(identifier, value, extend_lifespan_if_exists=False)
+        self.__hand_over_evicted()
 
     def add_item(self, identifier: Identifier_t, value: Value_t, extend_lifespan_if_exists=True):
         """Add item, expand lifespan if it already exists and trigger expiration checks"""
         with self.lock, self.lazy_expiry_checker:
             # check if items shall also be refreshed or just added if new
-            if not extend_lifespan_if_exists and identifier in self.__data.keys():
+            if not extend_lifespan_if_exists and self.__get_alive_entry(identifier) is not None:
                 return
 
             self.__add_item(identifier, value, extend_lifespan_if_exists=extend_lifespan_if_exists)
+        self.__hand_over_evicted()
 
     def add_items(
         self,
@@ -186,22 +283,29 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
         with self.lock, self.lazy_expiry_checker:
             for key, value in items:
                 self.__add_item(key, value, extend_lifespan_if_exists=extend_lifespan_if_exists)
+        self.__hand_over_evicted()
 
     def extend_lifespan(self, key: Identifier_t, expiration_time_overwrite_m: float = None):
-        """Extend lifespan of item and trigger expiration checks"""
+        """
+        Extend lifespan of item and trigger expiration checks
+        If an overwrite is given the item expires after that time from now on instead of the default lifespan
+        """
         if expiration_time_overwrite_m is None and not self.refresh_expiration_time_on_usage:
             raise ValueError("Lifetime extension is not enabled by default and overwrite time is not given")
 
         with self.lock, self.lazy_expiry_checker:
-            self.__extend_lifespan(key, expiration_time_overwrite_m * 60)
+            if self.__get_alive_entry(key) is None:
+                raise KeyError(f"Key {key} not found")
+
+            if expiration_time_overwrite_m is None:
+                self.__extend_lifespan(key)
+            else:
+                self.__extend_lifespan(key, expiration_time_overwrite_m * 60)
 
     def __delitem__(self, key: Identifier_t):
         """Does not trigger expiration checks"""
         with self.lock, self.lazy_expiry_checker:
-            if key not in self.__data.keys():
-                return
-
-            del self.__data[key]
+            self.__remove(key)
 
     def remove_item(self, item: Identifier_t):
         """Remove item and trigger expiration checks"""
@@ -213,27 +317,119 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
     def _clean_expired_items(self):
         """Garbage collector that removes expired items"""
         with self.lock:
-            now = time.time()
-            keys_to_remove = []
-            for key, (timestamp, _) in self.__data.items():
-                if now - timestamp > self.expiration_time_s:
-                    keys_to_remove.append(key)
-                else:
+            now = time.monotonic()
+
+            # entries are ordered by deadline, so we can stop at the first one that is still alive
+            while self.__expiry_order:
+                key = next(iter(self.__expiry_order))
+                if self.__data[key][0] > now:
                     break
+                self.__expire(key)
+
+            # the few entries with an individual lifespan must be checked one by one
+            for key in [key for key in self.__individual_expiry if self.__data[key][0] <= now]:
+                self.__expire(key)
+
+    def __get_alive_entry(self, key: Identifier_t) -> Optional[list[deadline_t, Value_t]]:
+        """Non-thread safe lookup that only returns entries that are not expired (expired ones are dropped)"""
+        val = self.__data.get(key, None)
+        if val is None:
+            return None
+
+        if val[0] <= time.monotonic():
+            self.__expire(key)
+            return None
+
+        return val
+
+    def __expire(self, key: Identifier_t):
+        """Non-thread safe removal of an expired entry"""
+        value = self.__data[key][1]
+        self.__remove(key)
+        if self.on_expire is not None:
+            self.on_expire(key, value)
 
-            for key in keys_to_remove:
-                del self.__data[key]
+    def __get_and_touch(self, key: Identifier_t) -> Optional[list[deadline_t, Value_t]]:
+        """Non-thread safe lookup of an alive entry that counts as usage (lifespan refresh and LRU order)"""
+        val = self.__get_alive_entry(key)
+        if val is None:
+            return None
+
+        if self.refresh_expiration_time_on_usage:
+            self.__extend_lifespan(key)
+
+        if self.max_size_bytes is not None:
+            self.__usage_order.move_to_end(key)
+
+        return val
+
+    def __remove(self, key: Identifier_t):
+        """Non-thread safe removal from all internal structures, ignores unknown keys"""
+        if self.__data.pop(key, None) is None:
+            return
+
+        self.__expiry_order.pop(key, None)
+        self.__individual_expiry.discard(key)
+        self.__total_size_bytes -= self.__item_sizes.pop(key, 0)
+        self.__usage_order.pop(key, None)
+
+    def __evict_least_recently_used(self):
+        """Non-thread safe eviction until the budget is met again, the newest item is always kept"""
+        excess_bytes = self.__total_size_bytes - self.max_size_bytes
+        if excess_bytes <= 0:
+            return
+
+        newest = next(reversed(self.__usage_order))
+        to_evict = []
+        for key in self.__usage_order:
+            if excess_bytes <= 0 or key == newest:
+                break
+            value = self.__data[key][1]
+            if self.is_evictable is None or self.is_evictable(value):
+                to_evict.append((key, value))
+                excess_bytes -= self.__item_sizes.get(key, 0)
+
+        for key, value in to_evict:
+            self.__remove(key)
+            self.evicted_items += 1
+
+            if self.on_evict is not None:
+                self.__evicted.append((key, value))
+
+    def __hand_over_evicted(self):
+        """Pass the items evicted so far to on_evict, the lock must not be held by the caller"""
+        if not self.__evicted:
+            return
+
+        with self.lock:
+            evicted, self.__evicted = self.__evicted, []
+
+        for key, value in evicted:
+            self.on_evict(key, value)
 
     def __add_item(self, identifier: Identifier_t, value: Value_t, extend_lifespan_if_exists: bool):
         """Non-thread safe internal add item, not triggering gc"""
+        val = self.__get_alive_entry(identifier)
+
         # when item in dict and extend lifespan is enabled, just extend lifespan
-        if extend_lifespan_if_exists and identifier in self.__data.keys():
+        if extend_lifespan_if_exists and val is not None:
             self.__extend_lifespan(identifier)
             return
 
-        # truly add new item
-        now = time.time()
-        self.__data[identifier] = [now, value]
+        # truly add new item (or replace existing one, which starts its countdown again)
+        self.__remove(identifier)
+        self.__data[identifier] = [time.monotonic() + self.expiration_time_s, value]
+        self.__expiry_order[identifier] = None
+
+        # size accounting is only needed when there is a budget to enforce
+        if self.max_size_bytes is None:
+            return
+
+        item_size = self.size_estimator(value)
+        self.__item_sizes[identifier] = item_size
+        self.__total_size_bytes += item_size
+        self.__usage_order[identifier] = None
+        self.__evict_least_recently_used()
 
     def __extend_lifespan(self, key: Identifier_t, expiration_time_overwrite_s: float = None):
         """Not thread safe, not checking for gc"""
@@ -241,27 +437,49 @@ class TempDict(MutableMapping[Identifier_t, Value_t]):
         if not (self.refresh_expiration_time_on_usage or expiration_time_overwrite_s):
             return
 
-        val = self.__data[key]
+        val = self.__data.get(key, None)
         if val is None:
             return
 
-        # expand only by given timespan
+        now = time.monotonic()
+
+        # individual lifespan - the item leaves the deadline-ordered structure
         if expiration_time_overwrite_s:
-            val[0] = val[0] + expiration_time_overwrite_s
+            val[0] = now + expiration_time_overwrite_s
+            self.__expiry_order.pop(key, None)
+            self.__individual_expiry.add(key)
+            return
 
-        # reset time
-        val[0] = time.time()
+        # an individual lifespan that reaches further than the default one is kept
+        if key in self.__individual_expiry:
+            if val[0] >= now + self.expiration_time_s:
+                return
+            self.__individual_expiry.discard(key)
+
+        # reset time, the refreshed item now expires last
+        val[0] = now + self.expiration_time_s
+        self.__expiry_order[key] = None
+        self.__expiry_order.move_to_end(key)
 
 
 if __name__ == "__main__":
+    import timeit
 
     # Example usage:
-    temp_store = TempDict(expiration_time_m=5)  # retention time in seconds
+    temp_store = TempDict(expiration_time_m=1, auto_gc_interval_s=1)
+    temp_store.expiration_time_s = 5  # shorten retention time for the demo
 
-    temp_store.add_item("item1")
-    temp_store.add_item("item2")
+    temp_store["item1"] = "value1"
+    temp_store["item2"] = "value2"
     print(temp_store.size)  # prints 2
     time.sleep(6)  # wait for 6 seconds
     print(temp_store.size)  # prints 0 (items have expired)
     print(temp_store.current_data)
-    d = dict()
+
+    # micro benchmark: lookup cost must not depend on the number of stored items
+    for n_items in (1_000, 10_000, 100_000):
+        bench_dict = TempDict(expiration_time_m=60, auto_gc_interval_s=None)
+        bench_dict.add_items((i, i) for i in range(n_items))
+        lookups = 100_000
+        duration = timeit.timeit(lambda: bench_dict[n_items // 2], number=lookups)
+        print(f"{n_items=:>7}: {duration / lookups * 1e9:.0f}ns per lookup")
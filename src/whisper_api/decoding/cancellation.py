@@ -0,0 +1,42 @@
+import importlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Callable
+
+import tqdm
+
+"""
+Stop a running whisper decode between two of its 30s windows
+
+whisper has no hook to interrupt transcribe(), but it reports its progress to a tqdm bar after every window.
+While abort_between_windows() is active, that bar raises TaskCancelled as soon as the decode shall stop,
+so the decode ends at the next window boundary instead of running to the end of the file.
+"""
+
+# whisper/__init__.py shadows the module with the function of the same name
+whisper_transcribe_module = importlib.import_module("whisper.transcribe")
+
+
+class TaskCancelled(Exception):
+    """The decode was aborted because its task was cancelled"""
+
+
+@contextmanager
+def abort_between_windows(should_abort: Callable[[], bool]):
+    """
+    Args:
+        should_abort: called after each window, the decode is aborted with TaskCancelled once it returns True
+    """
+
+    class WindowProgress(tqdm.tqdm):
+        def update(self, n=1):
+            if should_abort():
+                raise TaskCancelled()
+            return super().update(n)
+
+    original_tqdm = whisper_transcribe_module.tqdm
+    whisper_transcribe_module.tqdm = SimpleNamespace(tqdm=WindowProgress)
+    try:
+        yield
+    finally:
+        whisper_transcribe_module.tqdm = original_tqdm
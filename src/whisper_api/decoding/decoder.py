@@ -1,6 +1,7 @@
 import datetime as dt
 import gc
 import logging
+import queue
 import signal
 import threading
 import time
@@ -9,19 +10,36 @@ from types import FrameType
 from typing import Any
 from typing import Optional
 
+import numpy as np
 import torch
 import whisper
+from whisper.audio import SAMPLE_RATE
 
+from whisper_api.audio_decoding import load_audio
+from whisper_api.data_models.data_types import decoding_preset_str_t
 from whisper_api.data_models.data_types import model_sizes_str_t
 from whisper_api.data_models.data_types import task_type_str_t
-from whisper_api.data_models.fast_queue import FastQueue
+from whisper_api.data_models.indexed_queue import IndexedQueue
 from whisper_api.data_models.task import Task
 from whisper_api.data_models.task import WhisperResult
+from whisper_api.decoding.cancellation import TaskCancelled
+from whisper_api.decoding.cancellation import abort_between_windows
+from whisper_api.decoding.language_detection import detect_language
+from whisper_api.decoding.model_scheduler import ModelScheduler
+from whisper_api.decoding.presets import DEFAULT_PRESET
+from whisper_api.decoding.presets import decoding_presets
+from whisper_api.decoding.vad import SpeechTimeline
+from whisper_api.decoding.vad import speech_regions
 from whisper_api.environment import CPU_FALLBACK_MODEL
 from whisper_api.environment import DEVELOP_MODE
+from whisper_api.environment import DRAFT_MODEL
+from whisper_api.environment import LANGUAGE_DETECTION_MODEL
 from whisper_api.environment import LOAD_MODEL_ON_STARTUP
 from whisper_api.environment import MAX_TASK_QUEUE_SIZE
+from whisper_api.environment import VAD_MIN_SILENCE_S
 from whisper_api.log_setup import uuid_log_format
+from whisper_api.pipe_protocol import BatchingSender
+from whisper_api.pipe_protocol import recv_messages
 
 gigabyte_factor = int(1e9)
 vram_model_map: dict[model_sizes_str_t, int] = {
@@ -34,6 +52,9 @@ vram_model_map: dict[model_sizes_str_t, int] = {
 
 model_names = list(vram_model_map.keys())
 
+# the final run of tasks with a draft waits behind all tasks that didn't get a first result yet
+FINAL_TIER_PRIORITY = 1
+
 
 class Decoder:
 
@@ -78,6 +99,7 @@ class Decoder:
         unload_model_after_s: bool = True,
         use_gpu_if_available: bool = True,
         max_model_to_use: model_sizes_str_t = None,
+        status_debounce_s: float = 0.05,
     ):
         """
         Holding and managing the whisper model
@@ -87,14 +109,17 @@ class Decoder:
             unload_model_after_s: if model should be kept in memory after loading
             use_gpu_if_available: if GPU should be used if available
             max_model_to_use: max model to use, may be None in GPU Mode
+            status_debounce_s: time to collect status update requests before one combined update is sent
         """
 
         self.pipe_to_parent = pipe_to_parent
+        # several threads send to the parent, the sender is threadsafe and batches messages sent in quick succession
+        self.pipe_sender = BatchingSender(pipe_to_parent)
         # TODO: handle maxsize by making it configurable from outside and handle case where Queue reaches limit
         # queue that stores tasks that wait for processing
-        # using FastQueue because it allows for position queries of queued objects
-        self.task_queue = FastQueue(max_size=MAX_TASK_QUEUE_SIZE, key=lambda task: task.uuid)
-        # FastQueue is not threadsafe, so accesses must be synchronized externally
+        # using IndexedQueue because it allows for position queries of queued objects
+        self.task_queue = IndexedQueue(max_size=MAX_TASK_QUEUE_SIZE, key=lambda task: task.uuid)
+        # IndexedQueue is not threadsafe, so accesses must be synchronized externally
         self.task_queue_lock = threading.RLock()
         # condition that is waited for when no tasks are available and is notified when a new task is put in the queue
         self.new_task_condition = threading.Condition(self.task_queue_lock)
@@ -115,9 +140,17 @@ class Decoder:
             self.logger.warning(f"No explicit model for CPU was specified setting max-model to '{CPU_FALLBACK_MODEL=}'")
 
         self.unload_model_after_s = unload_model_after_s
+        # learns how fast the models are and picks smaller ones when deadlines would be missed otherwise
+        self.model_scheduler = ModelScheduler(self.gpu_mode)
 
         self.model: whisper.Whisper = None
         self.last_loaded_model_size: model_sizes_str_t = None
+        # small model for the drafts, it's kept next to the large model so they don't replace each other all the time
+        self.draft_model: whisper.Whisper = None
+        # a model of its own lets the language detection run next to a decode instead of waiting in the queue
+        # it's small and stays loaded once it was needed
+        self.language_detection_model: whisper.Whisper = None
+        self.language_detection_tasks: queue.Queue[Task] = queue.Queue()
 
         # this must happen before the decoder-tread starts so that we don't issue two parallel loads
         if LOAD_MODEL_ON_STARTUP:
@@ -126,6 +159,21 @@ class Decoder:
         # internal state that is nowhere used for checks, it's just for state reports to parent
         # does only turn False when queue is empty, not between two tasks that are already queued
         self.__busy = False
+        # id of the task in processing that shall be aborted, it's checked between two windows of the decode
+        self.__cancelled_current_task: Optional[str] = None
+
+        # status updates are debounced, requests within the debounce time are combined into one update
+        # they only carry the changes of the queue (tickets of new tasks and the counter of the queue head)
+        # so the parent can derive all positions without the need of a snapshot of the whole queue
+        self.status_debounce_s = status_debounce_s
+        self.__status_version = 0
+        # tickets of tasks that were enqueued since the last update (requires the task_queue_lock)
+        self.__new_queue_tickets: dict[str, int] = {}
+        self.__status_update_requested = threading.Event()
+        self.status_sender_thread: threading.Thread = threading.Thread(
+            target=self.status_sender_loop, name="status-sender", daemon=True
+        )
+        self.status_sender_thread.start()
 
         # start thread that read tasks from queue and processes them
         # it's a daemon, because it shall die when the main thread exits
@@ -134,6 +182,11 @@ class Decoder:
         )
         self.decoder_thread.start()
 
+        self.language_detection_thread: threading.Thread = threading.Thread(
+            target=self.language_detection_loop, name="language-detection", daemon=True
+        )
+        self.language_detection_thread.start()
+
         # let parent know we're ready and which state we're in
         # DISCLAIMER: yes I know. we could put that info print in the function.
         # that would save a lot of duplicate lines.
@@ -160,12 +213,14 @@ class Decoder:
 
     def get_status_dict(self) -> dict[str, str | dict[str, Any]]:
         """
-        Get a dict containing the current status of the decoder
+        Get a dict containing the current status of the decoder and the changes of the queue since the last call
         This function requires the task_queue_lock
         Returns:
 
         """
+        self.__status_version += 1
         data_dict = {
+            "version": self.__status_version,
             "gpu_mode": self.gpu_mode,
             "max_model_to_use": self.max_model_to_use,
             "last_loaded_model_size": self.last_loaded_model_size,
@@ -173,29 +228,44 @@ class Decoder:
             "currently_busy": self.__busy,
         }
 
-        # TODO: maybe add a kwarg to decide whether this "locked" data shall be collected or if data above is enough
         with self.task_queue_lock:
             data_dict["tasks_in_queue"] = len(self.task_queue)
-            data_dict["queue_status"] = {task.uuid: pos for pos, task in self.task_queue.to_priority_dict().items()}
+            # position of a task = its ticket - dequeued_tasks
+            data_dict["dequeued_tasks"] = self.task_queue.next_count
+            data_dict["new_queue_tickets"] = self.__new_queue_tickets
+            self.__new_queue_tickets = {}
 
         return {"type": "status", "data": data_dict}
 
     def send_status_update(self):
         """
-        Send a status update to the parent process
-        This function calls a method that requires the task_queue_lock to be acquired
+        Request a status update to the parent process
+        The update is sent by the status-sender thread, requests within the debounce time are combined
+        """
+        self.__status_update_requested.set()
+
+    def status_sender_loop(self):
+        """
+        Sends the requested status updates to the parent process
+        This function is meant to be run as a daemon thread, it will never exit on its own.
         """
-        status_dict = self.get_status_dict()
-        self.logger.debug(f"{status_dict}")
+        while True:
+            self.__status_update_requested.wait()
+            # collect all requests of the burst
+            time.sleep(self.status_debounce_s)
+            # clear before collecting the data - later requests will trigger a new update
+            self.__status_update_requested.clear()
 
-        self.pipe_to_parent.send(status_dict)
+            status_dict = self.get_status_dict()
+            self.logger.debug(f"Sending status update version={status_dict['data']['version']}")
+            self.send_to_parent(status_dict["type"], status_dict["data"])
 
-    @staticmethod
-    def task_to_pipe_message(task: Task, /) -> dict:
-        return {"type": "task_update", "data": task.to_json}
+    def send_to_parent(self, message_type: str, data: Any = None):
+        """Threadsafe send of a message to the parent process"""
+        self.pipe_sender.send(message_type, data)
 
     def send_task_update(self, task: Task, /):
-        self.pipe_to_parent.send(self.task_to_pipe_message(task))
+        self.send_to_parent("task_update", task)
 
     def handle_task(self, task: Task) -> Task:
         """
@@ -214,23 +284,53 @@ class Decoder:
             task.position_in_queue = self.task_queue.index(task)
             self.send_task_update(task)
 
-        # start processing
-        whisper_result = self.__run_model(
-            audio_path=task.audiofile_name,
-            task=task.task_type,
-            source_language=task.source_language,
-            model_size=task.target_model_size,
-        )
+        # the first run of a task with draft only produces the draft
+        draft = task.tiered and task.result_tier is None
+        model_size, model_choice_reason = task.target_model_size, None
+        if not draft:
+            model_size, model_choice_reason = self.__choose_model(task)
 
-        # set result and send to parent
-        if whisper_result is not None:
-            task.whisper_result = whisper_result
-            task.status = "finished"
-        else:
-            task.status = "failed"
+        # start processing, it stops between two windows if the task is cancelled meanwhile
+        try:
+            with abort_between_windows(lambda: self.__cancelled_current_task == task.uuid):
+                if self.__cancelled_current_task == task.uuid:
+                    raise TaskCancelled()
+
+                whisper_result = self.__run_model(
+                    audio_path=task.audiofile_name,
+                    task=task.task_type,
+                    source_language=task.source_language,
+                    model_size=model_size,
+                    draft=draft,
+                    preset=task.decoding_preset,
+                )
+
+            # set result and send to parent
+            if whisper_result is not None:
+                whisper_result.model_choice_reason = model_choice_reason
+                task.whisper_result = whisper_result
+                task.result_tier = "draft" if draft else "final"
+                task.status = "finished"
+            elif task.result_tier == "draft":
+                self.logger.warning(f"Final run of task '{uuid_log_format(task.uuid)}' failed, keeping its draft")
+                task.status = "finished"
+            else:
+                task.status = "failed"
+
+        except TaskCancelled:
+            self.logger.info(f"Aborted decode of cancelled task '{uuid_log_format(task.uuid)}'")
+            task.status = "cancelled"
 
-        # either way task is no longer queued
+        # the decode loop must go on for the tasks behind, whatever went wrong with this one
+        except Exception as e:
+            self.logger.warning(f"Decode of task '{uuid_log_format(task.uuid)}' failed: {type(e).__name__}: {e}")
+            # a draft that is there already stays the result, like when no model could be loaded
+            task.status = "finished" if task.result_tier == "draft" else "failed"
+
+        # either way task is no longer queued - unless it's queued again for its final result
         task.position_in_queue = None
+        if draft and task.status == "finished":
+            self.__enqueue_final_run(task)
 
         self.send_task_update(task)
         self.logger.info(
@@ -241,6 +341,25 @@ class Decoder:
 
         return task
 
+    def language_detection_loop(self):
+        """
+        Detects the language of the tasks in the language detection queue, one after the other
+        This function is meant to be run as a daemon thread, it will never exit on its own.
+        """
+        while True:
+            task = self.language_detection_tasks.get()
+            self.logger.info(f"Detecting language of task '{uuid_log_format(task.uuid)}'")
+            try:
+                task.whisper_result = self.__run_language_detection(task.audiofile_name)
+                task.status = "finished"
+            except Exception as e:
+                self.logger.warning(
+                    f"Language detection of task '{uuid_log_format(task.uuid)}' failed: {type(e).__name__}: {e}"
+                )
+                task.status = "failed"
+
+            self.send_task_update(task)
+
     def decode_loop(self, condition_timeout_s: float = 2.0):
         """
         Loops over queue and calls processing of each task from the queue.
@@ -301,9 +420,10 @@ class Decoder:
 
                 # check if we don't need to unload the model
                 # case that self.unload_model_after_s is None is handled in get_unload_time -> float("inf")
-                if self.model is None or time.time() < time_to_unload:
+                if (self.model is None and self.draft_model is None) or time.time() < time_to_unload:
                     continue
 
+                self.draft_model = None
                 self.__unload_model()
 
                 # the potential unload of the model is worth an update
@@ -322,74 +442,164 @@ class Decoder:
             # None means no timeout so model will never unload
             self.pipe_to_parent.poll(None)
 
-            msg = self.pipe_to_parent.recv()
+            # messages that were sent in quick succession arrive as one batch
+            try:
+                messages = recv_messages(self.pipe_to_parent)
+            except ValueError as e:
+                self.logger.warning(f"Could not decode messages from parent (continuing): '{e}'")
+                continue
 
-            # the structure is a dict that has two keys:
-            # task_type: the way to interpret the data received
-            # data: the data to process. in most cases this will be a dict itself
-            task_type = msg.get("type", None)
-            data = msg.get("data", None)
+            for task_type, data in messages:
+                self.handle_message(task_type, data)
 
-            if task_type is None:
-                self.logger.debug(f"Decoder received '{task_type=}', weird... ignoring message - data: {msg=}")
-                continue
+    def handle_message(self, task_type: Optional[str], data: Any):
+        """
+        Handle a single message from the parent process
+        Args:
+            task_type: the way to interpret the data received
+            data: the data to process, a Task for decode messages
+        """
 
-            elif task_type == "exit":  # data is arbitrary since it will not be considered
-                self.logger.warning("Decoder received exit, exiting process.")
-                exit(0)
+        if task_type is None:
+            self.logger.debug(f"Decoder received '{task_type=}', weird... ignoring message")
+            return
 
-            # TODO: maybe add a more efficient task that just requires the lookup of one task?
-            elif task_type == "status":  # data is not evaluated
-                self.logger.info(f"Sending status update to parent")
-                self.send_status_update()
-                continue
+        elif task_type == "exit":  # data is arbitrary since it will not be considered
+            self.logger.warning("Decoder received exit, exiting process.")
+            exit(0)
 
-            # guarding against all messages that are not decode messages
-            # data is a json-serialized task
-            if task_type != "decode":
-                self.logger.warning(f"Can't handle message: '{msg=}'")
-                continue
+        # TODO: maybe add a more efficient task that just requires the lookup of one task?
+        elif task_type == "status":  # data is not evaluated
+            self.logger.info(f"Sending status update to parent")
+            self.send_status_update()
+            return
 
-            # the json must be a decode-task from here on
-            # all other cases are caught above
+        elif task_type == "cancel":  # data is the id of the task
+            self.__cancel(data)
+            return
 
-            # reconstruct task from json
-            try:
-                task: Task = Task.from_json(data)
-            except Exception as e:
-                self.logger.warning(f"Could not parse task from json (continuing): '{e}'")
-                continue
+        elif task_type == "detect_language":  # data is a task, it bypasses the decode queue
+            self.language_detection_tasks.put(data)
+            return
 
-            # put task to queue
-            # we will need this lock on several occasions during that section
-            # so just hold it for the whole time and nothing can go wrong :)
-            with self.task_queue_lock:
-                try:
-                    self.logger.debug(f"Adding task '{uuid_log_format(task.uuid)}' to queue")
-                    self.task_queue.put(task)
-                except OverflowError:
-                    # TODO: maybe add new status "rejected" and a reason to it?
-                    self.logger.warning(
-                        f"Task '{uuid_log_format(task.uuid)}' failed "
-                        f"because queue of size {self.task_queue.max_size} is full"
-                    )
-                    task.status = "failed"
-                    self.send_task_update(task)
-                    continue
+        # guarding against all messages that are not decode messages
+        if task_type not in ("decode", "decode_batch"):
+            self.logger.warning(f"Can't handle message: '{task_type=}'")
+            return
 
-                # we don't need to send a task update
-                # the only thing that changes immediately is the position in queue
-                # and that is covered by the state update datat below
+        # the data must be a decode-task or a list of them from here on
+        # all other cases are caught above
+        tasks: list[Task] = data if task_type == "decode_batch" else [data]
 
-                # the queue received a new element
-                # that change will technically be captured by the decoder thread too,
-                # but maybe it's in a longer decode process
-                # sending the update here too makes things more responsive from the outside
-                self.logger.info(f"Sending status update to parent")
+        # put tasks to queue
+        # we will need this lock on several occasions during that section
+        # so just hold it for the whole time and nothing can go wrong :)
+        with self.task_queue_lock:
+            for task in tasks:
+                self.__enqueue(task)
+
+            # we don't need to send a task update
+            # the only thing that changes immediately is the position in queue
+            # and that is covered by the queue ticket in the state update below
+
+            # the queue received new elements
+            # that change will technically be captured by the decoder thread too,
+            # but maybe it's in a longer decode process
+            # sending the update here too makes things more responsive from the outside
+            self.logger.info(f"Sending status update to parent")
+            self.send_status_update()
+
+            # in case that the decode thread is waiting - notify the condition
+            self.new_task_condition.notify()
+
+    def __choose_model(self, task: Task) -> tuple[Optional[model_sizes_str_t], Optional[str]]:
+        """
+        Choose the model for the task, a smaller one if the preferred one would miss a deadline
+        Returns:
+            the model size to request (None for the largest that fits) and why it was chosen
+        """
+        preferred = task.target_model_size or self.max_model_to_use or model_names[0]
+        candidates = self.__get_models_below(preferred)
+        with self.task_queue_lock:
+            queued = [queued_task for position, queued_task in self.task_queue.iter_priorities() if position > 0]
+
+        model_size, reason = self.model_scheduler.choose(task, candidates, queued)
+        if reason is not None:
+            self.logger.info(f"Model for task '{uuid_log_format(task.uuid)}': {reason}")
+
+        # keep the request as it is if nothing is downgraded, so the largest model that fits is still used
+        if model_size == preferred:
+            return task.target_model_size, reason
+
+        return model_size, reason
+
+    def __enqueue(self, task: Task, priority: int = 0):
+        """Put a task into the queue, it fails if the queue is full (requires the task_queue_lock)"""
+        try:
+            self.logger.debug(f"Adding task '{uuid_log_format(task.uuid)}' to queue")
+            position = self.task_queue.put(task, priority)
+            # the position is the ticket minus the tasks that were taken out of the queue before it
+            task.queue_ticket = self.task_queue.next_count + position
+            self.__new_queue_tickets[task.uuid] = task.queue_ticket
+            # tasks of a lower priority were passed, they moved back by one
+            self.__reissue_tickets(position + 1)
+        except OverflowError:
+            # TODO: maybe add new status "rejected" and a reason to it?
+            self.logger.warning(
+                f"Task '{uuid_log_format(task.uuid)}' failed "
+                f"because queue of size {self.task_queue.max_size} is full"
+            )
+            task.status = "failed"
+            self.send_task_update(task)
+
+    def __enqueue_final_run(self, task: Task):
+        """Queue a task with a draft again for its final result, with a full queue the draft stays the result"""
+        with self.task_queue_lock:
+            if self.task_queue.max_size is not None and len(self.task_queue) >= self.task_queue.max_size:
+                self.logger.warning(f"Queue is full, the draft of task '{uuid_log_format(task.uuid)}' stays its result")
+                return
+
+            task.status = "pending"
+            self.__enqueue(task, FINAL_TIER_PRIORITY)
+            task.position_in_queue = self.task_queue.index(task)
+            self.send_status_update()
+
+    def __reissue_tickets(self, from_position: int):
+        """
+        Re-issue the tickets of the queued tasks from the position on (requires the task_queue_lock)
+        Tickets only follow the positions as long as tasks are added to the end of the queue and taken from its head.
+        The tasks in front keep theirs, the queue is entered at the position without walking through them.
+        """
+        for position, task in self.task_queue.iter_priorities(max(from_position, 1)):
+            task.queue_ticket = self.task_queue.next_count + position
+            self.__new_queue_tickets[task.uuid] = task.queue_ticket
+
+    def __cancel(self, task_id: str):
+        """Remove a task from the queue or stop its decode if it's in processing already"""
+        with self.task_queue_lock:
+            if task_id in self.task_queue:
+                position = self.task_queue.index(by_key=task_id)
+                task = self.task_queue.remove(by_key=task_id)
+                self.logger.info(f"Removed cancelled task '{uuid_log_format(task_id)}' from queue")
+
+                # the tasks behind moved up by one
+                self.__reissue_tickets(position)
+
+                task.status = "cancelled"
+                task.position_in_queue = None
+                self.send_task_update(task)
                 self.send_status_update()
+                return
+
+            # the current task might be done already, but then the flag is never checked for it
+            current = self.task_queue.current
+            if current is not None and current.uuid == task_id:
+                self.logger.info(f"Stopping decode of cancelled task '{uuid_log_format(task_id)}'")
+                self.__cancelled_current_task = task_id
+                return
 
-                # in case that the decode thread is waiting - notify the condition
-                self.new_task_condition.notify()
+        # it's done already, the parent will get or got its final update anyway
+        self.logger.info(f"Task '{uuid_log_format(task_id)}' to cancel is not queued (anymore)")
 
     def __unload_model(self):
         """
@@ -415,6 +625,13 @@ class Decoder:
         # TODO: we should kill the decoder-thread if we wanna explicitly unload the model
         #  but is that really necessary - we exit anyway and memory will be freed
         # self.__unload_model()
+
+        # don't lose the messages that still wait for their batch
+        try:
+            self.pipe_sender.flush()
+        except OSError:
+            pass
+
         exit(0)
 
     def __get_models_below(self, model_name: model_sizes_str_t) -> list[model_sizes_str_t]:
@@ -607,6 +824,8 @@ class Decoder:
         task: task_type_str_t,
         source_language: Optional[str],
         model_size: model_sizes_str_t = None,
+        draft: bool = False,
+        preset: decoding_preset_str_t = DEFAULT_PRESET,
     ) -> Optional[WhisperResult]:
         """
         'Generic' function to run the model and centralize the needed logic
@@ -614,38 +833,116 @@ class Decoder:
         For args see transcribe() and translate()
         Args:
             model_size: overwrites the decoder-wide set max_model_size
+            draft: use the small draft model that is kept next to the large one, model_size is ignored then
+            preset: the decoding options, drafts are always decoded with the "fast" preset
 
         Returns:
             the result of the whisper models transcription/translation and the transcription time in seconds
         """
 
-        # load model
-        model = self.load_model(self.gpu_mode, model_size or self.max_model_to_use)  # model can still be None
-        self.logger.info(f"Sending status update to parent")
-        self.send_status_update()  # we might have reloaded or changed the mode - worth an update
+        if draft:
+            if self.draft_model is None:
+                self.draft_model = self.__load_small_model(DRAFT_MODEL)
+            model, used_model_size = self.draft_model, DRAFT_MODEL
+
+        else:
+            # load model
+            model = self.load_model(self.gpu_mode, model_size or self.max_model_to_use)  # model can still be None
+            used_model_size = self.last_loaded_model_size
+            self.logger.info(f"Sending status update to parent")
+            self.send_status_update()  # we might have reloaded or changed the mode - worth an update
 
         # load failed, load model should try everything to load one, so it's a lost cause
         if model is None:
             self.logger.warning("Could not load any model, aborting task.")
             return None
 
-        self.logger.info(f"Start decode of '{audio_path}' with model '{self.last_loaded_model_size}', {task=}")
+        # a draft shall be quick, whatever the final result is decoded with
+        preset = "fast" if draft else preset
+        self.logger.info(f"Start decode of '{audio_path}' with model '{used_model_size}', {task=}, {preset=}")
 
         # start decoding
         start = dt.datetime.now()
-        result = model.transcribe(audio_path, language=source_language, task=task)
+        # decoded in-process where possible, whisper would spawn ffmpeg for every file
+        audio, timeline = self.__cut_silence(load_audio(audio_path), audio_path)
+        transcribe_start = time.perf_counter()
+        result = model.transcribe(audio, language=source_language, task=task, **decoding_presets[preset])
+        # the speed of the model alone, on the audio that is left after cutting the silence
+        transcribe_s = time.perf_counter() - transcribe_start
+        # per preset, beam search takes a multiple of the time of greedy decoding
+        self.model_scheduler.record(used_model_size, preset, len(audio) / SAMPLE_RATE, transcribe_s)
+        if timeline is not None:
+            timeline.map_segments(result["segments"])
         end = dt.datetime.now()
 
-        self.logger.info(f"Finished decode of '{audio_path}' with model '{self.last_loaded_model_size}', {task=}")
+        self.logger.info(f"Finished decode of '{audio_path}' with model '{used_model_size}', {task=}")
 
         return WhisperResult(
             **result,
             start_time=start,
             end_time=end,
-            used_model_size=self.last_loaded_model_size,
+            used_model_size=used_model_size,
+            used_preset=preset,
             # TODO is this the correct code for translation?
             output_language="en_US" if task == "translate" else result["language"],
-            used_device="gpu" if self.gpu_mode else "cpu",
+            used_device="gpu" if model.device.type == "cuda" else "cpu",
+            skipped_audio_s=round(timeline.skipped_s, 1) if timeline is not None else None,
+        )
+
+    def __cut_silence(self, audio: np.ndarray, audio_path: str) -> tuple[np.ndarray, Optional[SpeechTimeline]]:
+        """
+        Cut the long silences out of the audio if VAD_MIN_SILENCE_S is set
+        Returns:
+            the audio to decode and the timeline to map the result back with (None if nothing is cut)
+        """
+        if not VAD_MIN_SILENCE_S:
+            return audio, None
+
+        regions = speech_regions(audio, VAD_MIN_SILENCE_S)
+        # the detector might miss very quiet speech, so audio without any speech is decoded as a whole
+        if not regions:
+            regions = [(0, len(audio))]
+
+        timeline = SpeechTimeline(regions, len(audio))
+        self.logger.info(
+            f"VAD kept {len(regions)} speech regions of '{audio_path}', "
+            f"{timeline.skipped_s:.1f}s of {len(audio) / timeline.sample_rate:.1f}s are skipped"
+        )
+        return timeline.join(audio), timeline
+
+    def __load_small_model(self, model_size: model_sizes_str_t) -> whisper.Whisper:
+        """Load one of the small models that are kept next to the decoding model, to the CPU if the GPU is full"""
+        device = "cuda" if self.gpu_mode else "cpu"
+        try:
+            model = whisper.load_model(model_size, device=device)
+        except torch.cuda.OutOfMemoryError:
+            self.logger.warning(f"Model '{model_size}' doesn't fit the GPU, loading it to the CPU")
+            device = "cpu"
+            model = whisper.load_model(model_size, device=device)
+
+        self.logger.info(f"Loaded small model '{model_size}' to {device}")
+        return model
+
+    def __run_language_detection(self, audio_path: str) -> WhisperResult:
+        """Detect the language on the first window of the audio with the language detection model"""
+        if self.language_detection_model is None:
+            self.language_detection_model = self.__load_small_model(LANGUAGE_DETECTION_MODEL)
+
+        start = dt.datetime.now()
+        language_probabilities = detect_language(self.language_detection_model, audio_path)
+        end = dt.datetime.now()
+        language = next(iter(language_probabilities))
+
+        return WhisperResult(
+            text="",
+            language=language,
+            output_language=language,
+            segments=[],
+            used_model_size=LANGUAGE_DETECTION_MODEL,
+            start_time=start,
+            end_time=end,
+            used_device="gpu" if self.language_detection_model.device.type == "cuda" else "cpu",
+            language_probabilities=language_probabilities,
         )
 
     def transcribe(
@@ -0,0 +1,28 @@
+import whisper
+from whisper.audio import CHUNK_LENGTH
+
+from whisper_api.audio_decoding import load_audio
+
+"""
+Language detection on the first window of a file
+
+whisper detects the language on the first 30s window anyway, so that's all that is read and mel-transformed:
+decoding stops after the window, no matter how long the file is.
+"""
+
+# number of most probable languages that are reported
+TOP_LANGUAGES = 5
+
+
+def detect_language(model: whisper.Whisper, audio_path: str) -> dict[str, float]:
+    """
+    Detect the spoken language on the first window of a file
+    Returns:
+        the most probable languages with their probability, the most probable first
+    """
+    audio = whisper.pad_or_trim(load_audio(audio_path, max_duration_s=CHUNK_LENGTH))
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels).to(model.device)
+    _, probabilities = model.detect_language(mel)
+
+    top_languages = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)[:TOP_LANGUAGES]
+    return {language: round(probability, 4) for language, probability in top_languages}
@@ -0,0 +1,124 @@
+import datetime as dt
+from typing import Optional
+
+from whisper_api.data_models.data_types import decoding_preset_str_t
+from whisper_api.data_models.data_types import model_sizes_str_t
+from whisper_api.data_models.task import Task
+from whisper_api.decoding.presets import decoding_presets
+
+"""
+Pick the model for a task so that it - and the tasks queued behind it - still meet their deadlines
+
+The decode time of a task is estimated with the real-time factor (decode time / audio duration) of a model
+and a decoding preset, which is learned from the tasks that were decoded with both.
+When a task is taken from the queue, its time budget is the time left until its own deadline, but also the time
+the tasks behind can spare without missing theirs, assuming they get the smallest model.
+The largest model whose estimate fits the budget is taken.
+Tasks behind that would miss their deadline even then don't restrict the budget, they are lost anyway.
+"""
+
+# rough real-time factors on a GPU until the first tasks were measured, the CPU is assumed to be way slower
+# they're the same for all presets until the presets are measured
+initial_gpu_real_time_factors: dict[model_sizes_str_t, float] = {
+    "large": 0.25,
+    "turbo": 0.08,
+    "medium": 0.15,
+    "small": 0.07,
+    "base": 0.04,
+}
+CPU_SLOWDOWN = 10
+
+
+class ModelScheduler:
+
+    def __init__(self, gpu_mode: bool, weight: float = 0.2):
+        """
+        Args:
+            gpu_mode: if the models run on the GPU, only used for the initial estimates
+            weight: weight of a new measurement in the moving average of the real-time factor
+        """
+        self.weight = weight
+        # (model, preset) -> real-time factor
+        self.real_time_factors: dict[tuple[model_sizes_str_t, decoding_preset_str_t], float] = {
+            (model_size, preset): factor if gpu_mode else factor * CPU_SLOWDOWN
+            for model_size, factor in initial_gpu_real_time_factors.items()
+            for preset in decoding_presets
+        }
+
+    def record(
+        self,
+        model_size: model_sizes_str_t,
+        preset: decoding_preset_str_t,
+        audio_duration_s: Optional[float],
+        processing_s: float,
+    ):
+        """Learn from a decode that is done"""
+        if not audio_duration_s:
+            return
+
+        key = (model_size, preset)
+        factor = processing_s / audio_duration_s
+        # a model without an initial estimate (e.g. a draft model like tiny) starts with its first measurement
+        previous = self.real_time_factors.setdefault(key, factor)
+        self.real_time_factors[key] = previous + self.weight * (factor - previous)
+
+    def estimate_s(
+        self, model_size: model_sizes_str_t, preset: decoding_preset_str_t, audio_duration_s: Optional[float]
+    ) -> float:
+        """Estimated decode time, 0 if the duration of the audio is unknown"""
+        return self.real_time_factors[(model_size, preset)] * (audio_duration_s or 0.0)
+
+    def choose(
+        self,
+        task: Task,
+        candidates: list[model_sizes_str_t],
+        queued: list[Task],
+        now: Optional[dt.datetime] = None,
+    ) -> tuple[model_sizes_str_t, Optional[str]]:
+        """
+        Args:
+            task: the task that is decoded next
+            candidates: the models that may be used, the preferred (largest) one first
+            queued: the tasks behind it in queue order
+            now: the current time (default is now)
+
+        Returns:
+            the model to use and why it was chosen, the reason is None if no deadline had to be considered
+        """
+        now = now or dt.datetime.now()
+        smallest = candidates[-1]
+
+        budget_s: Optional[float] = None
+        if task.deadline is not None:
+            budget_s = (task.deadline - now).total_seconds()
+
+        # the time the tasks behind leave for this one, if they all get the smallest model
+        time_after_s = self.estimate_s(smallest, task.decoding_preset, task.audio_duration_s)
+        min_time_s = time_after_s
+        for queued_task in queued:
+            time_after_s += self.estimate_s(smallest, queued_task.decoding_preset, queued_task.audio_duration_s)
+            if queued_task.deadline is None:
+                continue
+
+            spare_s = (queued_task.deadline - now).total_seconds() - (time_after_s - min_time_s)
+            # it's late anyway, it must not drag this task down as well
+            if spare_s < min_time_s:
+                continue
+
+            budget_s = spare_s if budget_s is None else min(budget_s, spare_s)
+
+        if budget_s is None:
+            return candidates[0], None
+
+        for model_size in candidates:
+            if (estimate_s := self.estimate_s(model_size, task.decoding_preset, task.audio_duration_s)) <= budget_s:
+                if model_size == candidates[0]:
+                    return model_size, f"'{model_size}' fits the deadline (~{estimate_s:.0f}s of {budget_s:.0f}s left)"
+
+                preferred_estimate_s = self.estimate_s(candidates[0], task.decoding_preset, task.audio_duration_s)
+                return model_size, (
+                    f"downgraded from '{candidates[0]}' (~{preferred_estimate_s:.0f}s) "
+                    f"to meet the deadline (~{estimate_s:.0f}s of {budget_s:.0f}s left)"
+                )
+
+        return smallest, f"deadline can't be met even with '{smallest}' (~{min_time_s:.0f}s of {budget_s:.0f}s left)"
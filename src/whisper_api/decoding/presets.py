@@ -0,0 +1,32 @@
+from typing import Any
+
+from whisper_api.data_models.data_types import decoding_preset_str_t
+
+"""
+Named sets of decoding options, clients choose how much accuracy they trade for speed
+
+- fast: greedy decoding of every window exactly once, no temperature fallback and no conditioning on the
+        previous window (which also stops repetition loops from spreading)
+- balanced: whisper's defaults, greedy decoding with the temperature fallback for windows that look broken
+- accurate: beam search, with sampling of several candidates when the fallback kicks in
+
+The options are passed to whisper's transcribe() on top of the language and the task.
+The values of fast and accurate are untuned defaults, they are not backed by measurements yet.
+Measure them on your own audio with benchmarks/decoding_presets.py, the server reports the real-time factors
+it observes per preset and model at /api/v1/task_metrics.
+"""
+
+DEFAULT_PRESET: decoding_preset_str_t = "balanced"
+
+decoding_presets: dict[decoding_preset_str_t, dict[str, Any]] = {
+    "fast": {
+        "temperature": 0.0,
+        "condition_on_previous_text": False,
+    },
+    "balanced": {},
+    "accurate": {
+        "beam_size": 5,
+        "patience": 1.0,
+        "best_of": 5,
+    },
+}
@@ -0,0 +1,137 @@
+import bisect
+from typing import Any
+
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+"""
+Voice activity detection: cut long silences out of the audio before it's decoded
+
+Every frame of the audio is classified as speech by its energy (relative to the noise floor of the file)
+and the share of its energy in the band of the human voice. Speech regions are padded and silences
+shorter than the minimum are kept, so whisper still gets the context of natural pauses.
+Only the speech regions are decoded, one after the other, the timestamps of the result are mapped back
+to the original timeline afterwards.
+"""
+
+FRAME_S = 0.03
+# frames that are analysed at once, it bounds the memory of the spectra (~5 minutes of audio)
+FRAMES_PER_BLOCK = 10_000
+# a frame is speech if it's that much louder than the quietest 10% of the frames ...
+ENERGY_MARGIN_DB = 10.0
+# ... but never if it's quieter than this (digital silence has no meaningful noise floor)
+MIN_ENERGY_DB = -60.0
+# ... and if enough of its energy is in the band of the human voice
+VOICE_BAND_HZ = (300.0, 3400.0)
+MIN_VOICE_BAND_RATIO = 0.3
+# shorter bursts are clicks or noise
+MIN_SPEECH_S = 0.2
+# speech regions are extended by this on both sides, so the on- and offsets of words aren't cut
+PADDING_S = 0.3
+
+
+def speech_frames(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Classify the frames of mono audio (float in [-1, 1])
+    Returns:
+        a boolean mask with one entry per frame of FRAME_S
+    """
+    frame_length = int(sample_rate * FRAME_S)
+    n_frames = len(audio) // frame_length
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool)
+
+    frames = audio[: n_frames * frame_length].reshape(n_frames, frame_length)
+    energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-12)
+
+    frequencies = np.fft.rfftfreq(frame_length, 1 / sample_rate)
+    voice_band = (frequencies >= VOICE_BAND_HZ[0]) & (frequencies <= VOICE_BAND_HZ[1])
+    window = np.hanning(frame_length).astype(np.float32)
+    voice_band_ratio = np.empty(n_frames)
+    for start in range(0, n_frames, FRAMES_PER_BLOCK):
+        power = np.abs(np.fft.rfft(frames[start : start + FRAMES_PER_BLOCK] * window, axis=1)) ** 2
+        voice_band_ratio[start : start + FRAMES_PER_BLOCK] = power[:, voice_band].sum(axis=1) / (
+            power.sum(axis=1) + 1e-12
+        )
+
+    threshold_db = max(np.percentile(energy_db, 10) + ENERGY_MARGIN_DB, MIN_ENERGY_DB)
+    return (energy_db > threshold_db) & (voice_band_ratio >= MIN_VOICE_BAND_RATIO)
+
+
+def speech_regions(audio: np.ndarray, min_silence_s: float, sample_rate: int = SAMPLE_RATE) -> list[tuple[int, int]]:
+    """
+    Find the regions of the audio that are decoded
+    Args:
+        audio: mono audio (float in [-1, 1])
+        min_silence_s: only silences that are longer than this are cut out
+        sample_rate: sample rate of the audio
+
+    Returns:
+        start and end sample of the regions, sorted and without overlap
+    """
+    mask = speech_frames(audio, sample_rate)
+    # start and end frames of the runs of speech frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2) * FRAME_S
+    runs = runs[runs[:, 1] - runs[:, 0] >= MIN_SPEECH_S]
+
+    duration_s = len(audio) / sample_rate
+    regions: list[list[float]] = []
+    for start_s, end_s in runs:
+        start_s, end_s = max(start_s - PADDING_S, 0.0), min(end_s + PADDING_S, duration_s)
+        if regions and start_s - regions[-1][1] < min_silence_s:
+            regions[-1][1] = end_s
+        else:
+            regions.append([start_s, end_s])
+
+    return [(int(start_s * sample_rate), int(end_s * sample_rate)) for start_s, end_s in regions]
+
+
+class SpeechTimeline:
+    """The speech regions of an audio, cut out and joined, with the mapping back to the original timeline"""
+
+    def __init__(self, regions: list[tuple[int, int]], total_samples: int, sample_rate: int = SAMPLE_RATE):
+        self.regions = regions
+        self.total_samples = total_samples
+        self.sample_rate = sample_rate
+        # where each region starts in the joined audio
+        self.__joined_starts: list[int] = []
+        joined_samples = 0
+        for start, end in regions:
+            self.__joined_starts.append(joined_samples)
+            joined_samples += end - start
+        self.joined_samples = joined_samples
+
+    @property
+    def skipped_s(self) -> float:
+        """Seconds of audio that are not decoded"""
+        return (self.total_samples - self.joined_samples) / self.sample_rate
+
+    def join(self, audio: np.ndarray) -> np.ndarray:
+        """Cut out the speech regions and put them one after the other"""
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original_s(self, joined_s: float, is_end: bool = False) -> float:
+        """
+        Map a time of the joined audio to the original audio
+        Args:
+            joined_s: time in the joined audio
+            is_end: a time at the joint of two regions is the end of the first, not the start of the second
+        """
+        joined_sample = joined_s * self.sample_rate
+        if is_end:
+            region = max(bisect.bisect_left(self.__joined_starts, joined_sample) - 1, 0)
+        else:
+            region = max(bisect.bisect_right(self.__joined_starts, joined_sample) - 1, 0)
+
+        original_sample = self.regions[region][0] + joined_sample - self.__joined_starts[region]
+        return round(original_sample / self.sample_rate, 3)
+
+    def map_segments(self, segments: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Move the timestamps of whisper segments (and their words if any) to the original timeline, in place"""
+        for segment in segments:
+            for item in [segment, *segment.get("words", ())]:
+                item["start"] = self.to_original_s(item["start"])
+                item["end"] = self.to_original_s(item["end"], is_end=True)
+
+        return segments
@@ -11,11 +11,58 @@ if (UNLOAD_MODEL_AFTER_S := os.getenv("UNLOAD_MODEL_AFTER_S", None)) is not None
 
 DELETE_RESULTS_AFTER_M = int(os.getenv("DELETE_RESULTS_AFTER_M", 60))
 REFRESH_EXPIRATION_TIME_ON_USAGE = int(os.getenv("REFRESH_EXPIRATION_TIME_ON_USAGE", 1))
-RUN_RESULT_EXPIRY_CHECK_M = os.getenv("RUN_RESULT_EXPIRY_CHECK_M", 5)
+RUN_RESULT_EXPIRY_CHECK_M = int(os.getenv("RUN_RESULT_EXPIRY_CHECK_M", 5))
 USE_GPU_IF_AVAILABLE = int(os.getenv("USE_GPU_IF_AVAILABLE", 1))
 MAX_MODEL = os.getenv("MAX_MODEL", None)
 MAX_TASK_QUEUE_SIZE = int(os.getenv("MAX_TASK_QUEUE_SIZE", 128))
+# max seconds of audio waiting for decoding, new submissions get 429 beyond that - 0 means no limit
+MAX_QUEUED_AUDIO_S = float(os.getenv("MAX_QUEUED_AUDIO_S", 0))
+# files with a longer audio track are refused - 0 means no limit
+MAX_AUDIO_DURATION_S = float(os.getenv("MAX_AUDIO_DURATION_S", 0))
 CPU_FALLBACK_MODEL = os.getenv("CPU_FALLBACK_MODEL", "medium")
+# seconds after submission until which a result is needed, bigger models are skipped to meet it - 0 means no deadline
+DEFAULT_DEADLINE_S = float(os.getenv("DEFAULT_DEADLINE_S", 0))
+# silences longer than this are cut out of the audio before it's decoded, 0 disables the voice activity detection
+VAD_MIN_SILENCE_S = float(os.getenv("VAD_MIN_SILENCE_S", 0))
+# small model for the quick drafts of tasks that are submitted with draft, the final result uses the large model
+DRAFT_MODEL = os.getenv("DRAFT_MODEL", "base")
+# small model that is kept loaded next to the decoding model, it detects the language of files without queueing
+LANGUAGE_DETECTION_MODEL = os.getenv("LANGUAGE_DETECTION_MODEL", "base")
+# empty means that tasks are only held in RAM and are lost on restart
+TASK_STORE_DIR = os.getenv("TASK_STORE_DIR", "")
+# memory budget for tasks held in RAM, 0 means no limit
+TASK_CACHE_MAX_MB = int(os.getenv("TASK_CACHE_MAX_MB", 0))
+# where tasks that exceed the memory budget are moved to, empty means a new temporary directory
+TASK_SPILL_DIR = os.getenv("TASK_SPILL_DIR", "")
+# max number of files a batch (including the members of its archives) may contain
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 2000))
+# max size of all files of a batch together (archive members uncompressed), 0 means no limit
+MAX_BATCH_MB = int(os.getenv("MAX_BATCH_MB", 10240))
+# max size of a resumable upload, announced when it's created
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", 10240))
+# max number of resumable uploads that are created but not finalized yet
+MAX_OPEN_UPLOADS = int(os.getenv("MAX_OPEN_UPLOADS", 100))
+# directories whose files can be submitted by their path, separated like PATH (empty disables it)
+INGEST_DIRS = [os.path.realpath(path) for path in os.getenv("INGEST_DIRS", "").split(os.pathsep) if path]
+# responses smaller than this are not compressed, 0 disables compression of API responses
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+# upper limit for the time a long-polling status request is held
+STATUS_MAX_WAIT_S = float(os.getenv("STATUS_MAX_WAIT_S", 60))
+# max number of task ids a bulk status request may ask for
+MAX_BULK_STATUS_TASKS = int(os.getenv("MAX_BULK_STATUS_TASKS", 1000))
+# route -> share of its requests that are written to the access log, e.g. "/api/v1/status=0.01,/api/v1/srt=0.5"
+ACCESS_LOG_SAMPLE_RATES = {
+    route.strip(): float(rate)
+    for route, _, rate in (
+        entry.rpartition("=")
+        for entry in os.getenv("ACCESS_LOG_SAMPLE_RATES", "/api/v1/status=0.01,/api/v1/batch_status=0.01").split(",")
+        if entry.strip()
+    )
+}
+# requests that take longer are always logged (the wait of a long polling request is not counted)
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", 1000))
+# interval of the per route summaries (count, p50/p99 duration) in the access log, 0 disables them
+ACCESS_LOG_SUMMARY_INTERVAL_S = float(os.getenv("ACCESS_LOG_SUMMARY_INTERVAL_S", 60))
 
 LOG_DIR = os.getenv("LOG_DIR", "data/")
 LOG_FILE = os.getenv("LOG_FILE", "whisper_api.log")
@@ -28,6 +75,8 @@ LOG_DATE_FORMAT = os.getenv("LOG_DATE_FORMAT", "%d.%m. %H:%M:%S")
 LOG_ROTATION_WHEN = os.getenv("LOG_ROTATION", "H")
 LOG_ROTATION_INTERVAL = int(os.getenv("LOG_ROTATION_INTERVAL", 2))
 LOG_ROTATION_BACKUP_COUNT = int(os.getenv("LOG_ROTATION_BACKUP_COUNT", 48))
+# records waiting to be written, when full records below WARNING are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
 LOG_PRIVACY_MODE = int(os.getenv("LOG_PRIVACY_MODE", 1))
 
 AUTHORIZED_MAILS = set(os.getenv("LOG_AUTHORIZED_MAILS", "").split(" "))
@@ -4,22 +4,62 @@ from fastapi import FastAPI
 from fastapi import HTTPException
 from fastapi import Request
 from fastapi import status
-from starlette.responses import FileResponse
+from starlette.responses import Response
+
+from whisper_api.compression import PrecompressedBody
 
 # get folder of this file
 static_path = os.path.dirname(os.path.realpath(__file__)) + "/static"
 
+media_types = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+}
+
+# referenced by index.html
+asset_files = ["script.js", "styles.css"]
+
 
 class Frontend:
     def __init__(self, app: FastAPI):
         self.app = app
+        # the files never change while we're running, so they're loaded and compressed once
+        self.files = self.load_static_files()
 
         self.add_endpoints()
 
     def add_endpoints(self):
         self.app.add_api_route("/{file_path:path}", self.frontend)
 
-    async def frontend(self, file_path: str, request: Request):
+    @staticmethod
+    def load_static_files() -> dict[str, PrecompressedBody]:
+        """Load and compress all static files, index.html references the assets including their version"""
+
+        def load(file_name: str) -> bytes:
+            with open(f"{static_path}/{file_name}", "rb") as f:
+                return f.read()
+
+        files = {
+            file_name: PrecompressedBody(load(file_name), media_types[os.path.splitext(file_name)[1]])
+            for file_name in asset_files
+        }
+
+        # a new version of an asset gets a new url, so the browser can cache each version forever
+        index_html = load("index.html").decode()
+        for file_name in asset_files:
+            index_html = index_html.replace(
+                f'"{file_name}"', f'"{file_name}?v={Frontend.asset_version(files[file_name])}"'
+            )
+        files["index.html"] = PrecompressedBody(index_html.encode(), media_types[".html"])
+
+        return files
+
+    @staticmethod
+    def asset_version(file: PrecompressedBody) -> str:
+        return file.etag.strip('"')[:12]
+
+    async def frontend(self, file_path: str, request: Request) -> Response:
         """
         Serve static files e.g. the frontend.
         :param file_path: Path to the file.
@@ -36,12 +76,17 @@ class Frontend:
         if file_path == "":
             file_path = "index.html"
 
-        allowed_files = ["index.html", "script.js", "styles.css"]
-
-        if file_path not in allowed_files:
+        file = self.files.get(file_path)
+        if file is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"File '{file_path}' not found.",
             )
 
-        return FileResponse(f"{static_path}/{file_path}")
+        # only a request for the current version can be cached forever, everything else must be revalidated
+        if file_path in asset_files and request.query_params.get("v") == self.asset_version(file):
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+
+        return file.response(request, {"Cache-Control": cache_control})
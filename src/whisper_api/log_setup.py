@@ -1,11 +1,16 @@
 import atexit
+import copy
 import logging
 import multiprocessing
+import multiprocessing.queues
 import os
+import queue
 import threading
+from logging.handlers import BaseRotatingHandler
+from logging.handlers import QueueHandler
 from logging.handlers import TimedRotatingFileHandler
-from multiprocessing.connection import Connection
 from typing import Literal
+from typing import Optional
 
 from whisper_api.data_models.data_types import private_uuid_hex_t
 from whisper_api.data_models.data_types import uuid_hex_t
@@ -14,19 +19,27 @@ from whisper_api.environment import LOG_FORMAT
 from whisper_api.environment import LOG_LEVEL_CONSOLE
 from whisper_api.environment import LOG_LEVEL_FILE
 from whisper_api.environment import LOG_PRIVACY_MODE
+from whisper_api.environment import LOG_QUEUE_SIZE
 from whisper_api.environment import LOG_ROTATION_BACKUP_COUNT
 from whisper_api.environment import LOG_ROTATION_INTERVAL
 from whisper_api.environment import LOG_ROTATION_WHEN
 
+"""
+Logging that never makes the logging code wait for the disk
+
+- the logger only has a DroppingQueueHandler, it puts the records into a bounded queue and returns
+- records of child processes (the decoder) go through a multiprocessing queue, pickled by its feeder thread
+- the LogListener thread in the main process takes the records out in batches, formats them with
+  one prebuilt formatter and writes each batch with a single write and flush per handler
+- when the queue is full, records below WARNING are dropped and counted instead of blocking
+"""
+
 # set logging format
 formatter_string = LOG_FORMAT
 formatter_style: Literal["%", "$", "{"] = "{"
 formatter_date_fmt = LOG_DATE_FORMAT
-formatter = logging.Formatter(formatter_string, style="{")
-# TODO why is this here AND USED? - why? can we just replace it with the normal format??
-rich_formatter = logging.Formatter(
-    "[{asctime}] [{levelname}] [{threadName}] {message}", style=formatter_style, datefmt=formatter_date_fmt
-)
+# the record keeps the name of the process it was created in, so one formatter fits the records of all processes
+formatter = logging.Formatter(formatter_string, style=formatter_style, datefmt=formatter_date_fmt)
 
 # get new logger
 logger = logging.getLogger("logger")
@@ -50,190 +63,282 @@ def uuid_log_format(uid: uuid_hex_t) -> uuid_hex_t | private_uuid_hex_t:
     return uid
 
 
-# TODO: rotating filehandler?
-class PipedFileHandler(TimedRotatingFileHandler):
-    """A logger that can be used in two processes, but only writes from MainProcess"""
-
-    def __init__(self, log_pipe: Connection, log_dir: str, log_file: str, **rotating_file_handler_kwargs):
-        if log_dir:
-            self.log_path = os.path.join(log_dir, log_file)
-        else:
-            self.log_path = log_file
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the LogListener without blocking the caller
+    It's set up in the main process and inherited by the child processes,
+    in those the records are sent through the multiprocessing queue instead.
+    """
 
-        super().__init__(self.log_path, **rotating_file_handler_kwargs)
-        self.log_pipe = log_pipe
-        self.am_I_main = multiprocessing.current_process().name == "MainProcess"
+    def __init__(
+        self, local_queue: queue.Queue, process_queue: multiprocessing.queues.Queue, block_timeout_s: float = 0.1
+    ):
+        """
+        Args:
+            local_queue: queue for records of the main process
+            process_queue: queue for records of child processes
+            block_timeout_s: max time a WARNING or above waits for space in a full queue before it's dropped too
+        """
+        super().__init__(local_queue)
+        self.process_queue = process_queue
+        self.block_timeout_s = block_timeout_s
+        self.main_pid = os.getpid()
+        # records dropped in this process since the last record that made it into the queue
+        self.dropped_records = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Make a picklable copy of the record, formatting the line is left to the listener"""
+        # other handlers of the logger get the record after this one, it must stay as it is
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        target_queue = self.queue if os.getpid() == self.main_pid else self.process_queue
+        # the listener reports the drops with the next record that gets through
+        record.dropped_records = self.dropped_records
+        try:
+            target_queue.put_nowait(record)
+            self.dropped_records = 0
+            return
+        except queue.Full:
+            pass
 
-        if multiprocessing.current_process().name == "MainProcess":
-            # start listening for logs from children
-            self.listener_thread = threading.Thread(target=self.listen_for_logs_from_children, args=(self.log_pipe,))
-            self.listener_thread.daemon = True
-            self.listener_thread.start()
-            atexit.register(self.wait_for_listener)
-            self.is_end = False
+        # the important stuff is worth a short wait
+        if record.levelno >= logging.WARNING:
+            try:
+                target_queue.put(record, timeout=self.block_timeout_s)
+                self.dropped_records = 0
+                return
+            except queue.Full:
+                pass
+
+        self.dropped_records += 1
+
+
+class LogListener:
+    """Writes the records of all processes from the queues of the DroppingQueueHandler to the actual handlers"""
+
+    def __init__(self, handlers: list[logging.Handler], queue_size: int = 10_000, max_batch_size: int = 512):
+        """
+        Args:
+            handlers: the handlers to write to, only their level and stream are used
+            queue_size: max number of records that wait for writing, per queue
+            max_batch_size: max number of records that are written at once
+        """
+        self.handlers = handlers
+        self.max_batch_size = max_batch_size
+        self.local_queue: queue.Queue[Optional[logging.LogRecord]] = queue.Queue(queue_size)
+        self.process_queue: multiprocessing.queues.Queue = multiprocessing.Queue(queue_size)
+        self.dropped_records = 0
+
+        self.__writer_thread = threading.Thread(target=self.__write_loop, name="Log-Writer-Thread", daemon=True)
+        self.__forward_thread = threading.Thread(target=self.__forward_loop, name="Log-Forward-Thread", daemon=True)
+
+    def start(self):
+        self.__writer_thread.start()
+        self.__forward_thread.start()
+
+    def stop(self):
+        """Write all records that are still queued and stop"""
+        if not self.__writer_thread.is_alive():
+            return
 
-    def wait_for_listener(self):
-        """Ensure that we wait for thread when we shall exit"""
         # well, we won't try to use the logger when waiting for logging to be finished :)
         print("Stopping listener for logger...")
-        if self.am_I_main:
-            self.is_end = True
-            print("Waiting for logger to finish writing...")
-            self.listener_thread.join()
-            print("Logger closed")
-
-    def emit(self, record: logging.LogRecord):
-        """Emit the message or send it to the main"""
-
-        # if we're in a child process, send the record to the pipe to main process
-        if not self.am_I_main:
-            self.log_pipe.send(record)
-            return
-
-        # only write from main process
-        # we need to replace the process name manually, otherwise processName is overwritten with 'MainProcess'
-        if record.processName != "MainProcess":
-            _formatter = logging.Formatter(
-                formatter_string.replace("{processName}", record.processName),
-                style=formatter_style,
-                datefmt=formatter_date_fmt,
+        self.local_queue.put(None)
+        print("Waiting for logger to finish writing...")
+        self.__writer_thread.join()
+        print("Logger closed")
+
+    def write(self, records: list[logging.LogRecord]):
+        """Format the records once and write them to each handler with one write and flush"""
+        lines = [(record.levelno, formatter.format(record)) for record in records]
+
+        if dropped_records := sum(getattr(record, "dropped_records", 0) for record in records):
+            self.dropped_records += dropped_records
+            dropped_info = logging.makeLogRecord(
+                {
+                    "name": logger.name,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"Dropped {dropped_records} log records because the log queue was full",
+                    "processName": multiprocessing.current_process().name,
+                    "threadName": threading.current_thread().name,
+                }
             )
+            lines.append((logging.WARNING, formatter.format(dropped_info)))
 
-        # just use the normal formatter for main messages
-        else:
-            _formatter = logging.Formatter(formatter_string, style=formatter_style, datefmt=formatter_date_fmt)
+        for handler in self.handlers:
+            text = "".join(line + handler.terminator for levelno, line in lines if levelno >= handler.level)
+            if not text:
+                continue
 
-        self.setFormatter(_formatter)
-        super().emit(record)
-
-    def listen_for_logs_from_children(self, pipe_to_listen_to: Connection, wait_before_exit_s: float = 1.0):
-        """Tread listening for logs from children and sending them to main process"""
+            handler.acquire()
+            try:
+                # the rollover is time based, checking it once per batch is plenty
+                if isinstance(handler, BaseRotatingHandler) and handler.shouldRollover(records[-1]):
+                    handler.doRollover()
+                handler.stream.write(text)
+                handler.flush()
+            except Exception:
+                handler.handleError(records[-1])
+            finally:
+                handler.release()
+
+    def __write_loop(self):
+        while True:
+            records = [self.local_queue.get()]
+            # whatever arrived meanwhile is written in the same go
+            while len(records) < self.max_batch_size:
+                try:
+                    records.append(self.local_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None is the signal to stop
+            is_end = None in records
+            records = [record for record in records if record is not None]
+
+            if is_end:
+                records.extend(self.__take_all(self.local_queue))
+                records.extend(self.__take_all(self.process_queue))
+
+            if records:
+                self.write(records)
+
+            if is_end:
+                return
+
+    def __forward_loop(self):
+        """Move the records of the child processes to the local queue, so they're written in the same batches"""
         while True:
             try:
-                # time out every few seconds to check if we should come to and end
-                if not pipe_to_listen_to.poll(wait_before_exit_s):
-                    # as long as logs fly in we will not terminate
-                    # we just timed out because nothing was there, if we shall stop, we can sow
-                    if self.is_end:
-                        break
-                    # no, it's not the ending, just go back to loop
-                    continue
-
-                # data! yay
-                record = pipe_to_listen_to.recv()
-                self.emit(record)
-
-            # set exit flag which wil trigger after next timeout
-            # and yes. this bare except is chosen by design
-            except:
-                self.is_end = True
+                record = self.process_queue.get()
+            # the queue is gone, e.g. on shutdown
+            except (EOFError, OSError, ValueError):
+                return
+            self.local_queue.put(record)
+
+    @staticmethod
+    def __take_all(source_queue: queue.Queue | multiprocessing.queues.Queue) -> list[logging.LogRecord]:
+        records = []
+        while True:
+            try:
+                record = source_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError, ValueError):
+                return records
+            if record is not None:
+                records.append(record)
 
 
 def configure_logging(
     _logger: logging.Logger,
     log_dir: str = "",
     log_file: str = "events.log",
-    log_pipe: Connection = None,
     console_logger_level=LOG_LEVEL_CONSOLE,
     file_logger_level=LOG_LEVEL_FILE,
     logger_base_level=logging.DEBUG,
-):
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> Optional[LogListener]:
     """
-    The function to call from the outside to configure the PipedLogger
+    The function to call from the outside to configure the logger, call it in the main process before
+    child processes are started, they use the configuration they inherit
     Args:
         _logger: The logger to configure
         log_dir: The directory to store the log file in, created if not exists (empty or None for same directory)
         log_file: The name of the log file (default: events.log)
-        log_pipe: The pipe to send logs to the main process (if set file-logging will be done using the pipe handler)
         console_logger_level: The level to log to console (None for no console logging)
-        file_logger_level: The level to log to file (None for no file logging, even if pipe is set)
+        file_logger_level: The level to log to file (None for no file logging)
         logger_base_level: The base level of the logger (everything below will be discarded, recommended: DEBUG)
+        queue_size: The max number of records that wait for being written before new ones are dropped
+    Returns:
+        The listener that writes the logs, None if no logging is configured at all
     """
     # path for databases or config files
     if log_dir and not os.path.exists(log_dir):
         os.mkdir(log_dir)
 
-    _logger.setLevel(logger_base_level)
-
-    if log_pipe and file_logger_level:
-        pipe_logger = PipedFileHandler(
-            log_pipe,
-            log_dir,
-            log_file,
+    handlers: list[logging.Handler] = []
+    if file_logger_level:
+        file_logger = TimedRotatingFileHandler(
+            os.path.join(log_dir, log_file) if log_dir else log_file,
             when=LOG_ROTATION_WHEN,
             interval=LOG_ROTATION_INTERVAL,
             backupCount=LOG_ROTATION_BACKUP_COUNT,
         )
-        pipe_logger.setLevel(file_logger_level)
-        pipe_logger.setFormatter(rich_formatter)
-        _logger.addHandler(pipe_logger)
-
-    elif file_logger_level:
-        file_logger = logging.FileHandler(f"{log_dir}/{log_file}" if log_dir else log_file)
         file_logger.setLevel(file_logger_level)
-        file_logger.setFormatter(formatter)
-        _logger.addHandler(file_logger)
+        handlers.append(file_logger)
 
     if console_logger_level:
         # logger for console prints
         console_logger = logging.StreamHandler()
         console_logger.setLevel(console_logger_level)
-        console_logger.setFormatter(formatter)
-        _logger.addHandler(console_logger)
+        handlers.append(console_logger)
 
+    if not handlers:
+        _logger.setLevel(logger_base_level)
+        return None
 
-if __name__ == "__main__":
-    # small test
-    import logging
-    import multiprocessing
-    import os
-    import time
-    from multiprocessing import Pipe
-    from multiprocessing import Process
+    listener = LogListener(handlers, queue_size)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queue_handler = DroppingQueueHandler(listener.local_queue, listener.process_queue)
+    queue_handler.setLevel(min(handler.level for handler in handlers))
+    _logger.addHandler(queue_handler)
+    # calls below the level of all handlers return right away, without even creating a record
+    _logger.setLevel(max(logger_base_level, queue_handler.level))
 
-    _log_pipe, _child_pipe = Pipe()
+    return listener
 
-    # Create a temporary file for the log output
-    log_file_path = "log_file_dummy.log"
-    open(log_file_path, "w").close()
 
-    # Create a logger and add the PipedFileHandler to it
-    # logger = logging.getLogger()
-    # logger.setLevel(logging.DEBUG)
-    # logger.addHandler(PipedFileHandler(_log_pipe, log_file_path))
-    configure_logging(logger, "", log_file_path, _log_pipe)
+if __name__ == "__main__":
+    # micro benchmark: time the logging call costs the caller, old handler vs. the queue pipeline
+    import tempfile
+    import time
 
-    # Define a function to be run by the child process
-    def child_function():
-        time.sleep(1.5)
-        logger.info("This is a log message from the child process")
+    n_records = 20_000
+    bench_dir = tempfile.mkdtemp()
 
-    # Spawn a child process and wait for it to finish
-    process = Process(target=child_function)
-    process.start()
+    def log_n(_logger: logging.Logger) -> float:
+        start = time.perf_counter()
+        for i in range(n_records):
+            _logger.info(f"Now processing task '{uuid_log_format('0123456789abcdef0123456789abcdef')}' {i}")
+        return (time.perf_counter() - start) / n_records * 1e6
 
-    logger.info("This is a test message")
-    process.join()
+    class OldFileHandler(logging.FileHandler):
+        """What the handler did before: a new formatter per record, a write and flush per record"""
 
-    time.sleep(2)  # wait for the message to be processed
+        def emit(self, record: logging.LogRecord):
+            self.setFormatter(logging.Formatter(formatter_string, style=formatter_style, datefmt=formatter_date_fmt))
+            super().emit(record)
 
-    # Read the log file and check that the log message from the child process is present
-    with open(log_file_path) as _log_file:
-        log_contents = _log_file.read()
-        assert "This is a log message from the child process" in log_contents
+    old_logger = logging.getLogger("bench_old")
+    old_logger.setLevel(logging.DEBUG)
+    old_logger.addHandler(OldFileHandler(os.path.join(bench_dir, "old.log")))
+    print(f"old handler:              {log_n(old_logger):6.2f}µs per record in the caller")
 
-    # Send a log message through the pipe and check that it is present in the log file
-    _log_pipe.send(
-        logging.LogRecord("test_logger", logging.INFO, "test_logger", 0, "This is a test message", None, None)
+    new_logger = logging.getLogger("bench_new")
+    bench_listener = configure_logging(
+        new_logger, bench_dir, "new.log", console_logger_level=None, queue_size=2 * n_records
     )
-    time.sleep(1)  # wait for the message to be processed
-    with open(log_file_path) as _log_file:
-        log_contents = _log_file.read()
-        assert "This is a test message" in log_contents
-        print(f"{log_contents=}")
+    print(f"queue pipeline:           {log_n(new_logger):6.2f}µs per record in the caller")
+
+    def child():
+        print(f"queue pipeline (child):   {log_n(new_logger):6.2f}µs per record in the caller")
 
-    # Clean up
-    # os.remove(log_file_path)
-    print("Done")
+    child_process = multiprocessing.Process(target=child)
+    child_process.start()
+    child_process.join()
 
-    exit()
+    start_stop = time.perf_counter()
+    bench_listener.stop()
+    with open(os.path.join(bench_dir, "new.log")) as f:
+        n_lines = sum(1 for _ in f)
+    print(f"listener wrote {n_lines} lines, {bench_listener.dropped_records} dropped")
+    print(f"time to write the backlog on stop: {(time.perf_counter() - start_stop) * 1e3:.0f}ms")
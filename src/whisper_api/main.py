@@ -1,14 +1,13 @@
+import asyncio
 import datetime as dt
 import multiprocessing
 import os
-import random
 import signal
-import string
 import sys
-import threading
 import time
 from contextlib import asynccontextmanager
 from tempfile import NamedTemporaryFile
+from tempfile import mkdtemp
 from types import FrameType
 from typing import Any
 from typing import Callable
@@ -26,26 +25,47 @@ if __package__ is None and not hasattr(sys, "frozen"):
 
 import whisper_api.decoding.decoder as decoder
 from whisper_api import __version__
+from whisper_api.access_log import AccessLog
+from whisper_api.admission import AdmissionController
+from whisper_api.admission import AdmissionMiddleware
 from whisper_api.api_endpoints.endpoints import EndPoints
+from whisper_api.change_notifier import ChangeNotifier
+from whisper_api.coalescing import SubmissionCoalescer
+from whisper_api.compression import CompressionMiddleware
 from whisper_api.data_models.data_types import named_temp_file_name_t
 from whisper_api.data_models.data_types import uuid_hex_t
 from whisper_api.data_models.decoder_state import DecoderState
+from whisper_api.data_models.job_group import JobGroup
 from whisper_api.data_models.task import Task
+from whisper_api.data_models.task_spill import TaskSpill
+from whisper_api.data_models.task_store import StoreBackedTempDict
+from whisper_api.data_models.task_store import TaskStore
 from whisper_api.data_models.temp_dict import TempDict
+from whisper_api.environment import ACCESS_LOG_SAMPLE_RATES
+from whisper_api.environment import ACCESS_LOG_SLOW_MS
+from whisper_api.environment import ACCESS_LOG_SUMMARY_INTERVAL_S
 from whisper_api.environment import API_LISTEN
 from whisper_api.environment import API_PORT
+from whisper_api.environment import COMPRESSION_MIN_BYTES
 from whisper_api.environment import DELETE_RESULTS_AFTER_M
 from whisper_api.environment import LOG_DIR
 from whisper_api.environment import LOG_FILE
 from whisper_api.environment import MAX_MODEL
+from whisper_api.environment import MAX_QUEUED_AUDIO_S
+from whisper_api.environment import MAX_TASK_QUEUE_SIZE
 from whisper_api.environment import REFRESH_EXPIRATION_TIME_ON_USAGE
 from whisper_api.environment import RUN_RESULT_EXPIRY_CHECK_M
+from whisper_api.environment import TASK_CACHE_MAX_MB
+from whisper_api.environment import TASK_SPILL_DIR
+from whisper_api.environment import TASK_STORE_DIR
 from whisper_api.environment import UNLOAD_MODEL_AFTER_S
 from whisper_api.environment import USE_GPU_IF_AVAILABLE
 from whisper_api.frontend.endpoints import Frontend
 from whisper_api.log_setup import configure_logging
 from whisper_api.log_setup import logger
 from whisper_api.log_setup import uuid_log_format
+from whisper_api.pipe_protocol import BatchingSender
+from whisper_api.pipe_protocol import recv_messages
 
 IS_MAIN_PROCESS = multiprocessing.current_process().name == "MainProcess"
 
@@ -61,26 +81,64 @@ if IS_MAIN_PROCESS:
 init global variables
 """
 if IS_MAIN_PROCESS:
-    # TODO: can tasks get GCed before they finish if queue is too long?
-    task_dict: TempDict[uuid_hex_t, Task] = TempDict(
+    task_dict_kwargs = dict(
         expiration_time_m=DELETE_RESULTS_AFTER_M,
         refresh_expiration_time_on_usage=REFRESH_EXPIRATION_TIME_ON_USAGE,
         auto_gc_interval_s=RUN_RESULT_EXPIRY_CHECK_M * 60,
+        max_size_bytes=TASK_CACHE_MAX_MB * 1024**2 or None,
+        size_estimator=lambda task: task.estimated_size_bytes,
+        # the decoder reports on unfinished tasks, they stay in memory so its updates never wait for the disk
+        is_evictable=lambda task: task.status not in ["pending", "processing"],
     )
 
+    # persist tasks to disk if a directory is given, the TempDict is then just the hot cache in front of it
+    task_store: Optional[TaskStore] = None
+    audio_spool_dir: Optional[str] = None
+    if TASK_STORE_DIR:
+        audio_spool_dir = os.path.join(TASK_STORE_DIR, "spool")
+        os.makedirs(audio_spool_dir, exist_ok=True)
+        task_store = TaskStore(os.path.join(TASK_STORE_DIR, "tasks.sqlite3"), expiration_time_m=DELETE_RESULTS_AFTER_M)
+        task_dict: TempDict[uuid_hex_t, Task] = StoreBackedTempDict(task_store, **task_dict_kwargs)
+    # tasks that don't fit the memory budget are moved to a compressed on-disk tier instead of being dropped
+    elif TASK_CACHE_MAX_MB:
+        task_spill = TaskSpill(TASK_SPILL_DIR or mkdtemp(prefix="whisper_api_spill_"), DELETE_RESULTS_AFTER_M)
+        task_dict: TempDict[uuid_hex_t, Task] = StoreBackedTempDict(task_spill, write_through=False, **task_dict_kwargs)
+    else:
+        # TODO: can tasks get GCed before they finish if queue is too long?
+        task_dict: TempDict[uuid_hex_t, Task] = TempDict(**task_dict_kwargs)
+
     open_audio_files_dict: dict[named_temp_file_name_t, NamedTemporaryFile] = dict()
 
+    # groups of tasks that were submitted in one batch, they only reference the tasks and live as long as them
+    job_groups_dict: TempDict[uuid_hex_t, JobGroup] = TempDict(
+        expiration_time_m=DELETE_RESULTS_AFTER_M,
+        refresh_expiration_time_on_usage=REFRESH_EXPIRATION_TIME_ON_USAGE,
+        auto_gc_interval_s=RUN_RESULT_EXPIRY_CHECK_M * 60,
+    )
+
     decoder_state = DecoderState()
 
+    # wakes up long polling status requests, all changes are applied on the event loop so no locking needed
+    # the versions are based on the time so they keep increasing over restarts when tasks are persisted
+    task_notifier: ChangeNotifier[uuid_hex_t] = ChangeNotifier(first_version=time.time_ns() // 1000)
+
+    # knows the queue depth and the queued audio without asking the decoder, refuses new tasks when saturated
+    admission = AdmissionController(MAX_TASK_QUEUE_SIZE, MAX_QUEUED_AUDIO_S)
+
+    # identical submissions in flight are decoded once, the others follow the decoded task
+    coalescer = SubmissionCoalescer()
+
     """
     Setup decoder process
     """
 
     # create Pipe for communication between main and worker thread
     parent_side, child_side = multiprocessing.Pipe()
-    logging_entry_end, log_outry_end = multiprocessing.Pipe()
+    # batches messages to the decoder that are sent in quick succession
+    decoder_sender = BatchingSender(parent_side)
 
-    configure_logging(logger, LOG_DIR, LOG_FILE, logging_entry_end)
+    # must happen before the decoder is forked, it inherits the queue to send its records to
+    configure_logging(logger, LOG_DIR, LOG_FILE)
 
 
 def handle_message(message_type: str, data: dict[str, Any]):
@@ -91,12 +149,21 @@ def handle_message(message_type: str, data: dict[str, Any]):
         data: the data that was sent with the message, must match the type of the message
     """
     if message_type == "status":
-        # create uuid safe copy for log
-        log_data = data.copy()
-        log_data["queue_status"] = {uuid_log_format(k): v for k, v in data["queue_status"].items()}
-        logger.info(f"Received status update: {log_data=}")
+        # updates are only applied in order
+        if decoder_state.version is not None and data["version"] <= decoder_state.version:
+            logger.warning(f"Dropping outdated status update {data['version']=}, {decoder_state.version=}")
+            return
+
+        new_queue_tickets: dict[uuid_hex_t, int] = data["new_queue_tickets"]
+        logger.info(
+            f"Received status update: version={data['version']}, tasks_in_queue={data['tasks_in_queue']}, "
+            f"dequeued_tasks={data['dequeued_tasks']}, new_queue_tickets={len(new_queue_tickets)}, "
+            f"currently_busy={data['currently_busy']}, is_model_loaded={data['is_model_loaded']}"
+        )
 
         # do the actual processing
+        queue_moved = data["dequeued_tasks"] != decoder_state.dequeued_tasks
+        decoder_state.version = data["version"]
         decoder_state.gpu_mode = data["gpu_mode"]
         decoder_state.max_model_to_use = data["max_model_to_use"]
         decoder_state.last_loaded_model_size = data["last_loaded_model_size"]
@@ -104,81 +171,161 @@ def handle_message(message_type: str, data: dict[str, Any]):
         decoder_state.currently_busy = data["currently_busy"]
         # might not be always present in future development
         decoder_state.tasks_in_queue = data.get("tasks_in_queue")
+        decoder_state.dequeued_tasks = data["dequeued_tasks"]
         decoder_state.received_at = dt.datetime.now()
 
-        # check if new position data arrived else continue
-        if (queue_status := data.get("queue_status")) is None:
-            return
+        # only newly queued tasks need an update, positions of all others follow from dequeued_tasks
+        for key, queue_ticket in new_queue_tickets.items():
+            for task_id in [key, *coalescer.followers_of(key)]:
+                if (task := task_dict.get(task_id, None)) is not None:
+                    task.queue_ticket = queue_ticket
+                    task.change_seq = task_notifier.notify(task_id)
+                    # set it again, the task store only gets the changes that go through the dict
+                    task_dict[task_id] = task
 
-        # refresh positions if new position-data is received
-        for key, pos in queue_status.items():
-            task_dict[key].position_in_queue = pos
+        # the position of every queued task changed, long polls of pending tasks are woken
+        if queue_moved:
+            task_notifier.notify_all()
 
         return
 
-    if message_type == "task_update":  # data is a json-serialized task
-        task: Task = Task.from_json(data)
+    if message_type == "task_update":  # data is a task
+        task: Task = data
         logger.info(
             f"Received task update for task.uuid={uuid_log_format(task.uuid)}, {task.status=}, {task.position_in_queue=}"
         )
 
+        decoder_done = task.status in ["finished", "failed", "cancelled"]
+
+        # tasks that were submitted with identical audio get the state of the decoded task
+        for follower_id in coalescer.followers_of(task.uuid):
+            if (follower := task_dict.get(follower_id, None)) is not None:
+                coalescer.mirror(task, follower)
+                follower.change_seq = task_notifier.notify(follower_id)
+                task_dict[follower_id] = follower
+
+        # a task that was cancelled stays cancelled, even if the decoder finished it before it got the message
+        known_task = task_dict.get(task.uuid, None)
+        if known_task is not None and known_task.status == "cancelled":
+            task.status = "cancelled"
+            task.whisper_result = None
+
+        # the decode is accounted with the status the API reports for the task it's done for,
+        # that is a follower if the leader was cancelled
+        carrier_id = coalescer.carrier_of(task.uuid)
+        admission.update(task if carrier_id == task.uuid else task_dict.get(carrier_id, task))
+        if decoder_done:
+            coalescer.done(task.uuid)
+
+        task.change_seq = task_notifier.notify(task.uuid)
         task_dict[task.uuid] = task
 
-        # when task is done (no matter if finished or failed) close and delete the audio file
-        if task.status == "finished" or task.status == "failed":
-            open_audio_files_dict[task.audiofile_name].close()
-            del open_audio_files_dict[task.audiofile_name]
+        # when the decoder is done with the task (finished, failed or cancelled) close and delete the audio file
+        # files that were ingested in place are not ours, they're left untouched
+        if decoder_done and task.owns_audiofile:
+            if (named_file := open_audio_files_dict.pop(task.audiofile_name, None)) is not None:
+                named_file.close()
+            # files in the spool dir of the task store are not deleted on close, they shall survive restarts
+            if os.path.exists(task.audiofile_name):
+                os.remove(task.audiofile_name)
+
+
+def restore_unfinished_tasks():
+    """Re-enqueue all tasks from the task store that were not done before the last shutdown"""
+    if task_store is None:
+        return
 
+    unfinished_tasks = task_store.load_unfinished()
+    logger.info(f"Restoring {len(unfinished_tasks)} unfinished tasks from task store")
+
+    # in the order of submission, so identical tasks follow the first of them again
+    for task in sorted(unfinished_tasks, key=lambda task: task.time_uploaded):
+        # the tickets of the old decoder mean nothing to the new one, it issues new ones when the task is queued
+        task.position_in_queue = None
+        task.queue_ticket = None
+
+        # nothing to decode without the audio file
+        if not os.path.exists(task.audiofile_name):
+            logger.warning(f"Audio file of task {uuid_log_format(task.uuid)} is gone, marking task as failed")
+            task.status = "failed"
+            task.change_seq = task_notifier.notify(task.uuid)
+            task_dict[task.uuid] = task
+            continue
+
+        # the decoder might have been in the middle of this task, it starts all over again
+        task.status = "pending"
+
+        if (leader_id := coalescer.leader_for(task)) is not None:
+            coalescer.follow(leader_id, task)
+            task.change_seq = task_notifier.notify(task.uuid)
+            task_dict[task.uuid] = task
+            continue
+
+        task.follows = None
+        if task.owns_audiofile:
+            open_audio_files_dict[task.audiofile_name] = open(task.audiofile_name, "rb")
+        task.change_seq = task_notifier.notify(task.uuid)
+        task_dict[task.uuid] = task
+        # language detections bypass the queue
+        if task.task_type == "detect_language":
+            decoder_sender.send("detect_language", task)
+            continue
 
-def listen_to_decoder(pipe_to_listen_to: multiprocessing.connection.Connection, worker_exit_fn: Callable[[int], None]):
-    """listen to decode process and update the task_dict accordingly"""
+        admission.update(task)
+        coalescer.lead(task)
+        decoder_sender.send("decode", task)
 
-    def handle_keyboard_interrupt():
-        logger.info("KeyboardInterrupt - initiating exit.")
-        worker_exit_fn(signal.SIGINT)
 
-    while True:
-        try:
-            if pipe_to_listen_to.poll(0.5):
-                msg = pipe_to_listen_to.recv()
-            # no messages left and stop threads is set
-            elif _stop_threads:
-                pipe_to_listen_to.close()
-                logger.info(f"Flag to stop listener-thread is set. Ending thread.")
-                return
-            else:
+def receive_from_decoder(pipe_to_listen_to: multiprocessing.connection.Connection) -> bool:
+    """
+    Handle all messages from the decoder process that are ready to be read, never blocks waiting for new ones
+    Returns:
+        False if the pipe is closed, True otherwise
+    """
+    try:
+        while pipe_to_listen_to.poll(0):
+            try:
+                # messages that were sent in quick succession arrive as one batch
+                messages = recv_messages(pipe_to_listen_to)
+            except ValueError as e:
+                logger.error(f"Could not decode messages from decoder: {e}")
                 continue
 
-        # TODO: is this even a case that can happen?
-        #  pretty unsure since the function was flawed for a long time and should have produces a crash...
-        except KeyboardInterrupt:
-            handle_keyboard_interrupt()
-            return
+            for message_type, data in messages:
+                try:
+                    handle_message(message_type, data)
 
-        # EOF is what happens when the pipe gets closed, so we use it to shut down the pipe
-        # when the pipe is shut down we don't need that thread - obviously
-        except EOFError:
-            logger.info(f"Pipe closed (EOFError). Exiting thread.")
-            return
+                except Exception as e:
+                    # I'd love to print the full data, but that would potentially log the transcriptions, so not an option.
+                    logger.error(
+                        f"Exception '{type(e).__name__}': {e}, message_type={message_type!r}, data={type(data).__name__}"
+                    )
 
-        message_type = msg.get("type", None)
-        data = msg.get("data", None)
+    # EOF is what happens when the pipe gets closed, so we use it to shut down the listener
+    except (EOFError, OSError):
+        return False
 
-        try:
-            handle_message(message_type, data)
+    return True
+
+
+def listen_to_decoder(pipe_to_listen_to: multiprocessing.connection.Connection, loop: asyncio.AbstractEventLoop):
+    """
+    listen to decode process and update the task_dict accordingly
+    The pipe is registered on the event loop, so messages are handled on the loop as soon as they arrive.
+    There is no polling interval and no other thread touches the task_dict or the decoder_state.
+    """
+    pipe_fd = pipe_to_listen_to.fileno()
 
-        except KeyboardInterrupt:
-            handle_keyboard_interrupt()
+    def on_readable():
+        if not receive_from_decoder(pipe_to_listen_to):
+            logger.info(f"Pipe closed (EOFError). Removing listener from event loop.")
+            loop.remove_reader(pipe_fd)
 
-        except Exception as e:
-            # I'd love to print the full data, but that would potentially log the transcriptions, so not an option.
-            logger.error(
-                f"Exception '{type(e).__name__}': {e}, message_type={message_type!r}, data.keys()={list(data.keys())}"
-            )
+    loop.add_reader(pipe_fd, on_readable)
 
 
 """
-Dispatch decoder process and listener thread
+Dispatch decoder process and listener
 """
 
 
@@ -186,19 +333,17 @@ Dispatch decoder process and listener thread
 # otherwise we get this beautiful RuntimeError:
 # 'An attempt has been made to start a new process before the
 # current process has finished its bootstrapping phase'
-_stop_threads = False  # i hate this, but python doesn't offer any good way to kill a thread
-
-
-def setup_decoder_process_and_listener_thread() -> Callable[[int], None]:
+def setup_decoder_process_and_listener() -> Callable[[int], None]:
     """
-    Handles the whole multiprocessing and threading stuff to get:
+    Handles the whole multiprocessing stuff to get:
     - a decoder process
-    - a listener thread for the pipe to the decoder process
+    - a listener on the event loop for the pipe to the decoder process
+    This must be called from within the running event loop.
     """
+    loop = asyncio.get_running_loop()
 
     def exit_fn(signum: int):
         """Terminate child and hope it dies"""
-        global _stop_threads
         logger.warning(f"Got {signum=}")
 
         pid = decoder_process.pid
@@ -220,17 +365,17 @@ def setup_decoder_process_and_listener_thread() -> Callable[[int], None]:
         else:
             logger.info("Child is dead.")
 
-        # don't know if the part below here really brings anything valuable to the table
-        # I assume it might because we give the thread the time to receive all messages before shutdown
+        # the child is gone, so we can read everything it sent before its death and close the pipe
+        logger.info(f"Shutting down listener...")
+        if not parent_side.closed:
+            loop.remove_reader(parent_side.fileno())
+            receive_from_decoder(parent_side)
+            parent_side.close()
+        logger.info(f"Listener removed successfully")
 
-        logger.info(f"Shutting down listener thread...")
-        _stop_threads = True
-        decoder_process_listen_thread.join(5)  # this should be more than enough time to empty message queue
-        # faulthandler.dump_traceback_later(10, exit=True, file=sys.stdout)
-        if decoder_process_listen_thread.is_alive():
-            logger.warning(f"Can't shutdown listener gracefully, proceeding with shutdown")
-        else:
-            logger.info(f"Listener thread killed successfully")
+        if task_store is not None:
+            logger.info(f"Writing remaining changes to task store...")
+            task_store.close()
 
         # at this point are still at least three threads going
         # - the gc thread in the task queue (daemon)
@@ -258,17 +403,16 @@ def setup_decoder_process_and_listener_thread() -> Callable[[int], None]:
     decoder_process.start()
     logger.info("Decoder process stared")
 
+    restore_unfinished_tasks()
+
     # register handlers that signal decoder process to stop
     signal.signal(signal.SIGINT, signal_worker_to_exit)  # Handle Control + C
     signal.signal(signal.SIGTERM, signal_worker_to_exit)  # Handle 'kill' command
     signal.signal(signal.SIGHUP, signal_worker_to_exit)  # Handle terminal closure
 
-    # start thread to listen to decoder process pipe
-    decoder_process_listen_thread = threading.Thread(
-        target=listen_to_decoder, args=(parent_side, exit_fn), name="Decoder-Listen-Thread", daemon=True
-    )
-    decoder_process_listen_thread.start()
-    logger.info("Listener for decoder process started")
+    # listen to decoder process pipe
+    listen_to_decoder(parent_side, loop)
+    logger.info("Listener for decoder process registered on event loop")
     logger.info("Startup ")
 
     return exit_fn
@@ -276,8 +420,10 @@ def setup_decoder_process_and_listener_thread() -> Callable[[int], None]:
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    exit_fn = setup_decoder_process_and_listener_thread()
+    exit_fn = setup_decoder_process_and_listener()
     yield
+    # the summaries of the last interval would be lost otherwise
+    access_log.log_summaries(force=True)
     exit_fn(signal.SIGTERM)  # just larping as a kill signal
 
 
@@ -309,9 +455,34 @@ if IS_MAIN_PROCESS:
         allow_headers=["*"],
     )
 
-    api_end_points = EndPoints(app, task_dict, decoder_state, open_audio_files_dict, parent_side)
+    if COMPRESSION_MIN_BYTES:
+        app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+    api_end_points = EndPoints(
+        app,
+        task_dict,
+        decoder_state,
+        open_audio_files_dict,
+        decoder_sender,
+        audio_spool_dir,
+        task_notifier,
+        job_groups_dict,
+        admission,
+        coalescer,
+    )
     frontend = Frontend(app)
 
+    # refuse uploads while the queue is full before their body is read, the endpoints check again with the duration
+    app.add_middleware(AdmissionMiddleware, admission=admission, paths=EndPoints.submission_paths)
+
+    # status polls are most of the requests, they're sampled and summarized instead of logging each of them
+    access_log = AccessLog(
+        logger.getChild("access"),
+        ACCESS_LOG_SAMPLE_RATES,
+        ACCESS_LOG_SLOW_MS,
+        ACCESS_LOG_SUMMARY_INTERVAL_S,
+    )
+
     # credit: https://philstories.medium.com/fastapi-logging-f6237b84ea64
     @app.middleware("http")
     async def log_requests(req: Request, call_next):
@@ -320,27 +491,30 @@ if IS_MAIN_PROCESS:
         Not logging any data from the request/ response body, as it might contain sensitive data.
         """
 
-        idem = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        req_base_str = f'"{req.method} {req.url.path}", rid={idem}'
-        origin = f"{req.client.host}:{req.client.port}"
-
-        # logger.info(f'{req_base_str}, q_params={req.query_params or dict()}')
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         resp: Response = await call_next(req)
 
-        process_time = (time.time() - start_time) * 1000
+        process_time = (time.perf_counter() - start_time) * 1000
 
-        # build query parameter string
-        query_params = ""
-        if req.query_params:
-            query_params = "?" + "&".join(
-                f"{k}={v if k != 'task_id' else uuid_log_format(v)}" for k, v in req.query_params.items()
-            )
+        def details() -> dict[str, Any]:
+            """only built for the requests that are actually logged"""
+            return {
+                "client": f"{req.client.host}:{req.client.port}" if req.client else None,
+                "method": req.method,
+                "path": req.url.path,
+                "query": {k: v if k != "task_id" else uuid_log_format(v) for k, v in req.query_params.items()},
+                "http_version": req.scope["http_version"],
+            }
 
-        logger.info(
-            f'{origin} - "{req.method} {req.url.path}{query_params} HTTP/{req.scope['http_version']}" '
-            f"{resp.status_code}, completed in: {process_time:.2f}ms"
+        # long polling requests are meant to take their time
+        try:
+            expected_wait_ms = float(req.query_params.get("wait", 0)) * 1000
+        except ValueError:
+            expected_wait_ms = 0
+
+        access_log.record(
+            AccessLog.route_of(req.scope) or "<unmatched>", resp.status_code, process_time, details, expected_wait_ms
         )
 
         return resp
@@ -0,0 +1,244 @@
+import datetime as dt
+import marshal
+import threading
+import time
+import types
+import typing
+from multiprocessing.connection import Connection
+from typing import Any
+
+from pydantic import BaseModel
+
+from whisper_api.data_models.task import Task
+from whisper_api.data_models.task import WhisperResult
+
+"""
+Binary protocol for the pipe between the API and the decoder process
+
+A frame is one version byte followed by a marshal-dumped list of (message_type, data) tuples.
+- marshal is way faster and more compact than pickle for plain builtin types,
+  both sides run the same interpreter, so its version specific format is no problem
+- models are sent as plain tuples of their field values in declaration order
+  and are rebuilt using model_construct(), which skips the validation (they were valid on the sending side)
+- small messages that are sent within a few milliseconds are batched into one frame
+"""
+
+PROTOCOL_VERSION = 1
+
+wire_model_t = tuple
+message_t = tuple[str, Any]
+
+
+def _is_datetime_annotation(annotation: Any) -> bool:
+    """True for dt.datetime and optional variants of it"""
+    if annotation is dt.datetime:
+        return True
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        return dt.datetime in typing.get_args(annotation)
+    return False
+
+
+class ModelCodec:
+    """Converts a pydantic model to a tuple of builtins and back, nested models need a codec for their field"""
+
+    def __init__(self, model_cls: type[BaseModel], nested_codecs: dict[str, "ModelCodec"] = None):
+        self.model_cls = model_cls
+        self.fields = tuple(model_cls.model_fields)
+        nested_codecs = nested_codecs or {}
+        # only the few fields that need a conversion are touched, addressed by their index
+        self.datetime_indices = [
+            i for i, field in enumerate(model_cls.model_fields.values()) if _is_datetime_annotation(field.annotation)
+        ]
+        self.nested_codecs = [(self.fields.index(name), codec) for name, codec in nested_codecs.items()]
+
+    def encode(self, model: BaseModel) -> wire_model_t:
+        # pydantic keeps the field values in declaration order in __dict__
+        values = list(model.__dict__.values())
+        for i in self.datetime_indices:
+            if (value := values[i]) is not None:
+                # a tuple of ints keeps the exact (naive) datetime, unlike a timestamp
+                values[i] = (
+                    value.year,
+                    value.month,
+                    value.day,
+                    value.hour,
+                    value.minute,
+                    value.second,
+                    value.microsecond,
+                )
+        for i, codec in self.nested_codecs:
+            if values[i] is not None:
+                values[i] = codec.encode(values[i])
+
+        return tuple(values)
+
+    def decode(self, values: wire_model_t) -> BaseModel:
+        if len(values) != len(self.fields):
+            raise ValueError(f"Expected {len(self.fields)} fields for {self.model_cls.__name__}, got {len(values)}")
+
+        values = list(values)
+        for i in self.datetime_indices:
+            if values[i] is not None:
+                values[i] = dt.datetime(*values[i])
+        for i, codec in self.nested_codecs:
+            if values[i] is not None:
+                values[i] = codec.decode(values[i])
+
+        # this is what model_construct() does, minus its handling of defaults and aliases that we don't need
+        # since all fields are always sent, it's several times faster
+        model = self.model_cls.__new__(self.model_cls)
+        object.__setattr__(model, "__dict__", dict(zip(self.fields, values)))
+        object.__setattr__(model, "__pydantic_fields_set__", set(self.fields))
+        object.__setattr__(model, "__pydantic_extra__", None)
+        object.__setattr__(model, "__pydantic_private__", None)
+        return model
+
+
+task_codec = ModelCodec(Task, nested_codecs={"whisper_result": ModelCodec(WhisperResult)})
+
+# message types whose data is a task or a list of tasks, all others must consist of builtins only
+task_message_types = {"decode", "detect_language", "task_update"}
+task_list_message_types = {"decode_batch"}
+
+
+def to_wire(message_type: str, data: Any) -> message_t:
+    """Convert a message to builtins only, this is a snapshot of the data at the time of the call"""
+    if message_type in task_message_types:
+        return message_type, task_codec.encode(data)
+    if message_type in task_list_message_types:
+        return message_type, [task_codec.encode(task) for task in data]
+    return message_type, data
+
+
+def from_wire(message_type: str, data: Any) -> message_t:
+    """Rebuild the objects of a message that was converted by to_wire()"""
+    if message_type in task_message_types:
+        return message_type, task_codec.decode(data)
+    if message_type in task_list_message_types:
+        return message_type, [task_codec.decode(task) for task in data]
+    return message_type, data
+
+
+def encode_messages(messages: list[message_t]) -> bytes:
+    """Encode a batch of messages into one frame"""
+    return encode_wire_messages([to_wire(message_type, data) for message_type, data in messages])
+
+
+def encode_wire_messages(wire_messages: list[message_t]) -> bytes:
+    """Encode a batch of messages that were already converted by to_wire() into one frame"""
+    return bytes((PROTOCOL_VERSION,)) + marshal.dumps(wire_messages)
+
+
+def decode_messages(frame: bytes) -> list[message_t]:
+    """Decode a frame into its batch of messages"""
+    if not frame or frame[0] != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported pipe protocol version: {frame[:1]!r}, expected {PROTOCOL_VERSION}")
+
+    return [from_wire(message_type, data) for message_type, data in marshal.loads(frame[1:])]
+
+
+def recv_messages(conn: Connection) -> list[message_t]:
+    """Receive the next batch of messages, raises EOFError when the pipe was closed"""
+    return decode_messages(conn.recv_bytes())
+
+
+class BatchingSender:
+    """
+    Threadsafe sender for a Connection
+    Messages are collected for max_delay_s and then sent together as one frame.
+    """
+
+    def __init__(self, conn: Connection, max_delay_s: float = 0.002, max_batch_size: int = 64):
+        """
+        Args:
+            conn: the connection to send to
+            max_delay_s: max time a message waits for others to be batched with
+            max_batch_size: number of messages that are sent right away without waiting for the delay
+        """
+        self.conn = conn
+        self.max_delay_s = max_delay_s
+        self.max_batch_size = max_batch_size
+
+        self.__buffer: list[message_t] = []
+        self.__buffer_condition = threading.Condition()
+        # sending must be serialized too, otherwise frames of two threads could interleave
+        self.__send_lock = threading.Lock()
+
+        self.__flush_thread = threading.Thread(target=self.__flush_loop, name="Pipe-Batching-Thread", daemon=True)
+        self.__flush_thread.start()
+
+    def send(self, message_type: str, data: Any = None):
+        """Queue a message, it's sent within max_delay_s (changes to data after this call are not sent)"""
+        wire_message = to_wire(message_type, data)
+        with self.__buffer_condition:
+            self.__buffer.append(wire_message)
+            buffer_size = len(self.__buffer)
+            if buffer_size == 1:
+                self.__buffer_condition.notify()
+
+        if buffer_size >= self.max_batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send all queued messages right now"""
+        with self.__send_lock:
+            with self.__buffer_condition:
+                messages = self.__buffer
+                self.__buffer = []
+
+            if messages:
+                self.conn.send_bytes(encode_wire_messages(messages))
+
+    def __flush_loop(self):
+        while True:
+            with self.__buffer_condition:
+                while not self.__buffer:
+                    self.__buffer_condition.wait()
+
+            # wait for more messages to join the batch
+            time.sleep(self.max_delay_s)
+            try:
+                self.flush()
+            # the other side is gone, there is nobody to send to anymore
+            except (BrokenPipeError, OSError):
+                return
+
+
+if __name__ == "__main__":
+    import pickle
+
+    # micro benchmark: old pickle dict + validation per message vs. batched binary frames
+    task = Task(audiofile_name="/tmp/audio.ogg", task_type="transcribe", source_language="en")
+    status = {"version": 1, "gpu_mode": True, "tasks_in_queue": 3, "dequeued_tasks": 7, "new_queue_tickets": {}}
+    messages: list[message_t] = [("task_update", task), ("status", status)] * 5_000
+    batch_size = 32
+
+    def bench(name: str, fn):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        n_bytes = fn()
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        print(
+            f"{name:<16} {len(messages) / wall:>10.0f} msg/s, {cpu / len(messages) * 1e6:6.2f}µs CPU/msg, "
+            f"{n_bytes / len(messages):6.1f} bytes/msg"
+        )
+
+    def old_protocol() -> int:
+        n_bytes = 0
+        for message_type, data in messages:
+            raw = pickle.dumps({"type": message_type, "data": data.to_json if message_type == "task_update" else data})
+            n_bytes += len(raw)
+            msg = pickle.loads(raw)
+            if msg["type"] == "task_update":
+                Task.from_json(msg["data"])
+        return n_bytes
+
+    def new_protocol() -> int:
+        n_bytes = 0
+        for i in range(0, len(messages), batch_size):
+            frame = encode_messages(messages[i : i + batch_size])
+            n_bytes += len(frame)
+            decode_messages(frame)
+        return n_bytes
+
+    bench("pickle + pydantic", old_protocol)
+    bench(f"marshal batch={batch_size}", new_protocol)
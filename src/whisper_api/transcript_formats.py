@@ -0,0 +1,50 @@
+import io
+from typing import Literal
+
+from whisper.utils import ResultWriter
+from whisper.utils import WriteJSON
+from whisper.utils import WriteSRT
+from whisper.utils import WriteTSV
+from whisper.utils import WriteTXT
+from whisper.utils import WriteVTT
+
+from whisper_api.compression import PrecompressedBody
+from whisper_api.data_models.task import WhisperResult
+
+"""
+Rendering of whisper results into the file formats whisper itself can write
+
+A result never changes once it's there, so each format is rendered and compressed only once and then kept as bytes
+together with the things a response needs (ETag, media type) - see EndPoints.transcript().
+"""
+
+transcript_format_t = Literal["srt", "vtt", "tsv", "json", "txt"]
+
+writers: dict[transcript_format_t, type[ResultWriter]] = {
+    "srt": WriteSRT,
+    "vtt": WriteVTT,
+    "tsv": WriteTSV,
+    "json": WriteJSON,
+    "txt": WriteTXT,
+}
+
+media_types: dict[transcript_format_t, str] = {
+    # text/plain (instead of application/x-subrip) is what /srt always returned
+    "srt": "text/plain; charset=utf-8",
+    "vtt": "text/vtt; charset=utf-8",
+    "tsv": "text/tab-separated-values; charset=utf-8",
+    "json": "application/json",
+    "txt": "text/plain; charset=utf-8",
+}
+
+
+def render_transcript(result: WhisperResult, transcript_format: transcript_format_t) -> PrecompressedBody:
+    """Render the result in the given format, this takes a while for long results since it's compressed too"""
+    buffer = io.StringIO()
+    # ResultWriter base-class requires an output directory
+    # but write_result() doesn't use it, it prints straight to the given buffer
+    writer = writers[transcript_format]("/tmp")
+    # only what whisper's own result contains, the rest of the result (datetimes) isn't json serializable anyway
+    writer.write_result({"text": result.text, "segments": result.segments, "language": result.language}, buffer)
+
+    return PrecompressedBody(buffer.getvalue().encode(), media_types[transcript_format])
@@ -0,0 +1,94 @@
+import json
+import logging
+import unittest
+
+from whisper_api.access_log import AccessLog
+from whisper_api.access_log import percentile
+
+"""
+Test the sampling and the summaries of the access log.
+"""
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.entries: list[tuple[int, dict]] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.entries.append((record.levelno, json.loads(record.getMessage())))
+
+
+class TestAccessLog(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        self.logger = logging.getLogger("test_access_log")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def entries_of_type(self, entry_type: str) -> list[dict]:
+        return [entry for _, entry in self.handler.entries if entry["type"] == entry_type]
+
+    def test_sampling_keeps_errors_and_slow_requests(self):
+        """Test that a route with rate 0 only logs errors and slow requests, other routes log everything."""
+        access_log = AccessLog(self.logger, {"/status": 0.0}, slow_request_ms=100, summary_interval_s=3600)
+        details_calls = []
+
+        def details():
+            details_calls.append(1)
+            return {"path": "/status"}
+
+        for _ in range(10):
+            access_log.record("/status", 200, 1, details)
+        self.assertFalse(access_log.record("/status", 200, 150, details, expected_wait_ms=100))
+        self.assertTrue(access_log.record("/status", 400, 1, details))
+        self.assertTrue(access_log.record("/status", 200, 150, details))
+        self.assertTrue(access_log.record("/srt", 200, 1, details))
+
+        requests = self.entries_of_type("request")
+        self.assertEqual([entry["status"] for entry in requests], [400, 200, 200])
+        self.assertTrue(requests[1]["slow"])
+        self.assertEqual([level for level, _ in self.handler.entries], [logging.WARNING] * 2 + [logging.INFO])
+        # the details are only built for the logged requests
+        self.assertEqual(len(details_calls), 3)
+
+    def test_summaries(self):
+        """Test that the summary covers all requests of a route, not only the logged ones."""
+        access_log = AccessLog(self.logger, {"/status": 0.0}, summary_interval_s=3600)
+        for duration_ms in range(1, 101):
+            access_log.record("/status", 200 if duration_ms != 100 else 500, duration_ms, dict)
+        access_log.record("/srt", 200, 5, dict)
+        self.assertEqual(self.entries_of_type("summary"), [])
+
+        access_log.log_summaries(force=True)
+        summaries = {entry["route"]: entry for entry in self.entries_of_type("summary")}
+        self.assertEqual(summaries["/status"]["count"], 100)
+        self.assertEqual(summaries["/status"]["errors"], 1)
+        self.assertEqual(summaries["/status"]["logged"], 1)
+        self.assertEqual(summaries["/status"]["p50_ms"], 50)
+        self.assertEqual(summaries["/status"]["p99_ms"], 99)
+        self.assertEqual(summaries["/srt"]["count"], 1)
+
+        # a new interval starts empty
+        access_log.log_summaries(force=True)
+        self.assertEqual(len(self.entries_of_type("summary")), 2)
+
+    def test_percentiles_with_sampled_durations(self):
+        """Test that the percentiles stay close when more requests arrive than durations are kept."""
+        access_log = AccessLog(self.logger, {"/status": 0.0}, summary_interval_s=3600, max_samples=500)
+        for i in range(10_000):
+            access_log.record("/status", 200, i % 100, dict)
+        access_log.log_summaries(force=True)
+
+        summary = self.entries_of_type("summary")[0]
+        self.assertEqual(summary["count"], 10_000)
+        self.assertAlmostEqual(summary["p50_ms"], 50, delta=10)
+        self.assertEqual(summary["max_ms"], 99)
+        self.assertEqual(percentile([1.0], 99), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
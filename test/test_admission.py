@@ -0,0 +1,157 @@
+import datetime as dt
+import unittest
+
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from whisper_api.admission import AdmissionController
+from whisper_api.admission import AdmissionMiddleware
+from whisper_api.data_models.task import Task
+from whisper_api.data_models.task import WhisperResult
+
+"""
+Test the admission control, the tracking of the queue and the early rejection of uploads.
+"""
+
+
+def make_task(audio_duration_s: float) -> Task:
+    return Task(audiofile_name="audio.mp3", task_type="transcribe", audio_duration_s=audio_duration_s)
+
+
+def finish(task: Task, processing_s: float) -> Task:
+    start_time = dt.datetime(2024, 1, 1)
+    task.status = "finished"
+    task.whisper_result = WhisperResult(
+        text="",
+        language="en",
+        output_language="en",
+        segments=[],
+        used_model_size="base",
+        start_time=start_time,
+        end_time=start_time + dt.timedelta(seconds=processing_s),
+        used_device="cpu",
+    )
+    return task
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_queue_depth(self):
+        """Test that the queue limit counts pending tasks only and the retry time grows with the excess."""
+        admission = AdmissionController(max_queued_tasks=2, initial_task_processing_s=10)
+        tasks = [make_task(60) for _ in range(3)]
+        for task in tasks[:2]:
+            admission.update(task)
+
+        self.assertEqual(admission.retry_after_s(), 10)
+        self.assertEqual(admission.retry_after_s(new_tasks=3), 30)
+        with self.assertRaises(HTTPException) as context:
+            admission.check()
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(context.exception.headers, {"Retry-After": "10"})
+
+        # the task in processing left the queue
+        tasks[0].status = "processing"
+        admission.update(tasks[0])
+        self.assertIsNone(admission.retry_after_s())
+        self.assertEqual(admission.queued_audio_s, 120)
+
+        for task in tasks[:2]:
+            task.status = "failed"
+            admission.update(task)
+        self.assertEqual(admission.queued_tasks, 0)
+        self.assertEqual(admission.queued_audio_s, 0)
+
+    def test_queued_audio_and_learned_speed(self):
+        """Test that the audio limit is estimated with the speed of the finished tasks."""
+        admission = AdmissionController(max_queued_tasks=100, max_queued_audio_s=100)
+        # a single long file is admitted to an empty queue
+        self.assertIsNone(admission.retry_after_s(new_audio_s=500))
+
+        task = make_task(80)
+        admission.update(task)
+        self.assertIsNone(admission.retry_after_s(new_audio_s=10))
+        # 40s too much audio, decoded in realtime until we know better
+        self.assertEqual(admission.retry_after_s(new_audio_s=60), 40)
+
+        # it took 8s for 80s of audio, so the speed estimate moves towards 0.1
+        admission.update(finish(task, 8))
+        self.assertLess(admission.processing_s_per_audio_s, 1.0)
+        self.assertLess(admission.task_processing_s, 60)
+        self.assertEqual(admission.queued_audio_s, 0)
+        # the first measurement of a preset and model is taken as it is
+        self.assertEqual(admission.metrics["real_time_factors"], {"balanced/base": 0.1})
+
+    def test_outcomes(self):
+        """Test that each tracked task is counted once with its final status."""
+        admission = AdmissionController(max_queued_tasks=10)
+        tasks = [make_task(10) for _ in range(3)]
+        for task in tasks:
+            admission.update(task)
+
+        admission.update(finish(tasks[0], 5))
+        tasks[1].status = "cancelled"
+        admission.update(tasks[1])
+        # the late update of the decoder about the cancelled task
+        admission.update(tasks[1])
+        self.assertEqual(admission.metrics["finished"], 1)
+        self.assertEqual(admission.metrics["cancelled"], 1)
+        self.assertEqual(admission.metrics["failed"], 0)
+        self.assertEqual(admission.metrics["queued_tasks"], 1)
+
+    def test_hand_over(self):
+        """Test that a cancelled task that hands over its decode counts as cancelled and the successor as finished."""
+        admission = AdmissionController(max_queued_tasks=10)
+        task, successor = make_task(10), make_task(10)
+        admission.update(task)
+
+        task.status = "cancelled"
+        admission.hand_over(task, successor)
+        self.assertEqual(admission.metrics["cancelled"], 1)
+        self.assertEqual((admission.queued_tasks, admission.queued_audio_s), (1, 10))
+
+        # the late update of the decoder about the cancelled task
+        admission.update(task)
+        self.assertEqual(admission.queued_tasks, 1)
+
+        admission.update(finish(successor, 5))
+        self.assertEqual(admission.metrics["finished"], 1)
+        self.assertEqual(admission.metrics["cancelled"], 1)
+        self.assertEqual(admission.queued_tasks, 0)
+
+
+class TestAdmissionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = AdmissionController(max_queued_tasks=1)
+        self.bodies_read = []
+        app = FastAPI()
+
+        @app.post("/submit")
+        async def submit(request: Request):
+            self.bodies_read.append(await request.body())
+
+        @app.post("/other")
+        async def other(request: Request):
+            self.bodies_read.append(await request.body())
+
+        app.add_middleware(AdmissionMiddleware, admission=self.admission, paths={"/submit"})
+        self.client = TestClient(app)
+
+    def test_rejects_before_reading_the_body(self):
+        """Test that a full queue rejects submissions without touching their body, other routes pass."""
+        self.assertEqual(self.client.post("/submit", content=b"audio").status_code, 200)
+
+        self.admission.update(make_task(10))
+        response = self.client.post("/submit", content=b"audio")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "60")
+        self.assertEqual(self.client.post("/other", content=b"data").status_code, 200)
+
+        self.assertEqual(self.bodies_read, [b"audio", b"data"])
+
+
+if __name__ == "__main__":
+    unittest.main()
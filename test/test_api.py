@@ -9,6 +9,8 @@ import httpx
 import uvicorn
 
 from whisper_api import app
+from whisper_api.environment import MAX_BULK_STATUS_TASKS
+from whisper_api.environment import MAX_UPLOAD_MB
 
 """
 Test that the API works.
@@ -125,6 +127,28 @@ class TestAPI(unittest.TestCase):
         response = self.client.get("/api/v1/status?task_id=00000000000000000000000000000000")
         self.assertEqual(response.status_code, 400)
 
+    @unittest.skipIf(not do_test, reason)
+    def test_bulk_status_is_limited(self):
+        """Test that a bulk status request for more tasks than allowed returns 422."""
+        task_ids = ["0" * 32] * (MAX_BULK_STATUS_TASKS + 1)
+        response = self.client.post("/api/v1/bulk_status", json={"task_ids": task_ids})
+        self.assertEqual(response.status_code, 422)
+
+    @unittest.skipIf(not do_test, reason)
+    def test_upload_limits(self):
+        """Test that an upload larger than allowed is refused and a malformed Content-Length returns 400."""
+        response = self.client.post("/api/v1/upload", params={"size": MAX_UPLOAD_MB * 1024**2 + 1})
+        self.assertEqual(response.status_code, 413)
+
+        upload_id = self.client.post("/api/v1/upload", params={"size": 10}).json()["upload_id"]
+        response = self.client.patch(
+            "/api/v1/upload",
+            params={"upload_id": upload_id, "offset": 0},
+            content=b"0123456789",
+            headers={"Content-Length": "ten"},
+        )
+        self.assertEqual(response.status_code, 400)
+
     @unittest.skipIf(not do_test, reason)
     def test_transcribe_non_audio_file(self):
         """Test that uploading a non-audio file returns 400."""
@@ -132,6 +156,14 @@ class TestAPI(unittest.TestCase):
         response = self.client.post("/api/v1/transcribe", files=files, timeout=self.POST_TIMEOUT_S)
         self.assertEqual(response.status_code, 400)
 
+    @unittest.skipIf(not do_test, reason)
+    def test_detect_language_is_no_submission_task_type(self):
+        """Test that language detection can't be queued as a decode, it has its own endpoint."""
+        response = self.client.post(
+            "/api/v1/pcm?task_type=detect_language", content=bytes(3200), timeout=self.POST_TIMEOUT_S
+        )
+        self.assertEqual(response.status_code, 422)
+
     @unittest.skipIf(not do_test, reason)
     def test_transcribe(self):
         """
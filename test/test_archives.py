@@ -0,0 +1,74 @@
+import io
+import tarfile
+import unittest
+import zipfile
+
+from whisper_api.api_endpoints.archives import is_archive
+from whisper_api.api_endpoints.archives import iter_archive_members
+from whisper_api.api_endpoints.archives import stream_zip
+from whisper_api.api_endpoints.archives import unique_file_names
+
+"""
+Test reading uploaded archives and streaming result archives.
+"""
+
+archive_content = {
+    "a.ogg": b"first",
+    "nested/dir/b.mp3": b"second",
+    "__MACOSX/nested/._b.mp3": b"metadata",
+    ".DS_Store": b"metadata",
+}
+expected_members = [("a.ogg", b"first"), ("b.mp3", b"second")]
+
+
+def make_zip() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, data in archive_content.items():
+            zip_file.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def make_tar_gz() -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar_file:
+        for name, data in archive_content.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar_file.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+class TestArchives(unittest.TestCase):
+
+    def test_iter_members(self):
+        """Test that regular files of zip and tar archives are found, without directories and metadata."""
+        for archive in (make_zip(), make_tar_gz()):
+            self.assertTrue(is_archive(archive))
+            members = [(name, size, member.read()) for name, size, member in iter_archive_members(archive)]
+            self.assertEqual(members, [(name, len(data), data) for name, data in expected_members])
+
+    def test_plain_file_is_no_archive(self):
+        """Test that a plain file is not taken for an archive and is readable from the start afterward."""
+        file = io.BytesIO(b"OggS" + bytes(1024))
+        self.assertFalse(is_archive(file))
+        self.assertEqual(file.tell(), 0)
+
+    def test_stream_zip(self):
+        """Test that the streamed chunks form a valid zip archive."""
+        files = [("a.srt", "1\n00:00:00,000 --> 00:00:01,000\nhello\n"), ("b.srt", "")]
+        chunks = list(stream_zip(files))
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zip_file:
+            self.assertEqual([(name, zip_file.read(name).decode()) for name in zip_file.namelist()], files)
+
+    def test_unique_file_names(self):
+        """Test that duplicate names are numbered."""
+        names = list(unique_file_names(["a.srt", "a.srt", "b.srt", "a.srt"]))
+        self.assertEqual(names, ["a.srt", "a (1).srt", "b.srt", "a (2).srt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
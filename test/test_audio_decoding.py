@@ -0,0 +1,106 @@
+import struct
+import unittest
+import wave
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+from whisper_api.audio_decoding import PcmWavWriter
+from whisper_api.audio_decoding import load_audio
+from whisper_api.audio_decoding import probe_duration_s
+from whisper_api.audio_decoding import read_wav_layout
+
+"""
+Test the in-process decoding of PCM WAV and the conversion of raw PCM, none of it needs ffmpeg.
+"""
+
+
+def write_wav(samples: np.ndarray, sample_rate: int = 16000, channels: int = 1) -> NamedTemporaryFile:
+    file = NamedTemporaryFile(suffix=".wav")
+    with wave.open(file.name, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return file
+
+
+class TestWavDecoding(unittest.TestCase):
+
+    def test_mono_16k_is_read_directly(self):
+        """Test that the samples are converted like whisper converts the output of ffmpeg."""
+        samples = np.arange(-16000, 16000, dtype=np.int16)
+        file = write_wav(samples)
+
+        audio = load_audio(file.name)
+        self.assertEqual(audio.dtype, np.float32)
+        np.testing.assert_array_equal(audio, samples.astype(np.float32) / 32768.0)
+        self.assertEqual(probe_duration_s(file.name), 2.0)
+
+        # only the beginning is decoded on request
+        self.assertEqual(len(load_audio(file.name, max_duration_s=0.5)), 8000)
+
+    def test_stereo_is_mixed_down(self):
+        """Test that the channels are averaged."""
+        interleaved = np.array([100, 300, -200, 0, 1000, 1000], dtype=np.int16)
+        file = write_wav(interleaved, channels=2)
+
+        np.testing.assert_array_equal(load_audio(file.name), np.array([200, -100, 1000], dtype=np.float32) / 32768.0)
+        self.assertEqual(probe_duration_s(file.name), 3 / 16000)
+
+    def test_chunks_before_the_data_are_skipped(self):
+        """Test that the data is found behind other chunks (with odd sizes) and that other files are no WAV."""
+        samples = np.array([1, 2, 3], dtype="<i2").tobytes()
+        fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+        chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        chunks += b"LIST" + struct.pack("<I", 3) + b"abc\x00"
+        chunks += b"data" + struct.pack("<I", len(samples)) + samples
+
+        with NamedTemporaryFile(suffix=".wav") as file:
+            file.write(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+            file.flush()
+
+            layout = read_wav_layout(file.name)
+            self.assertEqual((layout.channels, layout.sample_rate, layout.frames), (1, 16000, 3))
+            np.testing.assert_array_equal(load_audio(file.name), np.array([1, 2, 3], dtype=np.float32) / 32768.0)
+
+        with NamedTemporaryFile(suffix=".ogg") as file:
+            file.write(b"OggS" + bytes(100))
+            file.flush()
+            self.assertIsNone(read_wav_layout(file.name))
+
+    def test_truncated_header(self):
+        """Test that a fmt chunk that is too short for its format is no WAV, and not an error."""
+        fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+        extensible = struct.pack("<HHIIHH", 0xFFFE, 1, 16000, 32000, 2, 16) + struct.pack("<HHI", 22, 16, 4)
+        for fmt_chunk in (fmt[:10], extensible):
+            chunks = b"fmt " + struct.pack("<I", len(fmt_chunk)) + fmt_chunk
+            chunks += b"data" + struct.pack("<I", 2) + bytes(2)
+
+            with NamedTemporaryFile(suffix=".wav") as file:
+                file.write(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+                file.flush()
+                self.assertIsNone(read_wav_layout(file.name))
+                self.assertIsNone(probe_duration_s(file.name))
+
+
+class TestPcmWavWriter(unittest.TestCase):
+
+    def test_chunks_split_within_frames(self):
+        """Test that raw PCM arriving in arbitrary chunks ends up as a complete WAV."""
+        samples = np.arange(1000, dtype="<i2")
+        data = samples.tobytes()
+
+        with NamedTemporaryFile(suffix=".wav") as file:
+            writer = PcmWavWriter(file)
+            for start in range(0, len(data), 333):
+                writer.write(data[start : start + 333])
+            writer.close()
+            file.flush()
+
+            self.assertEqual(probe_duration_s(file.name), 1000 / 16000)
+            np.testing.assert_array_equal(load_audio(file.name), samples.astype(np.float32) / 32768.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from whisper_api.decoding.cancellation import TaskCancelled
+from whisper_api.decoding.cancellation import abort_between_windows
+from whisper_api.decoding.cancellation import whisper_transcribe_module
+
+"""
+Test that a decode is aborted at the window boundary the way whisper reports its progress.
+"""
+
+
+def decode_windows(n_windows: int, decoded: list[int]):
+    """Report the progress like whisper.transcribe() does, once per decoded window"""
+    with whisper_transcribe_module.tqdm.tqdm(total=n_windows, disable=True) as pbar:
+        for window in range(n_windows):
+            decoded.append(window)
+            pbar.update(1)
+
+
+class TestAbortBetweenWindows(unittest.TestCase):
+
+    def test_abort_after_window(self):
+        """Test that the decode stops after the window in which it was cancelled and whisper is restored."""
+        original_tqdm = whisper_transcribe_module.tqdm
+        decoded = []
+        with self.assertRaises(TaskCancelled):
+            with abort_between_windows(lambda: len(decoded) >= 3):
+                decode_windows(10, decoded)
+
+        self.assertEqual(decoded, [0, 1, 2])
+        self.assertIs(whisper_transcribe_module.tqdm, original_tqdm)
+
+    def test_decode_without_abort(self):
+        """Test that the decode runs to the end as long as nothing is cancelled."""
+        decoded = []
+        with abort_between_windows(lambda: False):
+            decode_windows(5, decoded)
+
+        self.assertEqual(decoded, list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
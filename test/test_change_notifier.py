@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from whisper_api.change_notifier import ChangeNotifier
+
+"""
+Test waking up waiting requests with the ChangeNotifier.
+"""
+
+
+class TestChangeNotifier(unittest.IsolatedAsyncioTestCase):
+
+    async def test_notify_wakes_only_waiters_of_key(self):
+        """Test that a notification wakes the waiters of its key and no others."""
+        notifier = ChangeNotifier()
+        waiter_a = asyncio.create_task(notifier.wait("a", 1))
+        waiter_b = asyncio.create_task(notifier.wait("b", 0.2))
+        await asyncio.sleep(0)
+        self.assertEqual(notifier.waiting, 2)
+
+        notifier.notify("a")
+
+        self.assertTrue(await waiter_a)
+        self.assertFalse(await waiter_b)
+        self.assertEqual(notifier.waiting, 0)
+
+    async def test_notify_all(self):
+        """Test that notify_all wakes every waiter that asked for it, but no other."""
+        notifier = ChangeNotifier()
+        waiters = [asyncio.create_task(notifier.wait(key, 1, wake_on_notify_all=True)) for key in ("a", "a", "b")]
+        uninterested = asyncio.create_task(notifier.wait("a", 0.1))
+        await asyncio.sleep(0)
+
+        notifier.notify_all()
+
+        self.assertEqual(await asyncio.gather(*waiters), [True, True, True])
+        self.assertFalse(await uninterested)
+        self.assertEqual(notifier.waiting, 0)
+
+    async def test_timeout_cleans_up(self):
+        """Test that waiters that timed out don't linger and a later notification is harmless."""
+        notifier = ChangeNotifier()
+        self.assertFalse(await notifier.wait("a", 0.05))
+        self.assertEqual(notifier.waiting, 0)
+        notifier.notify("a")
+
+    async def test_timeout_of_wait_for(self):
+        """Test that the TimeoutError of asyncio (not the builtin one before Python 3.11) counts as a timeout."""
+        notifier = ChangeNotifier()
+
+        async def wait_for(future, timeout_s):
+            raise asyncio.TimeoutError()
+
+        with mock.patch("whisper_api.change_notifier.asyncio.wait_for", wait_for):
+            self.assertFalse(await notifier.wait("a", 10))
+        self.assertEqual(notifier.waiting, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import datetime as dt
+import hashlib
+import io
+import unittest
+
+from whisper_api.coalescing import SubmissionCoalescer
+from whisper_api.coalescing import copy_and_hash
+from whisper_api.data_models.task import Task
+
+"""
+Test the grouping of identical submissions and who keeps a decode alive.
+"""
+
+
+def make_task(content_sha256: str = "abc", source_language: str = "en") -> Task:
+    return Task(
+        audiofile_name="audio.mp3",
+        task_type="transcribe",
+        source_language=source_language,
+        content_sha256=content_sha256,
+    )
+
+
+class TestSubmissionCoalescer(unittest.TestCase):
+
+    def test_identical_tasks_follow_the_leader(self):
+        """Test that only tasks with the same audio, type, language, model and preset are grouped."""
+        coalescer = SubmissionCoalescer()
+        leader = make_task()
+        coalescer.lead(leader)
+
+        follower = make_task()
+        self.assertEqual(coalescer.leader_for(follower), leader.uuid)
+        self.assertIsNone(coalescer.leader_for(make_task(content_sha256="other")))
+        self.assertIsNone(coalescer.leader_for(make_task(source_language="de")))
+        self.assertIsNone(coalescer.leader_for(make_task(content_sha256=None)))
+        self.assertIsNone(coalescer.leader_for(make_task().model_copy(update={"tiered": True})))
+        self.assertIsNone(coalescer.leader_for(make_task().model_copy(update={"decoding_preset": "fast"})))
+
+        coalescer.follow(leader.uuid, follower)
+        self.assertEqual(follower.follows, leader.uuid)
+        self.assertEqual(coalescer.followers_of(leader.uuid), [follower.uuid])
+
+        leader.status = "processing"
+        leader.queue_ticket = 7
+        coalescer.mirror(leader, follower)
+        self.assertEqual((follower.status, follower.queue_ticket), ("processing", 7))
+
+        # a later identical submission is decoded again
+        coalescer.done(leader.uuid)
+        self.assertIsNone(coalescer.leader_for(make_task()))
+        self.assertEqual(coalescer.followers_of(leader.uuid), [])
+
+    def test_tasks_with_deadline_are_not_grouped(self):
+        """Test that a deadline, which can downgrade the model, keeps a task out of groups in both directions."""
+        coalescer = SubmissionCoalescer()
+        leader = make_task()
+        coalescer.lead(leader)
+        # a tight deadline must not wait for a decode with the large model
+        self.assertIsNone(coalescer.leader_for(make_task().model_copy(update={"deadline": dt.datetime.now()})))
+
+        # nor does a task without a deadline get the possibly downgraded result of one with a deadline
+        coalescer.done(leader.uuid)
+        coalescer.lead(make_task().model_copy(update={"deadline": dt.datetime.now()}))
+        self.assertIsNone(coalescer.leader_for(make_task()))
+
+    def test_decode_needed_until_all_left(self):
+        """Test that the decode stays needed while any task of the group is not cancelled."""
+        coalescer = SubmissionCoalescer()
+        leader = make_task()
+        coalescer.lead(leader)
+        followers = [make_task(), make_task()]
+        for follower in followers:
+            coalescer.follow(leader.uuid, follower)
+
+        self.assertTrue(coalescer.leave(leader))
+        # the group still exists, new identical tasks join it
+        self.assertEqual(coalescer.leader_for(make_task()), leader.uuid)
+        self.assertEqual(coalescer.members_of(leader.uuid), [follower.uuid for follower in followers])
+
+        self.assertTrue(coalescer.leave(followers[0]))
+        self.assertFalse(coalescer.leave(followers[1]))
+        self.assertIsNone(coalescer.leader_for(make_task()))
+
+    def test_follower_carries_the_decode_of_a_cancelled_leader(self):
+        """Test that the decode is done for the first follower once the leader was cancelled."""
+        coalescer = SubmissionCoalescer()
+        leader = make_task()
+        coalescer.lead(leader)
+        self.assertEqual(coalescer.carrier_of(leader.uuid), leader.uuid)
+
+        followers = [make_task(), make_task()]
+        for follower in followers:
+            coalescer.follow(leader.uuid, follower)
+        self.assertEqual(coalescer.carrier_of(leader.uuid), leader.uuid)
+
+        coalescer.leave(leader)
+        self.assertEqual(coalescer.carrier_of(leader.uuid), followers[0].uuid)
+        coalescer.leave(followers[0])
+        self.assertEqual(coalescer.carrier_of(leader.uuid), followers[1].uuid)
+        coalescer.leave(followers[1])
+        self.assertEqual(coalescer.carrier_of(leader.uuid), leader.uuid)
+
+    def test_copy_and_hash(self):
+        """Test that the copy is complete and the hash matches the content."""
+        content = bytes(range(256)) * 10_000
+        target = io.BytesIO()
+        expected = hashlib.sha256(content).hexdigest()
+        self.assertEqual(copy_and_hash(io.BytesIO(content), target), expected)
+        self.assertEqual(target.getvalue(), content)
+
+        with self.assertRaises(ValueError):
+            copy_and_hash(io.BytesIO(content), io.BytesIO(), max_bytes=len(content) - 1)
+        self.assertEqual(copy_and_hash(io.BytesIO(content), io.BytesIO(), max_bytes=len(content)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import gzip
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from whisper_api.compression import CompressionMiddleware
+from whisper_api.compression import PrecompressedBody
+from whisper_api.compression import negotiate_encoding
+
+"""
+Test the negotiation and compression of responses.
+"""
+
+large_text = "a transcript that repeats itself " * 200
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+static_body = PrecompressedBody(large_text.encode(), "text/plain; charset=utf-8")
+
+
+@app.get("/large")
+async def large():
+    return {"transcript": large_text}
+
+
+@app.get("/small")
+async def small():
+    return {"transcript": "short"}
+
+
+@app.get("/stream")
+async def stream():
+    return StreamingResponse(iter([large_text.encode()] * 2), media_type="text/plain")
+
+
+@app.get("/static")
+async def static(request: Request):
+    return static_body.response(request)
+
+
+client = TestClient(app)
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_negotiate_encoding(self):
+        """Test that q-values and wildcards are respected and unknown encodings are ignored."""
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("deflate"), None)
+        self.assertEqual(negotiate_encoding("gzip;q=0"), None)
+        self.assertEqual(negotiate_encoding("*"), negotiate_encoding("br, gzip"))
+        self.assertEqual(negotiate_encoding(None), None)
+
+    def test_middleware(self):
+        """Test that only large responses sent in one piece are compressed."""
+        headers = {"Accept-Encoding": "gzip"}
+        response = client.get("/large", headers=headers)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json(), {"transcript": large_text})
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+
+        self.assertNotIn("content-encoding", client.get("/small", headers=headers).headers)
+        self.assertNotIn("content-encoding", client.get("/stream", headers=headers).headers)
+        self.assertNotIn("content-encoding", client.get("/large", headers={"Accept-Encoding": "identity"}).headers)
+
+    def test_precompressed_body(self):
+        """Test that each representation has its own ETag and a known one gets an empty 304."""
+        gzip_response = client.get("/static", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(gzip_response.headers["content-encoding"], "gzip")
+        self.assertEqual(gzip_response.text, large_text)
+
+        plain_response = client.get("/static", headers={"Accept-Encoding": "identity"})
+        self.assertNotEqual(gzip_response.headers["etag"], plain_response.headers["etag"])
+        self.assertEqual(plain_response.headers["etag"], static_body.etag)
+
+        not_modified = client.get(
+            "/static", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_response.headers["etag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        self.assertEqual(gzip.decompress(static_body.variants["gzip"][0]).decode(), large_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
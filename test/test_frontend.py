@@ -37,6 +37,21 @@ class TestFrontend(unittest.TestCase):
         assert response.status_code == 200
         assert response.headers["content-type"] == "text/css; charset=utf-8"
 
+    def test_assets_are_versioned_and_cacheable(self):
+        """
+        Test that index.html references the assets with their version, which may be cached forever.
+        """
+        index_html = client.get("/").text
+        self.assertEqual(client.get("/").headers["cache-control"], "no-cache")
+
+        for asset in ("script.js", "styles.css"):
+            version = index_html.split(f'"{asset}?v=')[1].split('"')[0]
+            response = client.get(f"/{asset}?v={version}")
+            self.assertEqual(response.headers["cache-control"], "public, max-age=31536000, immutable")
+            self.assertEqual(
+                client.get(f"/{asset}", headers={"If-None-Match": response.headers["etag"]}).status_code, 304
+            )
+
     def test_not_found(self):
         """
         Test that a 404 error is returned when a file is not found.
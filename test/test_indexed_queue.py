@@ -0,0 +1,97 @@
+import random
+import unittest
+
+from whisper_api.data_models.indexed_queue import IndexedQueue
+
+"""
+Test the IndexedQueue against a plain list that does the same operations.
+"""
+
+
+class TestIndexedQueue(unittest.TestCase):
+
+    def test_fifo(self):
+        """Test the behaviour the decoder relies on: FIFO order, positions, current element and counters."""
+        queue = IndexedQueue(max_size=3)
+        self.assertEqual([queue.put(elm) for elm in "abc"], [1, 2, 3])
+        with self.assertRaises(OverflowError):
+            queue.put("d")
+
+        self.assertEqual(next(queue), "a")
+        self.assertEqual(queue.index("a"), 0)
+        self.assertEqual(queue.index("c"), 2)
+        self.assertIsNone(queue.index("unknown"))
+        self.assertEqual(list(queue.iter_priorities()), [(0, "a"), (1, "b"), (2, "c")])
+        self.assertEqual((queue.put_count, queue.next_count), (3, 1))
+
+        next(queue)
+        next(queue)
+        with self.assertRaises(StopIteration):
+            next(queue)
+
+    def test_remove_and_reprioritize(self):
+        """Test that removing and moving elements updates the positions of all others."""
+        queue = IndexedQueue(key=lambda elm: elm["id"])
+        for i in range(5):
+            queue.put({"id": i})
+        with self.assertRaises(ValueError):
+            queue.put({"id": 0})
+
+        self.assertEqual(queue.remove(by_key=1), {"id": 1})
+        self.assertNotIn(1, queue)
+        with self.assertRaises(KeyError):
+            queue.remove(by_key=1)
+
+        self.assertEqual(queue.reprioritize(-1, by_key=4), 1)
+        # 3 arrived before 4, so it's in front of it within the same priority
+        self.assertEqual(queue.reprioritize(-1, by_key=3), 1)
+        self.assertEqual([elm["id"] for _, elm in queue.iter_priorities()], [3, 4, 0, 2])
+        # back to its arrival place among the others
+        self.assertEqual(queue.reprioritize(0, by_key=4), 4)
+        self.assertEqual(queue.index(by_key=2), 3)
+
+    def test_random_operations_match_list(self):
+        """Test many random operations against a sorted list as reference."""
+        rng = random.Random(42)
+        queue: IndexedQueue[int] = IndexedQueue()
+        # (priority, arrival, element), the order the queue must have
+        reference: list[tuple[int, int, int]] = []
+
+        for step in range(2000):
+            operation = rng.random()
+            if operation < 0.45 or not reference:
+                priority = rng.randrange(3)
+                reference.append((priority, step, step))
+                reference.sort()
+                self.assertEqual(queue.put(step, priority), reference.index((priority, step, step)) + 1)
+            elif operation < 0.65:
+                entry = reference.pop(rng.randrange(len(reference)))
+                self.assertEqual(queue.remove(entry[2]), entry[2])
+            elif operation < 0.85:
+                entry = reference.pop(rng.randrange(len(reference)))
+                new_entry = (rng.randrange(3), entry[1], entry[2])
+                reference.append(new_entry)
+                reference.sort()
+                self.assertEqual(queue.reprioritize(new_entry[0], entry[2]), reference.index(new_entry) + 1)
+            else:
+                self.assertEqual(next(queue), reference.pop(0)[2])
+
+            if step % 200 == 0:
+                self.assertEqual(
+                    [elm for _, elm in queue.iter_priorities()][1 if queue.current is not None else 0 :],
+                    [elm for *_, elm in reference],
+                )
+                for position, (*_, elm) in enumerate(reference, start=1):
+                    self.assertEqual(queue.index(elm), position)
+                # reading from a position on skips what's in front
+                start = rng.randrange(len(reference) + 2)
+                self.assertEqual(
+                    [(position, elm) for position, elm in queue.iter_priorities(start) if position > 0],
+                    [(position, elm) for position, (*_, elm) in enumerate(reference, start=1) if position >= start],
+                )
+
+        self.assertEqual(len(queue), len(reference))
+
+
+if __name__ == "__main__":
+    unittest.main()
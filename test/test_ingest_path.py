@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from whisper_api.api_endpoints.endpoints import EndPoints
+
+"""
+Test that only files within the ingest directories can be decoded in place.
+"""
+
+
+class TestIngestPath(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.ingest_dir = os.path.join(self.root, "recordings")
+        os.makedirs(os.path.join(self.ingest_dir, "sub"))
+        self.audio_file = os.path.join(self.ingest_dir, "sub", "talk.ogg")
+        self.outside_file = os.path.join(self.root, "secret.ogg")
+        for path in (self.audio_file, self.outside_file):
+            with open(path, "wb") as f:
+                f.write(b"OggS")
+
+        patcher = mock.patch("whisper_api.api_endpoints.endpoints.INGEST_DIRS", [self.ingest_dir])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_rejected(self, path: str, status_code: int):
+        with self.assertRaises(HTTPException) as context:
+            EndPoints.resolve_ingest_path(path)
+        self.assertEqual(context.exception.status_code, status_code)
+
+    def test_file_in_ingest_dir(self):
+        """Test that files in (sub-)directories of the ingest dirs are accepted."""
+        self.assertEqual(EndPoints.resolve_ingest_path(self.audio_file), self.audio_file)
+
+    def test_paths_outside_are_rejected(self):
+        """Test that neither traversal nor a similar prefix nor a symlink leads outside the ingest dirs."""
+        self.assert_rejected(os.path.join(self.ingest_dir, "..", "secret.ogg"), 403)
+
+        os.makedirs(self.ingest_dir + "_other")
+        self.assert_rejected(self.ingest_dir + "_other", 403)
+
+        link = os.path.join(self.ingest_dir, "link.ogg")
+        os.symlink(self.outside_file, link)
+        self.assert_rejected(link, 403)
+
+    def test_directories_and_missing_files_are_rejected(self):
+        """Test that only existing files are accepted."""
+        self.assert_rejected(os.path.join(self.ingest_dir, "sub"), 400)
+        self.assert_rejected(os.path.join(self.ingest_dir, "missing.ogg"), 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
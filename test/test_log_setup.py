@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from whisper_api.log_setup import configure_logging
+
+"""
+Test that the queue based logging writes the records of all processes and drops instead of blocking.
+"""
+
+
+def log_from_child(_logger: logging.Logger):
+    _logger.info("message from the child")
+
+
+class TestLogSetup(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.log_dir, "test.log")
+
+    def make_logger(self, name: str, queue_size: int):
+        _logger = logging.getLogger(name)
+        listener = configure_logging(_logger, self.log_dir, "test.log", None, "INFO", queue_size=queue_size)
+        # the listener is stopped by the test, not at exit
+        self.addCleanup(lambda: _logger.handlers.clear())
+        return _logger, listener
+
+    def read_log(self) -> str:
+        with open(self.log_path) as f:
+            return f.read()
+
+    def test_records_of_all_processes_are_written(self):
+        """Test that records of the main and a child process end up in the file, formatted with their process."""
+        _logger, listener = self.make_logger("test_all_processes", 100)
+        _logger.debug("below the level")
+        _logger.info("message from %s", "main")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            _logger.exception("failed")
+
+        child = multiprocessing.get_context("fork").Process(target=log_from_child, args=(_logger,), name="Child")
+        child.start()
+        child.join(5)
+        listener.stop()
+
+        log = self.read_log()
+        self.assertIn("[MainProcess]", log)
+        self.assertIn("message from main", log)
+        self.assertIn("ValueError: boom", log)
+        self.assertIn("[Child]", log)
+        self.assertIn("message from the child", log)
+        self.assertNotIn("below the level", log)
+
+    def test_full_queue_drops_and_reports(self):
+        """Test that a full queue drops unimportant records, keeps warnings and reports the number of drops."""
+        _logger, listener = self.make_logger("test_full_queue", 2)
+        # the queue is filled before the writer can take anything out
+        with listener.local_queue.mutex:
+            listener.local_queue.queue.extend([logging.makeLogRecord({"msg": "filler"})] * 2)
+
+        _logger.info("dropped")
+        _logger.info("dropped too")
+
+        # make room again, so the next record gets in and carries the number of drops
+        with listener.local_queue.mutex:
+            listener.local_queue.queue.clear()
+        _logger.warning("kept")
+        listener.stop()
+
+        log = self.read_log()
+        self.assertNotIn("dropped too", log)
+        self.assertIn("kept", log)
+        self.assertIn("Dropped 2 log records", log)
+        self.assertEqual(listener.dropped_records, 2)
+
+    def test_record_of_the_caller_is_untouched(self):
+        """Test that the record is copied before it's prepared for the queue, other handlers still get the original."""
+        _logger, listener = self.make_logger("test_untouched_record", 10)
+        seen: list[logging.LogRecord] = []
+        handler = logging.Handler()
+        handler.emit = seen.append
+        _logger.addHandler(handler)
+
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            _logger.exception("failed with %s", "args")
+        listener.stop()
+
+        record = seen[0]
+        self.assertEqual((record.msg, record.args), ("failed with %s", ("args",)))
+        self.assertIsNotNone(record.exc_info)
+        self.assertFalse(hasattr(record, "dropped_records"))
+        self.assertIn("boom", self.read_log())
+
+
+if __name__ == "__main__":
+    unittest.main()
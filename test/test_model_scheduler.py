@@ -0,0 +1,102 @@
+import datetime as dt
+import unittest
+
+from whisper_api.data_models.task import Task
+from whisper_api.decoding.model_scheduler import ModelScheduler
+from whisper_api.decoding.presets import decoding_presets
+
+"""
+Test that the model is only downgraded when a deadline would be missed otherwise.
+"""
+
+NOW = dt.datetime(2024, 1, 1, 12, 0, 0)
+CANDIDATES = ["large", "medium", "base"]
+
+
+def make_task(audio_duration_s: float = 100.0, deadline_s: float = None, preset: str = "balanced") -> Task:
+    task = Task(audiofile_name="audio.mp3", task_type="transcribe", source_language="en", decoding_preset=preset)
+    task.audio_duration_s = audio_duration_s
+    if deadline_s is not None:
+        task.deadline = NOW + dt.timedelta(seconds=deadline_s)
+    return task
+
+
+def make_scheduler() -> ModelScheduler:
+    scheduler = ModelScheduler(gpu_mode=True)
+    for preset in decoding_presets:
+        scheduler.real_time_factors.update({("large", preset): 1.0, ("medium", preset): 0.5, ("base", preset): 0.1})
+    return scheduler
+
+
+class TestModelScheduler(unittest.TestCase):
+
+    def test_no_deadline_keeps_the_preferred_model(self):
+        """Test that without any deadline the largest model is used and no reason is given."""
+        scheduler = make_scheduler()
+        queued = [make_task(), make_task()]
+
+        self.assertEqual(scheduler.choose(make_task(), CANDIDATES, queued, NOW), ("large", None))
+
+    def test_downgrade_to_meet_own_deadline(self):
+        """Test that the largest model that fits the deadline of the task is used."""
+        scheduler = make_scheduler()
+
+        model_size, reason = scheduler.choose(make_task(deadline_s=200), CANDIDATES, [], NOW)
+        self.assertEqual(model_size, "large")
+        self.assertIn("fits", reason)
+
+        model_size, reason = scheduler.choose(make_task(deadline_s=60), CANDIDATES, [], NOW)
+        self.assertEqual(model_size, "medium")
+        self.assertIn("downgraded from 'large'", reason)
+
+        model_size, reason = scheduler.choose(make_task(deadline_s=5), CANDIDATES, [], NOW)
+        self.assertEqual(model_size, "base")
+        self.assertIn("can't be met", reason)
+
+    def test_queued_deadline_restricts_the_budget(self):
+        """Test that a task without deadline is downgraded so that the task behind it meets its deadline."""
+        scheduler = make_scheduler()
+        # the task behind needs 10s with base, so this one has 60s left of the 70s
+        queued = [make_task(deadline_s=70)]
+
+        model_size, reason = scheduler.choose(make_task(), CANDIDATES, queued, NOW)
+        self.assertEqual(model_size, "medium")
+        self.assertIn("downgraded", reason)
+
+    def test_late_queued_task_is_ignored(self):
+        """Test that a queued task that misses its deadline anyway doesn't drag the current one down."""
+        scheduler = make_scheduler()
+        queued = [make_task(deadline_s=15)]
+
+        self.assertEqual(scheduler.choose(make_task(), CANDIDATES, queued, NOW), ("large", None))
+
+    def test_record_updates_the_estimate(self):
+        """Test that the real-time factor follows the measured decodes."""
+        scheduler = make_scheduler()
+        scheduler.record("large", "balanced", 100.0, 300.0)
+        self.assertAlmostEqual(scheduler.real_time_factors[("large", "balanced")], 1.4)
+        self.assertAlmostEqual(scheduler.estimate_s("large", "balanced", 10.0), 14.0)
+
+        # decodes without a known duration teach nothing
+        scheduler.record("large", "balanced", None, 300.0)
+        self.assertAlmostEqual(scheduler.real_time_factors[("large", "balanced")], 1.4)
+
+    def test_presets_are_learned_separately(self):
+        """Test that slow accurate decodes don't make the estimates of the other presets pessimistic, and back."""
+        scheduler = make_scheduler()
+        for _ in range(20):
+            scheduler.record("large", "accurate", 100.0, 300.0)
+            scheduler.record("large", "fast", 100.0, 50.0)
+
+        self.assertAlmostEqual(scheduler.real_time_factors[("large", "balanced")], 1.0)
+        self.assertGreater(scheduler.real_time_factors[("large", "accurate")], 2.9)
+
+        # 200s are enough for large with the balanced preset, but not with the accurate one
+        self.assertEqual(scheduler.choose(make_task(deadline_s=200), CANDIDATES, [], NOW)[0], "large")
+        self.assertEqual(
+            scheduler.choose(make_task(deadline_s=200, preset="accurate"), CANDIDATES, [], NOW)[0], "medium"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import datetime as dt
+import unittest
+
+from whisper_api.data_models.task import Task
+from whisper_api.data_models.task import WhisperResult
+from whisper_api.pipe_protocol import decode_messages
+from whisper_api.pipe_protocol import encode_messages
+
+"""
+Test that messages survive the trip through the binary pipe protocol.
+"""
+
+
+class TestPipeProtocol(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Test that tasks, including their result, and plain messages are decoded to what was encoded."""
+        task = Task(audiofile_name="audio.ogg", task_type="transcribe", status="finished", queue_ticket=3)
+        task.whisper_result = WhisperResult(
+            text="hello",
+            language="en",
+            output_language="en",
+            segments=[{"id": 0, "start": 0.0, "end": 1.5, "text": "hello", "tokens": [1, 2, 3]}],
+            used_model_size="base",
+            start_time=dt.datetime.now(),
+            end_time=dt.datetime.now(),
+            used_device="cpu",
+            language_probabilities={"en": 0.9, "de": 0.05},
+        )
+        messages = [
+            ("task_update", task),
+            ("status", {"version": 1, "new_queue_tickets": {task.uuid: 3}}),
+            ("decode_batch", [task, Task(audiofile_name="other.ogg", task_type="translate")]),
+            ("detect_language", Task(audiofile_name="other.ogg", task_type="detect_language")),
+            ("exit", None),
+        ]
+
+        decoded = decode_messages(encode_messages(messages))
+
+        self.assertEqual(decoded, messages)
+        self.assertIsInstance(decoded[0][1].whisper_result, WhisperResult)
+
+    def test_unknown_version(self):
+        """Test that frames of another protocol version are rejected."""
+        frame = encode_messages([("status", None)])
+        with self.assertRaises(ValueError):
+            decode_messages(bytes((0,)) + frame[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import hashlib
+import unittest
+from tempfile import NamedTemporaryFile
+
+from whisper_api.data_models.resumable_upload import ResumableUpload
+
+"""
+Test appending chunks to a resumable upload.
+"""
+
+
+class TestResumableUpload(unittest.TestCase):
+
+    def test_chunks_are_appended_and_hashed(self):
+        """Test that the file and the checksum contain all chunks and the checksum is only known at the end."""
+        data = bytes(range(256)) * 100
+        upload = ResumableUpload(NamedTemporaryFile(), len(data), "talk.ogg")
+
+        upload.append(data[:1000])
+        self.assertEqual(upload.offset, 1000)
+        self.assertIsNone(upload.sha256)
+
+        upload.append(data[1000:])
+        upload.file.flush()
+        self.assertTrue(upload.is_complete)
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
+        with open(upload.file.name, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_chunk_beyond_size_is_rejected(self):
+        """Test that a chunk exceeding the size is not written."""
+        upload = ResumableUpload(NamedTemporaryFile(), 10)
+        upload.append(b"12345")
+        with self.assertRaises(ValueError):
+            upload.append(b"123456")
+        self.assertEqual(upload.offset, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from whisper_api.data_models.task import Task
+from whisper_api.data_models.task_spill import TaskSpill
+from whisper_api.data_models.task_store import StoreBackedTempDict
+from whisper_api.data_models.task_store import TaskStore
+
+"""
+Test that tasks survive a restart when using the TaskStore.
+"""
+
+
+class TestTaskStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "tasks.sqlite3")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_tasks_survive_restart(self):
+        """Test that unfinished tasks are restored and finished tasks can still be read after reopening the store."""
+        store = TaskStore(self.db_path)
+        pending = Task(audiofile_name="pending.ogg", task_type="transcribe")
+        finished = Task(audiofile_name="finished.ogg", task_type="translate", status="finished")
+        store.put(pending)
+        store.put(finished)
+        store.close()
+
+        store = TaskStore(self.db_path)
+        self.assertEqual([task.uuid for task in store.load_unfinished()], [pending.uuid])
+        self.assertEqual(store.get(finished.uuid), finished)
+        store.close()
+
+    def test_cache_miss_is_answered_by_store(self):
+        """Test that the TempDict in front of the store falls back to the disk."""
+        store = TaskStore(self.db_path)
+        task = Task(audiofile_name="audio.ogg", task_type="transcribe")
+        cached = StoreBackedTempDict(store, auto_gc_interval_s=None)
+        cached[task.uuid] = task
+        store.flush()
+
+        # a fresh cache knows nothing but the store
+        fresh_cache = StoreBackedTempDict(store, auto_gc_interval_s=None)
+        self.assertEqual(fresh_cache[task.uuid], task)
+        self.assertIsNone(fresh_cache.get("unknown", None))
+
+        del fresh_cache[task.uuid]
+        self.assertIsNone(store.get(task.uuid))
+        store.close()
+
+    def test_evicted_tasks_spill_to_disk(self):
+        """Test that tasks exceeding the memory budget are spilled to disk and can still be read."""
+        spill = TaskSpill(os.path.join(self.tmp_dir.name, "spill"))
+        cache = StoreBackedTempDict(
+            spill,
+            write_through=False,
+            auto_gc_interval_s=None,
+            max_size_bytes=2048,
+            size_estimator=lambda task: task.estimated_size_bytes,
+        )
+        first = Task(audiofile_name="first.ogg", task_type="transcribe", status="finished")
+        second = Task(audiofile_name="second.ogg", task_type="transcribe", status="finished")
+        third = Task(audiofile_name="third.ogg", task_type="transcribe", status="finished")
+        cache[first.uuid] = first
+        cache[second.uuid] = second
+        cache[third.uuid] = third
+
+        self.assertEqual(cache.stats["spilled_items"], 1)
+        self.assertNotIn(first.uuid, list(cache))
+        # the write is done by the writer thread, until then the task is read from the buffer
+        spill.flush()
+        self.assertEqual(spill.spilled_items, 1)
+        self.assertEqual(cache[first.uuid], first)
+        self.assertIsNone(spill.get("../../etc/passwd"))
+        spill.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
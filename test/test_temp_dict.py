@@ -0,0 +1,161 @@
+import threading
+import time
+import unittest
+
+from whisper_api.data_models.temp_dict import TempDict
+
+"""
+Test the expiry behaviour of the TempDict.
+"""
+
+
+def make_dict(expiration_time_s: float, **kwargs) -> TempDict:
+    temp_dict = TempDict(expiration_time_m=1, **kwargs)
+    temp_dict.expiration_time_s = expiration_time_s
+    return temp_dict
+
+
+class TestTempDict(unittest.TestCase):
+
+    def test_items_expire(self):
+        """Test that items are gone after their lifespan."""
+        temp_dict = make_dict(0.2, auto_gc_interval_s=None)
+        temp_dict["a"] = 1
+        self.assertEqual(temp_dict["a"], 1)
+        time.sleep(0.3)
+        self.assertNotIn("a", temp_dict)
+        self.assertIsNone(temp_dict.get("a", None))
+        self.assertEqual(len(temp_dict), 0)
+
+    def test_refreshed_item_does_not_hide_expired_items(self):
+        """Test that a refreshed item moves to the end and items behind it still expire."""
+        temp_dict = make_dict(0.3, refresh_expiration_time_on_usage=True, auto_gc_interval_s=None)
+        temp_dict["refreshed"] = 1
+        temp_dict["stale"] = 2
+        time.sleep(0.2)
+        temp_dict.get("refreshed")
+        time.sleep(0.2)
+
+        self.assertEqual(list(temp_dict), ["refreshed"])
+
+    def test_individual_lifespan(self):
+        """Test that an overwritten lifespan is respected in both directions."""
+        temp_dict = make_dict(0.3, refresh_expiration_time_on_usage=False, auto_gc_interval_s=None)
+        temp_dict["short"] = 1
+        temp_dict["long"] = 2
+        temp_dict["default"] = 3
+        temp_dict.extend_lifespan("short", 0.1 / 60)
+        temp_dict.extend_lifespan("long", 1 / 60)
+
+        time.sleep(0.2)
+        self.assertEqual(sorted(temp_dict), ["default", "long"])
+        time.sleep(0.2)
+        self.assertEqual(list(temp_dict), ["long"])
+
+    def test_auto_gc_runs_periodically(self):
+        """Test that the gc thread keeps cleaning and doesn't stop after its first run."""
+        temp_dict = make_dict(0.1, auto_gc_interval_s=0.05)
+        for i in range(3):
+            temp_dict[i] = i
+            time.sleep(0.3)
+            # peek into the data without triggering any expiry check
+            self.assertEqual(len(temp_dict._TempDict__data), 0)
+
+        temp_dict.stop_auto_gc(1)
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Test that exceeding the budget evicts the least recently used items and hands them to on_evict."""
+        evicted = []
+        temp_dict = make_dict(
+            60,
+            auto_gc_interval_s=None,
+            max_size_bytes=30,
+            size_estimator=lambda value: value,
+            on_evict=lambda key, value: evicted.append(key),
+        )
+        temp_dict["a"] = 10
+        temp_dict["b"] = 10
+        temp_dict["c"] = 10
+        temp_dict.get("a")  # "b" is the least recently used now
+        temp_dict["d"] = 10
+
+        self.assertEqual(evicted, ["b"])
+        self.assertEqual(sorted(temp_dict), ["a", "c", "d"])
+        self.assertEqual(temp_dict.stats["size_bytes"], 30)
+        self.assertEqual(temp_dict.stats["evicted_items"], 1)
+
+        # replacing an item must update its size
+        temp_dict["a"] = 5
+        self.assertEqual(temp_dict.size_bytes, 25)
+
+    def test_items_that_are_not_evictable_are_kept(self):
+        """Test that items rejected by is_evictable stay, the next evictable item is evicted instead."""
+        temp_dict = make_dict(
+            60,
+            auto_gc_interval_s=None,
+            max_size_bytes=20,
+            size_estimator=lambda value: value,
+            is_evictable=lambda value: value != 9,
+        )
+        temp_dict["pinned"] = 9
+        temp_dict["a"] = 10
+        temp_dict["b"] = 10
+
+        self.assertEqual(sorted(temp_dict), ["b", "pinned"])
+
+        # the budget may be exceeded when nothing else is left to evict
+        temp_dict["c"] = 15
+        self.assertEqual(sorted(temp_dict), ["c", "pinned"])
+        self.assertEqual(temp_dict.size_bytes, 24)
+
+    def test_on_evict_is_called_without_lock(self):
+        """Test that on_evict runs after the lock is released, so other threads can use the dict meanwhile."""
+        lock_was_free = []
+
+        def try_lock():
+            acquired = temp_dict.lock.acquire(timeout=1)
+            if acquired:
+                temp_dict.lock.release()
+            lock_was_free.append(acquired)
+
+        def on_evict(key, value):
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+
+        temp_dict = make_dict(
+            60, auto_gc_interval_s=None, max_size_bytes=10, size_estimator=lambda value: value, on_evict=on_evict
+        )
+        temp_dict["a"] = 10
+        temp_dict["b"] = 10
+
+        self.assertEqual(lock_was_free, [True])
+
+    def test_on_expire(self):
+        """Test that expired items are handed to on_expire, no matter if the gc or a lookup finds them."""
+        expired = []
+        temp_dict = make_dict(0.1, auto_gc_interval_s=None, on_expire=lambda key, value: expired.append(key))
+        temp_dict["by_gc"] = 1
+        temp_dict["by_lookup"] = 2
+        time.sleep(0.2)
+
+        self.assertIsNone(temp_dict.get("by_lookup", None))
+        temp_dict._clean_expired_items()
+
+        self.assertEqual(expired, ["by_lookup", "by_gc"])
+
+    def test_get_many(self):
+        """Test that get_many returns the alive items only and counts as usage."""
+        temp_dict = make_dict(0.3, refresh_expiration_time_on_usage=True, auto_gc_interval_s=None)
+        temp_dict["a"] = 1
+        temp_dict["b"] = 2
+        temp_dict["c"] = 3
+        time.sleep(0.2)
+
+        self.assertEqual(temp_dict.get_many(["a", "b", "unknown"]), {"a": 1, "b": 2})
+        time.sleep(0.2)
+        self.assertEqual(sorted(temp_dict), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import datetime as dt
+import json
+import unittest
+
+from whisper_api.data_models.task import WhisperResult
+from whisper_api.transcript_formats import render_transcript
+from whisper_api.transcript_formats import writers
+
+"""
+Test rendering results into the supported transcript formats.
+"""
+
+
+def make_result(text: str = " hello world") -> WhisperResult:
+    return WhisperResult(
+        text=text,
+        language="en",
+        output_language="en",
+        segments=[{"id": 0, "start": 0.0, "end": 1.5, "text": text}],
+        used_model_size="base",
+        start_time=dt.datetime.now(),
+        end_time=dt.datetime.now(),
+        used_device="cpu",
+    )
+
+
+class TestTranscriptFormats(unittest.TestCase):
+
+    def test_all_formats_render(self):
+        """Test that every format contains the text and json stays parseable despite the datetimes of the result."""
+        result = make_result()
+        for transcript_format in writers:
+            rendered = render_transcript(result, transcript_format)
+            self.assertIn(b"hello world", rendered.body, transcript_format)
+
+        self.assertEqual(json.loads(render_transcript(result, "json").body)["text"], " hello world")
+
+    def test_etag(self):
+        """Test that the ETag only changes with the content."""
+        self.assertEqual(render_transcript(make_result(), "srt").etag, render_transcript(make_result(), "srt").etag)
+        self.assertNotEqual(
+            render_transcript(make_result(), "srt").etag, render_transcript(make_result(" hi"), "srt").etag
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
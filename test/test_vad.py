@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from whisper_api.decoding.vad import SpeechTimeline
+from whisper_api.decoding.vad import speech_regions
+
+"""
+Test that silences are found in synthetic audio and that timestamps are mapped back to the original timeline.
+"""
+
+SAMPLE_RATE = 16000
+
+
+def make_audio(layout: list[tuple[str, float]], seed: int = 0) -> np.ndarray:
+    """Concatenate parts of quiet noise ("silence") and a loud tone in the voice band ("speech")"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for kind, duration_s in layout:
+        n = int(duration_s * SAMPLE_RATE)
+        noise = 0.001 * rng.standard_normal(n)
+        if kind == "speech":
+            t = np.arange(n) / SAMPLE_RATE
+            noise += 0.3 * np.sin(2 * np.pi * 800 * t)
+        parts.append(noise)
+    return np.concatenate(parts).astype(np.float32)
+
+
+class TestSpeechRegions(unittest.TestCase):
+
+    def test_long_silences_are_cut(self):
+        """Test that each speech part becomes a padded region and long silences between them are dropped."""
+        audio = make_audio([("silence", 5), ("speech", 2), ("silence", 10), ("speech", 3), ("silence", 5)])
+        regions = speech_regions(audio, min_silence_s=1.0, sample_rate=SAMPLE_RATE)
+
+        self.assertEqual(len(regions), 2)
+        (start_1, end_1), (start_2, end_2) = ((start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in regions)
+        self.assertAlmostEqual(start_1, 4.7, delta=0.1)
+        self.assertAlmostEqual(end_1, 7.3, delta=0.1)
+        self.assertAlmostEqual(start_2, 16.7, delta=0.1)
+        self.assertAlmostEqual(end_2, 20.3, delta=0.1)
+
+    def test_short_silences_are_kept(self):
+        """Test that pauses shorter than the minimum silence don't split a region."""
+        audio = make_audio([("silence", 3), ("speech", 2), ("silence", 1.5), ("speech", 2), ("silence", 3)])
+
+        self.assertEqual(len(speech_regions(audio, min_silence_s=2.0, sample_rate=SAMPLE_RATE)), 1)
+        self.assertEqual(len(speech_regions(audio, min_silence_s=0.5, sample_rate=SAMPLE_RATE)), 2)
+
+    def test_silence_only(self):
+        """Test that audio without speech has no regions."""
+        self.assertEqual(speech_regions(make_audio([("silence", 10)]), 1.0, SAMPLE_RATE), [])
+        self.assertEqual(speech_regions(np.zeros(100, dtype=np.float32), 1.0, SAMPLE_RATE), [])
+
+
+class TestSpeechTimeline(unittest.TestCase):
+
+    def test_join_and_map_back(self):
+        """Test that the joined audio only has the regions and timestamps land in the original timeline."""
+        audio = np.arange(100 * SAMPLE_RATE, dtype=np.float32)
+        timeline = SpeechTimeline(
+            [(10 * SAMPLE_RATE, 20 * SAMPLE_RATE), (50 * SAMPLE_RATE, 55 * SAMPLE_RATE)], len(audio)
+        )
+
+        joined = timeline.join(audio)
+        self.assertEqual(len(joined), 15 * SAMPLE_RATE)
+        self.assertEqual(joined[10 * SAMPLE_RATE], 50 * SAMPLE_RATE)
+        self.assertAlmostEqual(timeline.skipped_s, 85.0)
+
+        segments = [
+            {"start": 0.0, "end": 10.0, "words": [{"start": 2.0, "end": 2.5}]},
+            {"start": 10.0, "end": 12.5},
+        ]
+        timeline.map_segments(segments)
+        # the end at the joint belongs to the first region, the start to the second
+        self.assertEqual((segments[0]["start"], segments[0]["end"]), (10.0, 20.0))
+        self.assertEqual((segments[0]["words"][0]["start"], segments[0]["words"][0]["end"]), (12.0, 12.5))
+        self.assertEqual((segments[1]["start"], segments[1]["end"]), (50.0, 52.5))
+
+
+if __name__ == "__main__":
+    unittest.main()